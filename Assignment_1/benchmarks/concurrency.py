@@ -0,0 +1,150 @@
+"""
+Concurrent workers against one database: the plain vs tuned SQLite profiles.
+
+Starts --workers processes (standing in for gunicorn workers), each running
+requests back to back for --duration seconds against a shared database of
+--rows TODOs. Every request is wrapped the way Django wraps a real one
+(``close_old_connections`` before and after, so CONN_MAX_AGE decides whether
+the connection is reused) and is either a read of the first list page or, with
+probability --write-ratio, a write (create, or toggle in a transaction).
+
+For each profile it reports requests/sec, p50/p99 latency and how many
+requests failed (e.g. "database is locked"). Profiles come from
+todo_project/database.py; add --database-url postgres://... to include
+PostgreSQL (needs psycopg; its tables are created with migrate and emptied).
+
+Run from Assignment_1:
+    python benchmarks/concurrency.py
+    python benchmarks/concurrency.py --workers 16 --write-ratio 0.5 --json out.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def configure(env: Dict[str, str]) -> None:
+    sys.path.insert(0, str(ROOT))
+    os.environ.update(env)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "todo_project.settings")
+    import django
+    from django.conf import settings
+
+    settings.DEBUG = False  # no query log
+    django.setup()
+
+
+def prepare(env: Dict[str, str], rows: int) -> None:
+    configure(env)
+    from django.core.management import call_command
+
+    from todos.models import Todo
+
+    call_command("migrate", verbosity=0)
+    Todo.objects.all().delete()
+    Todo.objects.bulk_create(Todo(title=f"todo {i}", completed=i % 3 == 0) for i in range(rows))
+
+
+def worker(env: Dict[str, str], rows: int, duration: float, write_ratio: float, seed: int, out) -> None:
+    configure(env)
+    from django.db import close_old_connections, transaction
+
+    from todos.models import Todo
+    from todos.pagination import paginate
+
+    rng = random.Random(seed)
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        close_old_connections()
+        try:
+            if rng.random() < write_ratio:
+                if rng.random() < 0.5:
+                    Todo.objects.create(title="bench")
+                else:
+                    # Read then write in one transaction, like the edit and toggle views.
+                    with transaction.atomic():
+                        todo = Todo.objects.filter(pk__gte=rng.randint(1, rows)).first()
+                        if todo:
+                            todo.completed = not todo.completed
+                            todo.save(update_fields=["completed", "updated_at"])
+            else:
+                paginate(Todo.objects.all(), None, 50)
+        except Exception:  # "database is locked" and friends
+            errors += 1
+        finally:
+            close_old_connections()
+        latencies.append((time.perf_counter() - started) * 1000)
+    out.put((latencies, errors))
+
+
+def run_profile(env: Dict[str, str], args) -> Dict[str, float]:
+    ctx = multiprocessing.get_context("spawn")
+    setup = ctx.Process(target=prepare, args=(env, args.rows))
+    setup.start()
+    setup.join()
+    queue = ctx.Queue()
+    procs = [
+        ctx.Process(target=worker, args=(env, args.rows, args.duration, args.write_ratio, seed, queue))
+        for seed in range(args.workers)
+    ]
+    for proc in procs:
+        proc.start()
+    results = [queue.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    latencies = sorted(ms for lat, _ in results for ms in lat)
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / args.duration,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+        "errors": sum(errors for _, errors in results),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Database profiles under concurrent workers.")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--database-url", help="Also run against this PostgreSQL database")
+    parser.add_argument("--json", metavar="PATH", help="Write results as JSON")
+    args = parser.parse_args()
+
+    report: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        profiles = {
+            "sqlite plain": {"DB_PROFILE": "plain", "SQLITE_PATH": os.path.join(tmp, "plain.sqlite3")},
+            "sqlite tuned": {"DB_PROFILE": "tuned", "SQLITE_PATH": os.path.join(tmp, "tuned.sqlite3")},
+        }
+        if args.database_url:
+            profiles["postgres"] = {"DATABASE_URL": args.database_url}
+        for name, env in profiles.items():
+            env = {"TODO_CACHE": "off", "DATABASE_URL": "", **env}
+            report[name] = run_profile(env, args)
+
+    print(f"workers={args.workers} duration={args.duration}s rows={args.rows} write_ratio={args.write_ratio}")
+    print(f"{'profile':<16}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>10}")
+    for name, r in report.items():
+        print(f"{name:<16}{r['rps']:>10.0f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['errors']:>10}")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Per-page cost of the TODO list: keyset cursors vs OFFSET, with and without the index.
+
+Fills a throwaway SQLite database with --rows TODOs, then times reading one
+page (--per-page rows in list order) at several depths:
+
+- keyset:  todos.pagination.paginate() from the cursor of the row before the page
+- offset:  ``Todo.objects.all()[depth:depth + per_page]``, what Paginator does
+
+both with the ``todo_list_order_idx`` index and after dropping it. With the
+index, keyset pages cost the same at any depth; OFFSET pages grow with the
+depth, and without the index every page sorts the whole table.
+
+Run from Assignment_1:
+    python benchmarks/list_pages.py
+    python benchmarks/list_pages.py --rows 200000 --depths 0 10000 190000 --json out.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "todo_project.settings")
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+
+def setup(path: str) -> None:
+    settings.DATABASES["default"]["NAME"] = path
+    settings.DEBUG = False  # no query log
+    django.setup()
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+
+
+def fill(rows: int) -> None:
+    from django.utils import timezone
+
+    from todos.models import Todo
+
+    rng = random.Random(7)
+    now = timezone.now()
+    today = datetime.date.today()
+    batch: List[Todo] = []
+    for i in range(rows):
+        due = None if rng.random() < 0.2 else today + datetime.timedelta(days=rng.randint(-30, 365))
+        batch.append(Todo(title=f"todo {i}", completed=rng.random() < 0.3, due_date=due))
+        if len(batch) == 5000 or i == rows - 1:
+            Todo.objects.bulk_create(batch)
+            batch = []
+    # Spread creation times (bulk_create stamps them all within a few ms).
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE todos_todo SET created_at = datetime(%s, '-' || (id * 7 %% 100000) || ' seconds')",
+            [now.strftime("%Y-%m-%d %H:%M:%S")],
+        )
+
+
+def timed(fn: Callable[[], object], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def measure(depths: List[int], per_page: int, repeat: int) -> Dict[str, Dict[int, float]]:
+    from todos.models import Todo
+    from todos.pagination import encode_cursor, paginate
+
+    results: Dict[str, Dict[int, float]] = {"keyset": {}, "offset": {}}
+    for depth in depths:
+        cursor = encode_cursor(Todo.objects.all()[depth - 1]) if depth else None
+        results["keyset"][depth] = timed(lambda: paginate(Todo.objects.all(), cursor, per_page), repeat)
+        results["offset"][depth] = timed(lambda: list(Todo.objects.all()[depth : depth + per_page]), repeat)
+    return results
+
+
+def plan(depth: int, per_page: int) -> str:
+    from django.db import connection
+
+    from todos.models import Todo
+    from todos.pagination import ORDERING, _ranges
+
+    anchor = Todo.objects.all()[depth]
+    key = (anchor.completed, anchor.due_date, anchor.created_at, anchor.pk)
+    queryset = Todo.objects.filter(_ranges(key, connection.features.nulls_order_largest)[0]).order_by(*ORDERING)
+    return queryset[:per_page].explain()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Keyset vs OFFSET pagination of the TODO list.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--per-page", type=int, default=50)
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1_000, 10_000, 50_000, 99_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", metavar="PATH", help="Write results as JSON")
+    args = parser.parse_args()
+    depths = [d for d in args.depths if d < args.rows]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup(os.path.join(tmp, "bench.sqlite3"))
+        started = time.perf_counter()
+        fill(args.rows)
+        print(f"rows={args.rows} per_page={args.per_page} filled in {time.perf_counter() - started:.1f}s")
+        print(f"plan (keyset, first range): {plan(depths[-1], args.per_page)}")
+
+        report = {"indexed": measure(depths, args.per_page, args.repeat)}
+        from django.db import connection
+
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX todo_list_order_idx")
+        report["no_index"] = measure(depths, args.per_page, max(args.repeat // 4, 1))
+
+    print(f"{'depth':>8}" + "".join(f"{f'{i} {k} ms':>22}" for i in report for k in report[i]))
+    for depth in depths:
+        print(f"{depth:>8}" + "".join(f"{report[i][k][depth]:>22.2f}" for i in report for k in report[i]))
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"rows": args.rows, "per_page": args.per_page, "ms": report}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
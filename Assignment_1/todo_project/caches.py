@@ -0,0 +1,51 @@
+"""Cache backend for rendered TODO list pages, chosen from the environment.
+
+``TODO_CACHE`` selects one of ``BACKENDS``:
+
+- ``database``: a table in the project database, shared by every worker and
+  host. The default unless ``DEBUG``; create the table once with
+  ``python manage.py createcachetable``.
+- ``file``: files under ``TODO_CACHE_DIR``, shared by the workers of one host.
+- ``locmem``: per process, only right for a single worker (e.g.
+  ``runserver``); the default with ``DEBUG``. Refused when
+  ``WEB_CONCURRENCY`` (gunicorn's worker count) is above 1, because a write
+  would invalidate the pages of the worker that handled it only.
+- ``off``: no caching.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Mapping
+
+BACKENDS = ("database", "file", "locmem", "off")
+
+
+def cache_backend(env: Mapping[str, str], debug: bool) -> str:
+    backend = env.get("TODO_CACHE", "locmem" if debug else "database")
+    if backend not in BACKENDS:
+        raise ValueError(f"TODO_CACHE must be one of {', '.join(BACKENDS)}, not {backend!r}")
+    workers = int(env.get("WEB_CONCURRENCY", "1"))
+    if backend == "locmem" and workers > 1:
+        raise ValueError(f"TODO_CACHE=locmem is per process and cannot serve {workers} workers; use database or file")
+    return backend
+
+
+def cache_config(backend: str, env: Mapping[str, str], base_dir: Path) -> Dict[str, Any]:
+    if backend == "database":
+        return {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "todos_cache",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    if backend == "file":
+        return {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": env.get("TODO_CACHE_DIR", str(base_dir / ".cache")),
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    if backend == "locmem":
+        return {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "todos",
+            "OPTIONS": {"MAX_ENTRIES": 1000},
+        }
+    return {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .caches import cache_backend, cache_config
+from .database import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -73,14 +77,24 @@ WSGI_APPLICATION = 'todo_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite tuned for concurrent workers by default, or PostgreSQL with
+# DATABASE_URL; see todo_project/database.py for the variables.
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(os.environ, BASE_DIR),
 }
 
 
+# Cache
+# Holds rendered TODO list pages (see todos/cache.py). TODO_CACHE=database
+# (the default unless DEBUG; run createcachetable) is shared by all workers,
+# file by the workers of one host, locmem (the default with DEBUG) by one
+# process only; off disables caching. See todo_project/caches.py.
+
+TODO_CACHE = cache_backend(os.environ, DEBUG)
+CACHES = {'default': cache_config(TODO_CACHE, os.environ, BASE_DIR)}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -4,5 +4,6 @@ from django.urls import include, path
 
 urlpatterns = [
     path("", include("todos.urls")),
+    path("api/", include("todos.api_urls")),
     path("admin/", admin.site.urls),
 ]
@@ -0,0 +1,172 @@
+"""JSON API for TODOs, next to the HTML views.
+
+``/api/todos/`` lists (GET) and creates (POST); ``/api/todos/<pk>/`` reads
+(GET), replaces (PUT), updates (PATCH) and deletes (DELETE). Reads take
+``?fields=id,title`` to choose the fields returned, and the list takes the
+``completed``/``due_after``/``due_before`` filters of ``TodoFilterForm``.
+
+Responses carry an ETag and Last-Modified derived from ``updated_at``, so a
+client revalidating with If-None-Match/If-Modified-Since gets a 304 for the
+cost of one aggregate query; If-Match on writes gives a 412 when the TODO
+changed since it was read. The list is streamed from a server-side cursor
+rather than built in memory.
+"""
+
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max
+from django.forms.models import model_to_dict
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_http_methods
+
+from . import cache as list_cache
+from .forms import TodoFilterForm, TodoForm
+from .models import Todo
+from .pagination import ORDERING
+from .views import RequestError, json_body
+
+FIELDS = ("id", "title", "description", "due_date", "completed", "created_at", "updated_at")
+# Rows fetched per round-trip while streaming a list.
+STREAM_CHUNK = 500
+
+
+def error(message, status=400, **extra):
+    return JsonResponse({"error": message, **extra}, status=status)
+
+
+def selected_fields(request):
+    value = request.GET.get("fields")
+    if not value:
+        return FIELDS
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown or not fields:
+        raise RequestError(f"unknown fields: {', '.join(unknown)}; choose from {', '.join(FIELDS)}")
+    return fields
+
+
+def filtered(request):
+    form = TodoFilterForm(request.GET)
+    if not form.is_valid():
+        raise RequestError(f"invalid filter: {form.errors.get_json_data()}")
+    return form.filter(Todo.objects.all())
+
+
+def etag(*parts):
+    return hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+
+def list_version(request):
+    # condition() asks for the ETag and Last-Modified separately; one query serves both.
+    if not hasattr(request, "_todo_list_version"):
+        try:
+            stats = filtered(request).aggregate(count=Count("id"), modified=Max("updated_at"))
+        except RequestError:
+            request._todo_list_version = (None, None)  # the view answers 400
+        else:
+            # The count changes on delete, which leaves no updated_at behind.
+            tag = etag(stats["count"], stats["modified"], sorted(request.GET.lists()))
+            request._todo_list_version = (tag, stats["modified"])
+    return request._todo_list_version
+
+
+def todo_version(request, pk):
+    if not hasattr(request, "_todo_version"):
+        modified = Todo.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+        tag = etag(pk, modified, request.GET.get("fields", "")) if modified else None
+        request._todo_version = (tag, modified)
+    return request._todo_version
+
+
+def list_etag(request):
+    return list_version(request)[0] if request.method in ("GET", "HEAD") else None
+
+
+def list_last_modified(request):
+    return list_version(request)[1] if request.method in ("GET", "HEAD") else None
+
+
+def todo_etag(request, pk):
+    return todo_version(request, pk)[0]
+
+
+def todo_last_modified(request, pk):
+    return todo_version(request, pk)[1]
+
+
+def dump(data):
+    return json.dumps(data, cls=DjangoJSONEncoder)
+
+
+def serialize(todo, fields=FIELDS):
+    return {name: getattr(todo, name) for name in fields}
+
+
+def stream(queryset, fields):
+    yield "["
+    for i, row in enumerate(queryset.values(*fields).iterator(chunk_size=STREAM_CHUNK)):
+        yield ("," if i else "") + "\n" + dump(row)
+    yield "\n]\n"
+
+
+def api_view(view):
+    @csrf_exempt  # JSON-only writes, like the bulk endpoints
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except RequestError as exc:
+            return error(str(exc))
+
+    return wrapper
+
+
+def save(form, status):
+    if not form.is_valid():
+        return error("invalid todo", errors=form.errors.get_json_data())
+    todo = form.save()
+    response = HttpResponse(dump(serialize(todo)), status=status, content_type="application/json")
+    response["ETag"] = f'"{etag(todo.pk, todo.updated_at, "")}"'
+    return response
+
+
+@api_view
+@require_http_methods(["GET", "HEAD", "POST"])
+@condition(etag_func=list_etag, last_modified_func=list_last_modified)
+def todo_list(request):
+    if request.method == "POST":
+        response = save(TodoForm(json_body(request)), status=201)
+        if response.status_code == 201:
+            response["Location"] = reverse("todos-api:detail", args=[json.loads(response.content)["id"]])
+        return response
+    fields, queryset = selected_fields(request), filtered(request).order_by(*ORDERING)
+    return StreamingHttpResponse(stream(queryset, fields), content_type="application/json")
+
+
+@api_view
+@require_http_methods(["GET", "HEAD", "PUT", "PATCH", "DELETE"])
+@condition(etag_func=todo_etag, last_modified_func=todo_last_modified)
+def todo_detail(request, pk):
+    todo = Todo.objects.filter(pk=pk).first()
+    if todo is None:
+        return error("not found", status=404)
+    if request.method in ("GET", "HEAD"):
+        return HttpResponse(dump(serialize(todo, selected_fields(request))), content_type="application/json")
+    if request.method == "DELETE":
+        todo.delete()
+        return HttpResponse(status=204)
+    data = json_body(request)
+    if request.method == "PATCH":
+        data = {**model_to_dict(todo, fields=TodoForm.Meta.fields), **data}
+    return save(TodoForm(data, instance=todo), status=200)
+
+
+@require_http_methods(["GET"])
+def cache_stats(request):
+    return JsonResponse({"backend": settings.TODO_CACHE, **list_cache.stats()})
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from . import api
+
+app_name = "todos-api"
+
+urlpatterns = [
+    path("todos/", api.todo_list, name="list"),
+    path("todos/<int:pk>/", api.todo_detail, name="detail"),
+    path("cache/", api.cache_stats, name="cache"),
+]
@@ -0,0 +1,81 @@
+"""Cached rendering of the TODO list.
+
+Rendered list pages are stored in Django's cache under a data version:
+``todos:list:<version>:<path>``. Saving or deleting a TODO bumps the version
+once the transaction commits (see ``signals.py``; bulk writes, which send no
+signals, bump it themselves), so stale pages are never read again and simply
+expire. Bumping before the commit would let a concurrent request cache the
+old rows under the new version.
+
+Pages are cached with a placeholder where each form's CSRF token goes and the
+requesting user's token is filled in on the way out, so one cached copy
+serves everyone.
+
+The version lives in the cache too, so it is only shared as widely as the
+backend is: the database cache (the default unless DEBUG) across every worker
+and host, the file cache across the workers of one host, and the local-memory
+cache (the default with DEBUG) within one process only, which is why it is
+refused when WEB_CONCURRENCY is above 1. See todo_project/caches.py.
+"""
+
+import threading
+import time
+
+from django.core.cache import caches
+from django.middleware.csrf import get_token
+
+VERSION_KEY = "todos:version"
+CSRF_PLACEHOLDER = "__todos_csrf_token__"
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def cache():
+    return caches["default"]
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def stats():
+    with _lock:
+        return {**_stats, "version": current_version()}
+
+
+def current_version():
+    version = cache().get(VERSION_KEY)
+    if version is None:
+        # Start from the clock, not 1, so an evicted version never repeats.
+        cache().add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache().get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """Invalidate every cached page."""
+    _count("invalidations")
+    try:
+        cache().incr(VERSION_KEY)
+    except ValueError:  # not set yet, or evicted
+        cache().set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def cached_page(request, render_page, timeout=None):
+    """``render_page()``'s HTML for this request, from the cache when possible.
+
+    ``render_page`` is only called on a miss and must render ``csrf_token``
+    as ``CSRF_PLACEHOLDER``. The cached HTML is returned as ``(html, hit)``.
+    """
+    key = f"todos:list:{current_version()}:{request.get_full_path()}"
+    html = cache().get(key)
+    hit = html is not None
+    if hit:
+        _count("hits")
+    else:
+        _count("misses")
+        html = render_page()
+        cache().set(key, html, timeout)
+    return html.replace(CSRF_PLACEHOLDER, get_token(request)), hit
@@ -12,3 +12,21 @@ class TodoForm(forms.ModelForm):
     class Meta:
         model = Todo
         fields = ["title", "description", "due_date", "completed"]
+
+
+class TodoFilterForm(forms.Form):
+    """Filters shared by the bulk and API endpoints; blank fields do not filter."""
+
+    completed = forms.NullBooleanField(required=False)
+    due_after = forms.DateField(required=False)
+    due_before = forms.DateField(required=False)
+
+    def filter(self, queryset):
+        data = self.cleaned_data
+        if data.get("completed") is not None:
+            queryset = queryset.filter(completed=data["completed"])
+        if data.get("due_after"):
+            queryset = queryset.filter(due_date__gte=data["due_after"])
+        if data.get("due_before"):
+            queryset = queryset.filter(due_date__lte=data["due_before"])
+        return queryset
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='todo',
+            options={'ordering': ['completed', 'due_date', '-created_at', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['completed', 'due_date', '-created_at', '-id'], name='todo_list_order_idx'),
+        ),
+    ]
@@ -10,7 +10,11 @@ class Todo(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ["completed", "due_date", "-created_at"]
+        ordering = ["completed", "due_date", "-created_at", "-id"]
+        indexes = [
+            # Matches the ordering, so list pages are read in index order (see pagination.py).
+            models.Index(fields=["completed", "due_date", "-created_at", "-id"], name="todo_list_order_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.title
@@ -0,0 +1,116 @@
+"""Keyset (cursor) pagination over the TODO list ordering.
+
+Pages are read with ``WHERE <after the cursor> ... LIMIT n`` instead of
+``OFFSET``, so page 1000 costs the same as page 1. The cursor is the sort key
+of the last row shown: ``(completed, due_date, created_at, id)``.
+
+A mixed-direction key (``due_date`` ascending, ``created_at`` descending, a
+nullable column in between) cannot be compared as one row value, so the rows
+after a cursor are read as up to three index ranges, in order:
+
+1. the same ``completed`` and ``due_date``, older ``created_at``/``id``;
+2. the same ``completed``, later ``due_date`` (where NULLs sort depends on the
+   database: first on SQLite, last on PostgreSQL);
+3. ``completed=True``, when the cursor is still in the open TODOs.
+
+Each range is a seek into the ``todo_list_order_idx`` index plus an in-order
+scan, and the next range is only read when the previous one runs out.
+"""
+
+import base64
+import binascii
+import datetime
+import json
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from django.db import connections
+from django.db.models import Q, QuerySet
+
+from .models import Todo
+
+# Same as Todo.Meta.ordering; the id makes it a total order.
+ORDERING = ("completed", "due_date", "-created_at", "-id")
+
+Cursor = Tuple[bool, Optional[datetime.date], datetime.datetime, int]
+
+
+class InvalidCursor(ValueError):
+    """The cursor is not one this module produced."""
+
+
+@dataclass
+class Page:
+    items: List[Todo]
+    next_cursor: Optional[str]
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+
+def encode_cursor(todo: Todo) -> str:
+    key = [
+        todo.completed,
+        todo.due_date.isoformat() if todo.due_date else None,
+        todo.created_at.isoformat(),
+        todo.pk,
+    ]
+    raw = json.dumps(key, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(value: str) -> Cursor:
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+        completed, due_date, created_at, pk = json.loads(raw)
+        if not isinstance(completed, bool) or not isinstance(pk, int):
+            raise TypeError(pk)
+        return (
+            completed,
+            datetime.date.fromisoformat(due_date) if due_date is not None else None,
+            datetime.datetime.fromisoformat(created_at),
+            pk,
+        )
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise InvalidCursor(f"invalid cursor: {value!r}") from exc
+
+
+def _ranges(cursor: Cursor, nulls_last: bool) -> List[Q]:
+    completed, due_date, created_at, pk = cursor
+    # ``completed=True`` compiles to a bare ``WHERE completed``, which SQLite
+    # cannot seek an index with; ``IN (1)`` it can.
+    same_state = Q(completed__in=[completed])
+    same_due = Q(due_date=due_date) if due_date is not None else Q(due_date__isnull=True)
+    # created_at <= t is the seekable part; the OR only drops ties already shown.
+    older = Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(pk__lt=pk))
+    ranges = [same_state & same_due & older]
+    if due_date is not None:
+        ranges.append(same_state & Q(due_date__gt=due_date))
+        if nulls_last:
+            ranges.append(same_state & Q(due_date__isnull=True))
+    elif not nulls_last:
+        ranges.append(same_state & Q(due_date__isnull=False))
+    if not completed:
+        ranges.append(Q(completed__in=[True]))
+    return ranges
+
+
+def paginate(queryset: QuerySet, cursor: Optional[str] = None, per_page: int = 50) -> Page:
+    """The ``per_page`` rows of ``queryset`` after ``cursor`` (from the start if None)."""
+    queryset = queryset.order_by(*ORDERING)
+    # One extra row tells whether there is a next page.
+    wanted = per_page + 1
+    if cursor is None:
+        items = list(queryset[:wanted])
+    else:
+        nulls_last = connections[queryset.db].features.nulls_order_largest
+        items = []
+        for condition in _ranges(decode_cursor(cursor), nulls_last):
+            items.extend(queryset.filter(condition)[: wanted - len(items)])
+            if len(items) >= wanted:
+                break
+    if len(items) > per_page:
+        items = items[:per_page]
+        return Page(items, encode_cursor(items[-1]))
+    return Page(items, None)
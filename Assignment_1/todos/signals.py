@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_version
+from .models import Todo
+
+
+@receiver(post_save, sender=Todo, dispatch_uid="todos_cache_post_save")
+@receiver(post_delete, sender=Todo, dispatch_uid="todos_cache_post_delete")
+def invalidate_list_cache(sender, **kwargs):
+    transaction.on_commit(bump_version)
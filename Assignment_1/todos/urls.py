@@ -10,4 +10,7 @@ urlpatterns = [
     path("<int:pk>/edit/", views.edit_todo, name="edit"),
     path("<int:pk>/delete/", views.delete_todo, name="delete"),
     path("<int:pk>/toggle/", views.toggle_completion, name="toggle"),
+    path("bulk/create/", views.bulk_create, name="bulk-create"),
+    path("bulk/complete/", views.bulk_complete, name="bulk-complete"),
+    path("bulk/delete/", views.bulk_delete, name="bulk-delete"),
 ]
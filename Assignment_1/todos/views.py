@@ -1,13 +1,48 @@
+import json
+from functools import wraps
+
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
-from .forms import TodoForm
+from .cache import CSRF_PLACEHOLDER, bump_version, cached_page
+from .forms import TodoFilterForm, TodoForm
 from .models import Todo
+from .pagination import InvalidCursor, paginate
+
+PAGE_SIZE = 50
+# Seconds a rendered list page stays cached; writes invalidate it earlier.
+LIST_CACHE_TIMEOUT = 300
+# Most TODOs one bulk call may create, update or delete.
+BULK_LIMIT = 500
 
 
 def list_todos(request):
-    todos = Todo.objects.all()
-    return render(request, "todos/todo_list.html", {"todos": todos})
+    def render_page():
+        page = paginate(Todo.objects.all(), request.GET.get("cursor"), PAGE_SIZE)
+        return render_to_string(
+            "todos/todo_list.html",
+            {
+                "todos": page.items,
+                "page": page,
+                "is_first_page": "cursor" not in request.GET,
+                "csrf_token": CSRF_PLACEHOLDER,
+            },
+            request,
+        )
+
+    try:
+        html, hit = cached_page(request, render_page, LIST_CACHE_TIMEOUT)
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor")
+    response = HttpResponse(html)
+    response["X-Cache"] = "hit" if hit else "miss"
+    return response
 
 
 def create_todo(request):
@@ -55,5 +90,96 @@ def delete_todo(request, pk):
 def toggle_completion(request, pk):
     todo = get_object_or_404(Todo, pk=pk)
     todo.completed = not todo.completed
-    todo.save(update_fields=["completed"])
+    # updated_at is listed so auto_now bumps it; the API validators depend on it.
+    todo.save(update_fields=["completed", "updated_at"])
     return redirect(request.GET.get("next") or reverse("todos:list"))
+
+
+class RequestError(ValueError):
+    pass
+
+
+def json_body(request):
+    if request.content_type != "application/json":
+        raise RequestError("expected an application/json body")
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        raise RequestError("invalid JSON") from None
+    if not isinstance(data, dict):
+        raise RequestError("expected a JSON object")
+    return data
+
+
+def bulk_selection(data):
+    """The TODOs named by ``ids`` or matched by ``filter``, at most BULK_LIMIT of them."""
+    if "ids" in data:
+        ids = data["ids"]
+        if not isinstance(ids, list) or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+            raise RequestError("ids must be a list of integers")
+        if len(ids) > BULK_LIMIT:
+            raise RequestError(f"at most {BULK_LIMIT} ids per call")
+        return Todo.objects.filter(pk__in=ids)
+    if "filter" in data:
+        form = TodoFilterForm(data["filter"] if isinstance(data["filter"], dict) else None)
+        if not form.is_valid():
+            raise RequestError(f"invalid filter: {form.errors.get_json_data()}")
+        queryset = form.filter(Todo.objects.all())
+        matched = queryset.count()
+        if matched > BULK_LIMIT:
+            raise RequestError(f"filter matches {matched} TODOs, at most {BULK_LIMIT} per call")
+        return queryset
+    raise RequestError("give ids or filter")
+
+
+def bulk_endpoint(view):
+    # JSON-only, so a cross-site form cannot post here without a CORS preflight.
+    @csrf_exempt
+    @require_POST
+    @wraps(view)
+    def wrapper(request):
+        try:
+            with transaction.atomic():
+                return view(request, json_body(request))
+        except RequestError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+
+    return wrapper
+
+
+@bulk_endpoint
+def bulk_create(request, data):
+    items = data.get("todos")
+    if not isinstance(items, list) or not items:
+        raise RequestError("todos must be a non-empty list")
+    if len(items) > BULK_LIMIT:
+        raise RequestError(f"at most {BULK_LIMIT} todos per call")
+    todos, errors = [], {}
+    for i, item in enumerate(items):
+        form = TodoForm(item if isinstance(item, dict) else None)
+        if form.is_valid():
+            todos.append(form.save(commit=False))
+        else:
+            errors[i] = form.errors.get_json_data()
+    if errors:
+        return JsonResponse({"error": "invalid todos", "errors": errors}, status=400)
+    created = Todo.objects.bulk_create(todos)
+    transaction.on_commit(bump_version)  # bulk_create sends no post_save
+    return JsonResponse({"created": len(created), "ids": [todo.pk for todo in created]}, status=201)
+
+
+@bulk_endpoint
+def bulk_complete(request, data):
+    completed = data.get("completed", True)
+    if not isinstance(completed, bool):
+        raise RequestError("completed must be true or false")
+    # update() skips auto_now and post_save, so both are done here.
+    updated = bulk_selection(data).update(completed=completed, updated_at=timezone.now())
+    transaction.on_commit(bump_version)
+    return JsonResponse({"updated": updated})
+
+
+@bulk_endpoint
+def bulk_delete(request, data):
+    deleted, _ = bulk_selection(data).delete()
+    return JsonResponse({"deleted": deleted})
@@ -1,8 +1,12 @@
 import { useEffect, useMemo, useRef, useState } from "react";
 import Editor from "@monaco-editor/react";
 import { io } from "socket.io-client";
+import { OTClient, fromMonacoChanges } from "./ot";
+import { WIRE_FORMAT, unpack } from "./wire";
 
 const API_URL = import.meta.env.VITE_API_URL || window.location.origin;
+// Build with VITE_SERVER_RUN=1 to run Python on the server (needs RUN_WORKERS there).
+const SERVER_RUN = import.meta.env.VITE_SERVER_RUN === "1";
 const INITIAL_SNIPPETS = {
   python: "# Start coding\n",
   javascript: "// Start coding\n"
@@ -16,27 +20,126 @@ function App() {
   const [code, setCode] = useState(INITIAL_SNIPPETS.python);
   const [output, setOutput] = useState("Ready.");
   const [pyLoading, setPyLoading] = useState(false);
+  const [participants, setParticipants] = useState(0);
   const socketRef = useRef(null);
   const pyodideRef = useRef(null);
+  const editorRef = useRef(null);
+  const sessionRef = useRef(sessionId);
+  const otRef = useRef(null);
+  const runIdRef = useRef(null);
+  // Set while remote text is written into Monaco so it is not echoed back as a local edit.
+  const applyingRemoteRef = useRef(false);
+
+  const replaceEditorText = (text) => {
+    const model = editorRef.current?.getModel();
+    if (!model || model.getValue() === text) return;
+    applyingRemoteRef.current = true;
+    try {
+      model.setValue(text);
+    } finally {
+      applyingRemoteRef.current = false;
+    }
+  };
+
+  const applyRemoteOp = (op) => {
+    const model = editorRef.current?.getModel();
+    if (!model) return;
+    const rangeAt = (start, end) => {
+      const from = model.getPositionAt(start);
+      const to = model.getPositionAt(end);
+      return {
+        startLineNumber: from.lineNumber,
+        startColumn: from.column,
+        endLineNumber: to.lineNumber,
+        endColumn: to.column
+      };
+    };
+    const edits = [];
+    let pos = 0;
+    let pendingInsert = null;
+    for (const comp of op) {
+      if (typeof comp === "string") {
+        pendingInsert = comp;
+        continue;
+      }
+      if (comp < 0) {
+        edits.push({ range: rangeAt(pos, pos - comp), text: pendingInsert || "" });
+        pos -= comp;
+      } else {
+        if (pendingInsert) edits.push({ range: rangeAt(pos, pos), text: pendingInsert });
+        pos += comp;
+      }
+      pendingInsert = null;
+    }
+    if (pendingInsert) edits.push({ range: rangeAt(pos, pos), text: pendingInsert });
+    applyingRemoteRef.current = true;
+    try {
+      model.applyEdits(edits);
+    } finally {
+      applyingRemoteRef.current = false;
+    }
+    setCode(model.getValue());
+  };
 
   // Build socket only once
   useEffect(() => {
     const socket = io(API_URL, {
       transports: ["websocket", "polling"],
-      autoConnect: false
+      autoConnect: false,
+      auth: { wire: WIRE_FORMAT }
     });
     socketRef.current = socket;
+    otRef.current = new OTClient(0, (revision, ops) => {
+      socket.emit("code_ops", { room: sessionRef.current, revision, ops }, (ack) => {
+        // A rejected op is followed by a state_sync that resets the client.
+        if (ack?.ok) otRef.current.ack(ack.revision);
+      });
+    });
+    const syncFullText = (payload) => {
+      otRef.current.reset(payload.revision ?? 0);
+      replaceEditorText(payload.code);
+      setCode(payload.code);
+    };
+    // Server events may arrive as msgpack (see ./wire.js).
+    const on = (event, handler) => socket.on(event, (payload) => handler(unpack(payload)));
     socket.on("connect_error", (err) => {
       setOutput(`Socket error: ${err.message}`);
     });
-    socket.on("state_sync", (state) => {
-      if (state?.code !== undefined) setCode(state.code);
+    on("state_sync", (state) => {
+      if (state?.code !== undefined) syncFullText(state);
       if (state?.language) setLanguage(state.language);
     });
-    socket.on("code_update", (payload) => {
-      if (payload?.code !== undefined) setCode(payload.code);
+    // Full-document updates still arrive from clients using the legacy code_change event.
+    on("code_update", (payload) => {
+      if (payload?.code !== undefined) syncFullText(payload);
+    });
+    on("presence_update", (payload) => {
+      if (payload?.room === sessionRef.current) setParticipants(payload.count);
+    });
+    on("ops_update", (payload) => {
+      const remote = otRef.current.applyRemote(payload.revision, payload.ops);
+      if (remote) applyRemoteOp(remote);
     });
-    socket.on("language_update", (payload) => {
+    // Server-side runs stream to the whole room; a new runId starts a fresh output.
+    on("run_output", (payload) => {
+      if (!payload?.runId) return;
+      const fresh = payload.runId !== runIdRef.current;
+      runIdRef.current = payload.runId;
+      setOutput((prev) => (fresh ? "" : prev) + payload.data);
+    });
+    on("run_result", (payload) => {
+      if (!payload?.runId) return;
+      const fresh = payload.runId !== runIdRef.current;
+      runIdRef.current = payload.runId;
+      let status = payload.error ? `Run failed: ${payload.error}` : `exit code ${payload.exitCode}`;
+      if (payload.timedOut) status = "Timed out";
+      if (payload.truncated) status += " (output truncated)";
+      setOutput((prev) => {
+        const text = fresh ? "" : prev;
+        return `${text}${text && !text.endsWith("\n") ? "\n" : ""}[${status}]`;
+      });
+    });
+    on("language_update", (payload) => {
       if (payload?.language) setLanguage(payload.language);
     });
     return () => {
@@ -47,12 +150,17 @@ function App() {
   // Join room when sessionId present
   useEffect(() => {
     const socket = socketRef.current;
+    sessionRef.current = sessionId;
     if (!socket || !sessionId) return;
     if (!socket.connected) socket.connect();
     socket.emit("join", { room: sessionId });
     const url = new URL(window.location.href);
     url.searchParams.set("room", sessionId);
     window.history.replaceState({}, "", url.toString());
+    return () => {
+      socket.emit("leave", { room: sessionId });
+      setParticipants(0);
+    };
   }, [sessionId]);
 
   const createSession = async () => {
@@ -74,11 +182,12 @@ function App() {
     return url.toString();
   }, [sessionId]);
 
-  const onCodeChange = (value) => {
-    setCode(value || "");
-    if (socketRef.current && sessionId) {
-      socketRef.current.emit("code_change", { room: sessionId, code: value || "" });
-    }
+  const onCodeChange = (value, event) => {
+    const text = value || "";
+    setCode(text);
+    if (applyingRemoteRef.current || !event || !socketRef.current || !sessionId) return;
+    const delta = event.changes.reduce((sum, c) => sum + c.text.length - c.rangeLength, 0);
+    otRef.current.applyLocal(fromMonacoChanges(event.changes, text.length - delta));
   };
 
   const onLanguageChange = (value) => {
@@ -86,7 +195,8 @@ function App() {
       const newLang = value;
       // If code is still at the untouched template for the previous language, swap to new template.
       if (code === INITIAL_SNIPPETS[prevLang]) {
-        setCode(INITIAL_SNIPPETS[newLang]);
+        // Goes through onCodeChange, so the swap is synced like any other edit.
+        editorRef.current?.getModel()?.setValue(INITIAL_SNIPPETS[newLang]);
       }
       if (socketRef.current && sessionId) {
         socketRef.current.emit("language_change", { room: sessionId, language: newLang });
@@ -136,7 +246,18 @@ function App() {
     }
   };
 
+  const runOnServer = () => {
+    setOutput("Running on server…");
+    socketRef.current.emit("run_code", { room: sessionId, code }, (ack) => {
+      if (!ack?.ok) setOutput(`Run failed: ${ack?.error || "no response"}`);
+    });
+  };
+
   const runPython = async () => {
+    if (SERVER_RUN) {
+      runOnServer();
+      return;
+    }
     try {
       const pyodide = await ensurePyodide();
       let buf = "";
@@ -188,6 +309,7 @@ function App() {
             Run {language}
           </button>
           {pyLoading && <span>Loading Pyodide…</span>}
+          {participants > 0 && <span>{participants} online</span>}
         </div>
       </div>
 
@@ -198,7 +320,10 @@ function App() {
             height="65vh"
             theme="vs-light"
             language={language === "python" ? "python" : "javascript"}
-            value={code}
+            defaultValue={code}
+            onMount={(editor) => {
+              editorRef.current = editor;
+            }}
             onChange={onCodeChange}
             options={{
               minimap: { enabled: false },
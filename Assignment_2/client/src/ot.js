@@ -0,0 +1,199 @@
+// Text operations shared with the server (see server/app/ot.py).
+// An op is an array: positive int = retain, negative int = delete, string = insert.
+
+const isRetain = (c) => typeof c === "number" && c > 0;
+const isDelete = (c) => typeof c === "number" && c < 0;
+const isInsert = (c) => typeof c === "string";
+
+class Builder {
+  constructor() {
+    this.ops = [];
+  }
+
+  retain(n) {
+    if (n <= 0) return;
+    const last = this.ops.length - 1;
+    if (isRetain(this.ops[last])) this.ops[last] += n;
+    else this.ops.push(n);
+  }
+
+  delete(n) {
+    if (n <= 0) return;
+    const last = this.ops.length - 1;
+    if (isDelete(this.ops[last])) this.ops[last] -= n;
+    else this.ops.push(-n);
+  }
+
+  insert(text) {
+    if (!text) return;
+    const ops = this.ops;
+    const last = ops.length - 1;
+    if (isInsert(ops[last])) {
+      ops[last] += text;
+    } else if (isDelete(ops[last])) {
+      if (isInsert(ops[last - 1])) ops[last - 1] += text;
+      else ops.splice(last, 0, text);
+    } else {
+      ops.push(text);
+    }
+  }
+}
+
+const consume = (comp, step, ops, index) => {
+  const remaining = Math.abs(comp) - step;
+  if (remaining === 0) return [ops[index], index + 1];
+  return [comp > 0 ? remaining : -remaining, index];
+};
+
+export function apply(doc, op) {
+  const parts = [];
+  let pos = 0;
+  for (const comp of op) {
+    if (isRetain(comp)) {
+      parts.push(doc.slice(pos, pos + comp));
+      pos += comp;
+    } else if (isDelete(comp)) {
+      pos -= comp;
+    } else {
+      parts.push(comp);
+    }
+  }
+  return parts.join("");
+}
+
+export function transform(a, b) {
+  const aPrime = new Builder();
+  const bPrime = new Builder();
+  let i1 = 0;
+  let i2 = 0;
+  let op1 = a[i1++];
+  let op2 = b[i2++];
+  while (op1 !== undefined || op2 !== undefined) {
+    if (isInsert(op1)) {
+      aPrime.insert(op1);
+      bPrime.retain(op1.length);
+      op1 = a[i1++];
+      continue;
+    }
+    if (isInsert(op2)) {
+      aPrime.retain(op2.length);
+      bPrime.insert(op2);
+      op2 = b[i2++];
+      continue;
+    }
+    if (op1 === undefined || op2 === undefined) throw new Error("operations have mismatched lengths");
+    let step;
+    if (isRetain(op1) && isRetain(op2)) {
+      step = Math.min(op1, op2);
+      aPrime.retain(step);
+      bPrime.retain(step);
+    } else if (isDelete(op1) && isDelete(op2)) {
+      step = Math.min(-op1, -op2);
+    } else if (isDelete(op1)) {
+      step = Math.min(-op1, op2);
+      aPrime.delete(step);
+    } else {
+      step = Math.min(op1, -op2);
+      bPrime.delete(step);
+    }
+    [op1, i1] = consume(op1, step, a, i1);
+    [op2, i2] = consume(op2, step, b, i2);
+  }
+  return [aPrime.ops, bPrime.ops];
+}
+
+export function compose(a, b) {
+  const result = new Builder();
+  let i1 = 0;
+  let i2 = 0;
+  let op1 = a[i1++];
+  let op2 = b[i2++];
+  while (op1 !== undefined || op2 !== undefined) {
+    if (isDelete(op1)) {
+      result.delete(-op1);
+      op1 = a[i1++];
+      continue;
+    }
+    if (isInsert(op2)) {
+      result.insert(op2);
+      op2 = b[i2++];
+      continue;
+    }
+    if (op1 === undefined || op2 === undefined) throw new Error("operations have mismatched lengths");
+    if (isInsert(op1)) {
+      const step = Math.min(op1.length, Math.abs(op2));
+      if (isRetain(op2)) result.insert(op1.slice(0, step));
+      if (step < op1.length) op1 = op1.slice(step);
+      else op1 = a[i1++];
+      [op2, i2] = consume(op2, step, b, i2);
+    } else {
+      const step = Math.min(op1, Math.abs(op2));
+      if (isRetain(op2)) result.retain(step);
+      else result.delete(step);
+      [op1, i1] = consume(op1, step, a, i1);
+      [op2, i2] = consume(op2, step, b, i2);
+    }
+  }
+  return result.ops;
+}
+
+// Monaco reports every change of one edit against the pre-edit model, so apply
+// them from the end of the document backwards and compose the results.
+export function fromMonacoChanges(changes, docLength) {
+  let op = null;
+  let length = docLength;
+  const sorted = [...changes].sort((x, y) => y.rangeOffset - x.rangeOffset);
+  for (const change of sorted) {
+    const builder = new Builder();
+    builder.retain(change.rangeOffset);
+    builder.delete(change.rangeLength);
+    builder.insert(change.text);
+    builder.retain(length - change.rangeOffset - change.rangeLength);
+    op = op ? compose(op, builder.ops) : builder.ops;
+    length += change.text.length - change.rangeLength;
+  }
+  return op || [];
+}
+
+// Client side of the revision protocol: at most one op is in flight, later
+// local edits are composed into a buffer, and remote ops are transformed past both.
+export class OTClient {
+  constructor(revision, send) {
+    this.revision = revision;
+    this.send = send;
+    this.outstanding = null;
+    this.buffer = null;
+  }
+
+  reset(revision) {
+    this.revision = revision;
+    this.outstanding = null;
+    this.buffer = null;
+  }
+
+  applyLocal(op) {
+    if (!op.length) return;
+    if (this.outstanding) {
+      this.buffer = this.buffer ? compose(this.buffer, op) : op;
+    } else {
+      this.outstanding = op;
+      this.send(this.revision, op);
+    }
+  }
+
+  applyRemote(revision, op) {
+    if (revision <= this.revision) return null;
+    this.revision = revision;
+    let remote = op;
+    if (this.outstanding) [this.outstanding, remote] = transform(this.outstanding, remote);
+    if (this.buffer) [this.buffer, remote] = transform(this.buffer, remote);
+    return remote;
+  }
+
+  ack(revision) {
+    this.revision = revision;
+    this.outstanding = this.buffer;
+    this.buffer = null;
+    if (this.outstanding) this.send(this.revision, this.outstanding);
+  }
+}
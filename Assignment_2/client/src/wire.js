@@ -0,0 +1,11 @@
+import { decode } from "@msgpack/msgpack";
+
+// Opt in with VITE_WIRE_FORMAT=msgpack: the server then sends events as one
+// msgpack-encoded binary attachment instead of JSON. Outgoing events stay JSON.
+export const WIRE_FORMAT = import.meta.env.VITE_WIRE_FORMAT === "msgpack" ? "msgpack" : "json";
+
+// Binary payloads are msgpack; anything else is already-decoded JSON.
+export function unpack(payload) {
+  if (payload instanceof ArrayBuffer || ArrayBuffer.isView(payload)) return decode(payload);
+  return payload;
+}
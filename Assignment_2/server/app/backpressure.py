@@ -0,0 +1,266 @@
+"""Per-client rate limits and coalescing of updates for slow consumers.
+
+``RateLimiter`` keeps one token bucket per sid, shared by all of the
+client's limited events in every room. A client over its rate is delayed for
+up to ``max_wait`` seconds and refused beyond that; ``LatestWins`` throttles
+events where only the newest value matters (a full document, a language) by
+holding one pending value per key and replacing it, so a refused value waits
+for the bucket instead of going through or being lost.
+
+``Coalescer`` protects the other direction: when a client's outbound queue
+backs up, room updates for it are held and merged (consecutive ops are
+composed, a full document supersedes everything before it) and sent as one
+update once the queue drains, or right before the client's next ack so acks
+never overtake the updates they follow.
+"""
+
+import asyncio
+import base64
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+import socketio
+from socketio.packet import Packet
+
+from app import ot
+from app.metrics import COALESCED_UPDATES, RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+Send = Callable[[str, str, Any], Awaitable[None]]
+# hold(event, room, payload, skip_sids) -> extra sids to skip; ``payload()`` decodes the data.
+Hold = Callable[[str, str, Callable[[], Any], List[str]], List[str]]
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, clock=time.monotonic) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """Take a token; seconds to wait before using it, or None past ``max_wait``."""
+        now = self._clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        wait = (1 - self.tokens) / self.rate
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+
+class RateLimiter:
+    """A token bucket per sid; a rate of 0 disables limiting."""
+
+    def __init__(self, rate: float, burst: float, max_wait: float = 1.0, clock=time.monotonic) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_wait = max_wait
+        self._clock = clock
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def reserve(self, sid: str) -> Optional[float]:
+        """Seconds ``sid`` must wait before its next event, or None if it is over the limit."""
+        if self.rate <= 0:
+            return 0.0
+        bucket = self._buckets.get(sid)
+        if bucket is None:
+            bucket = self._buckets[sid] = TokenBucket(self.rate, self.burst, self._clock)
+        return bucket.reserve(self.max_wait)
+
+    def forget(self, sid: str) -> None:
+        self._buckets.pop(sid, None)
+
+
+class LatestWins:
+    """Rate-limited calls where a newer value replaces one still waiting."""
+
+    def __init__(self, limiter: RateLimiter) -> None:
+        self.limiter = limiter
+        self._pending: Dict[Tuple[str, Hashable], Any] = {}
+
+    async def submit(self, sid: str, key: Hashable, value: Any, apply: Callable[[Any], Awaitable[None]]) -> bool:
+        """Run ``apply`` with the newest value; False if ``value`` joined a waiting call.
+
+        ``key`` (an event name, or a tuple starting with one) separates values
+        that must not replace each other; the rate budget is the sid's.
+        """
+        event = key[0] if isinstance(key, tuple) else key
+        slot = (sid, key)
+        if slot in self._pending:
+            self._pending[slot] = value
+            COALESCED_UPDATES.inc(event)
+            return False
+        wait = self.limiter.reserve(sid)
+        if wait == 0:
+            await apply(value)
+            return True
+        self._pending[slot] = value
+        try:
+            if wait is None:
+                RATE_LIMITED.inc(event)
+            while wait is None:
+                # Over the limit: hold the newest value until a token is due.
+                await asyncio.sleep(self.limiter.max_wait or 1 / self.limiter.rate)
+                wait = self.limiter.reserve(sid)
+            await asyncio.sleep(wait)
+        finally:
+            value = self._pending.pop(slot)
+        await apply(value)
+        return True
+
+
+class Coalescer:
+    """Holds room updates for clients whose outbound queue is over ``max_queue``.
+
+    ``queue_size(sid)`` reports the client's queued packets and ``send(sid,
+    event, payload)`` delivers one update straight to it. Held updates are
+    kept per sid and room in arrival order, merged where possible.
+    """
+
+    def __init__(
+        self,
+        queue_size: Callable[[str], int],
+        send: Send,
+        max_queue: int = 64,
+        interval: float = 0.05,
+    ) -> None:
+        self.queue_size = queue_size
+        self.send = send
+        self.max_queue = max_queue
+        self.interval = interval
+        self._held: Dict[str, Dict[str, List[List[Any]]]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.held = 0
+        self.coalesced = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"lagging_sids": len(self._held), "held": self.held, "coalesced": self.coalesced}
+
+    def lagging(self, sid: str) -> bool:
+        return sid in self._held or (self.max_queue > 0 and self.queue_size(sid) > self.max_queue)
+
+    def hold(self, sid: str, room: str, event: str, payload: Dict[str, Any]) -> None:
+        updates = self._held.setdefault(sid, {}).setdefault(room, [])
+        self.held += 1
+        if self._merge(updates, event, payload):
+            self.coalesced += 1
+            COALESCED_UPDATES.inc(event)
+        else:
+            updates.append([event, payload])
+        task = self._tasks.get(sid)
+        if task is None or task.done():
+            self._tasks[sid] = asyncio.get_running_loop().create_task(self._drain(sid))
+
+    def _merge(self, updates: List[List[Any]], event: str, payload: Dict[str, Any]) -> bool:
+        if event == "code_update":
+            # A full document supersedes every held edit of the room.
+            kept = [update for update in updates if update[0] not in ("code_update", "ops_update")]
+            merged = len(kept) < len(updates)
+            updates[:] = kept + [[event, payload]]
+            return merged
+        if event == "language_update":
+            for update in updates:
+                if update[0] == event:
+                    update[1] = payload
+                    return True
+            return False
+        if event == "ops_update" and updates:
+            last_event, last = updates[-1]
+            try:
+                if last_event == "ops_update":
+                    updates[-1][1] = {"revision": payload["revision"], "ops": ot.compose(last["ops"], payload["ops"])}
+                    return True
+                if last_event == "code_update":
+                    updates[-1][1] = {"code": ot.apply(last["code"], payload["ops"]), "revision": payload["revision"]}
+                    return True
+            except (ot.OperationError, KeyError, TypeError):
+                pass
+        return False
+
+    async def flush(self, sid: str) -> None:
+        """Send everything held for ``sid`` now, e.g. before an ack."""
+        rooms = self._held.pop(sid, None)
+        if not rooms:
+            return
+        for updates in rooms.values():
+            for event, payload in updates:
+                await self.send(sid, event, payload)
+
+    def forget(self, sid: str, room: Optional[str] = None) -> None:
+        """Drop held updates, e.g. when the client is about to get a full ``state_sync``."""
+        if room is None:
+            self._held.pop(sid, None)
+            task = self._tasks.pop(sid, None)
+            if task is not None:
+                task.cancel()
+        else:
+            self._held.get(sid, {}).pop(room, None)
+
+    async def _drain(self, sid: str) -> None:
+        try:
+            while sid in self._held:
+                if self.queue_size(sid) <= self.max_queue // 2:
+                    await self.flush(sid)
+                    break
+                await asyncio.sleep(self.interval)
+        except Exception as exc:  # pragma: no cover - diagnostic
+            logger.warning("coalesced flush failed sid=%s error=%r", sid, exc)
+        finally:
+            if self._tasks.get(sid) is asyncio.current_task():
+                del self._tasks[sid]
+
+
+def _sids(skip_sid: Any) -> List[str]:
+    if skip_sid is None:
+        return []
+    return list(skip_sid) if isinstance(skip_sid, list) else [skip_sid]
+
+
+def _payload(message: Dict[str, Any]) -> Any:
+    data = message["data"]
+    if message.get("binary"):
+        data = Packet.reconstruct_binary(data[0], [base64.b64decode(a) for a in data[1:]])
+    return data[0] if isinstance(data, list) and len(data) == 1 else data
+
+
+class HoldingManager(socketio.AsyncManager):
+    """In-process client manager that lets ``hold`` divert room emits."""
+
+    hold: Optional[Hold] = None
+
+    async def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, to=None, **kwargs):
+        room = to or room
+        if self.hold is not None and room is not None:
+            skip = _sids(skip_sid)
+            skip_sid = skip + self.hold(event, room, lambda: data, skip)
+        return await super().emit(event, data, namespace, room=room, skip_sid=skip_sid, callback=callback, **kwargs)
+
+
+class HoldingPubSubMixin:
+    """For pub/sub client managers: ``hold`` sees every emit delivered on this host.
+
+    Emits sent with ``ignore_queue=True`` bypass it, which is how held updates
+    are flushed.
+    """
+
+    hold: Optional[Hold] = None
+
+    async def _handle_emit(self, message):
+        if self.hold is not None and message.get("room") is not None:
+            skip = _sids(message.get("skip_sid"))
+            held = self.hold(message["event"], message["room"], lambda: _payload(message), skip)
+            if held:
+                message = {**message, "skip_sid": skip + held}
+        await super()._handle_emit(message)
+
+
+class HoldingRedisManager(HoldingPubSubMixin, socketio.AsyncRedisManager):
+    pass
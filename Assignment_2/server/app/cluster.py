@@ -0,0 +1,400 @@
+"""Room affinity for running several workers against one Redis.
+
+Every worker is started with the same worker list, and a consistent-hash ring
+maps each room to exactly one owner. Only the owner applies edits, keeps the
+op history and persists the room; other workers forward room operations to it
+over Redis pub/sub and relay the reply (``ClusterRouter``).
+
+Socket.IO broadcasts are published on a channel per room, and a worker only
+subscribes to the channels of rooms it has clients in (``RoomChannelManager``),
+so traffic for a room reaches the workers serving it and nobody else.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import json
+import logging
+from bisect import bisect_right
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import uuid4
+
+import socketio
+
+from app.backpressure import HoldingPubSubMixin
+
+logger = logging.getLogger(__name__)
+
+RoomHandler = Callable[..., Awaitable[Any]]
+ChannelHandler = Callable[[Any], Awaitable[None]]
+
+
+class ClusterError(RuntimeError):
+    """A forwarded room operation failed or its owner did not answer."""
+
+
+# Reply listeners waiting for the current socket handler to finish; see holding_replies.
+_held: contextvars.ContextVar[Optional[List[asyncio.Event]]] = contextvars.ContextVar("held_replies", default=None)
+
+
+def _release_held() -> None:
+    held = _held.get()
+    while held:
+        held.pop().set()
+
+
+@contextlib.contextmanager
+def holding_replies():
+    """Keep the reply listener paused until the block exits (wrap socket handlers in it).
+
+    The last forwarded reply received in the block releases the listener only
+    on exit. python-socketio queues a handler's ack as soon as the handler
+    returns, before it yields to the event loop, so the paused listener cannot
+    deliver a later room broadcast ahead of the ack. Starting another forward
+    releases the listener for the previous reply, which the handler has then
+    finished with.
+    """
+    token = _held.set([])
+    try:
+        yield
+    finally:
+        _release_held()
+        _held.reset(token)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing with virtual nodes.
+
+    Adding or removing a worker only moves the rooms that hash next to its
+    points, about ``1/len(nodes)`` of them.
+    """
+
+    def __init__(self, nodes: Iterable[str], replicas: int = 64) -> None:
+        self.nodes = sorted(set(nodes))
+        if not self.nodes:
+            raise ValueError("a hash ring needs at least one node")
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas))
+        self._keys = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str) -> str:
+        index = bisect_right(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[index]
+
+
+class RoomChannelManager(HoldingPubSubMixin, socketio.AsyncRedisManager):
+    """Redis client manager that publishes room emits on per-room channels.
+
+    Emits to a room go to ``{channel}:room:{room}``; call ``watch``/``unwatch``
+    as the room gains its first and loses its last local client. ``watch``
+    returns once Redis has confirmed the subscription, so nothing published
+    after it is missed. Emits to a locally connected sid are not published at
+    all. Everything else (emits to the whole namespace, disconnects,
+    callbacks) uses the shared ``channel``.
+    """
+
+    name = "aioredis-rooms"
+
+    def __init__(
+        self,
+        url: str,
+        channel: str = "socketio",
+        redis_options: Optional[dict] = None,
+        subscribe_timeout: float = 2.0,
+    ) -> None:
+        super().__init__(url, channel=channel, redis_options=redis_options)
+        self.subscribe_timeout = subscribe_timeout
+        self._room_channels: Set[str] = set()
+        self._channel_handlers: Dict[str, ChannelHandler] = {}
+        self._confirmations: Dict[str, asyncio.Future] = {}
+        self._subscribed = False
+
+    def room_channel(self, room: str) -> str:
+        return f"{self.channel}:room:{room}"
+
+    @property
+    def watched(self) -> Set[str]:
+        return set(self._room_channels)
+
+    async def on_channel(self, channel: str, handler: ChannelHandler) -> None:
+        """Pass raw messages on ``channel`` to ``handler`` instead of Socket.IO.
+
+        They arrive on the same connection as room emits and the next message
+        is not handled until ``handler`` returns, so anything it sends to
+        clients goes out in publish order relative to those emits.
+        """
+        self._channel_handlers[channel] = handler
+        await self._subscribe(channel)
+
+    async def watch(self, room: str) -> None:
+        channel = self.room_channel(room)
+        if channel in self._room_channels:
+            return
+        self._room_channels.add(channel)
+        await self._subscribe(channel)
+
+    async def _subscribe(self, channel: str) -> None:
+        confirmed = self._confirmations[channel] = asyncio.get_running_loop().create_future()
+        try:
+            if self._subscribed:
+                await self.pubsub.subscribe(channel)
+            # Before the listener connects, it subscribes to every watched channel itself.
+            await asyncio.wait_for(confirmed, self.subscribe_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("pubsub subscribe not confirmed channel=%s", channel)
+        finally:
+            self._confirmations.pop(channel, None)
+
+    async def unwatch(self, room: str) -> None:
+        channel = self.room_channel(room)
+        if channel not in self._room_channels:
+            return
+        self._room_channels.discard(channel)
+        if self._subscribed:
+            await self.pubsub.unsubscribe(channel)
+
+    def channel_for(self, message: Dict[str, Any]) -> Optional[str]:
+        """Channel to publish ``message`` on, or None if no other worker needs it."""
+        room = message.get("room")
+        if message.get("method") != "emit" or not isinstance(room, str):
+            return self.channel
+        if self.is_connected(room, message.get("namespace") or "/"):
+            return None
+        return self.room_channel(room)
+
+    async def _publish(self, data):
+        channel = self.channel_for(data)
+        if channel is None:
+            return None
+        for retries_left in range(1, -1, -1):
+            try:
+                if not self.connected:
+                    self._redis_connect()
+                return await self.redis.publish(channel, self.json.dumps(data))
+            except Exception as exc:  # pragma: no cover - diagnostic
+                self.connected = False
+                if not retries_left:
+                    logger.warning("pubsub publish failed channel=%s error=%r", channel, exc)
+
+    def _redis_connect(self):
+        super()._redis_connect()
+        # Subscribe confirmations are needed to resolve ``watch``.
+        self.pubsub = self.redis.pubsub()
+
+    async def _redis_listen_with_retries(self):  # pragma: no cover - needs a broken Redis
+        retry_sleep = 1
+        while True:
+            try:
+                if not self._subscribed:
+                    self._redis_connect()
+                    channels = self._room_channels | set(self._channel_handlers)
+                    await self.pubsub.subscribe(self.channel, *channels)
+                    self._subscribed = True
+                    # Channels added while the subscribe above was in flight.
+                    missed = (self._room_channels | set(self._channel_handlers)) - channels
+                    if missed:
+                        await self.pubsub.subscribe(*missed)
+                    retry_sleep = 1
+                async for message in self.pubsub.listen():
+                    yield message
+            except Exception as exc:
+                logger.warning("pubsub listen failed, retrying in %ss error=%r", retry_sleep, exc)
+                self._subscribed = False
+                await asyncio.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 60)
+
+    async def _listen(self):
+        async for message in self._redis_listen_with_retries():
+            channel = message["channel"]
+            channel = channel.decode("utf-8") if isinstance(channel, bytes) else channel
+            if message["type"] == "message" and "data" in message:
+                handler = self._channel_handlers.get(channel)
+                if handler is None:
+                    yield message["data"]
+                else:
+                    await handler(message["data"])
+            elif message["type"] == "subscribe":
+                confirmed = self._confirmations.get(channel)
+                if confirmed is not None and not confirmed.done():
+                    confirmed.set_result(True)
+
+
+class ClusterRouter:
+    """Runs room operations on the room's owner worker.
+
+    Handlers are registered by name with ``handler``; ``call`` runs one
+    directly when this worker owns the room and otherwise publishes the request
+    to the owner's inbox channel and waits for its reply. Arguments and results
+    must be JSON-serialisable. Without a Redis client the router is a plain
+    local dispatcher.
+
+    Operations on one room run one at a time under ``lock(room)``, and a
+    forwarded reply is published before the lock is released. Pass the
+    worker's ``RoomChannelManager`` as ``manager`` to receive replies on its
+    connection, and run socket handlers under ``holding_replies``: together
+    these keep every reply in order with the room's broadcasts, so a client
+    never sees its ack out of order with other ops.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        worker_id: str,
+        workers: Iterable[str],
+        timeout: float = 5.0,
+        prefix: str = "cluster:worker:",
+        manager: Optional[RoomChannelManager] = None,
+        lock: Optional[Callable[[str], asyncio.Lock]] = None,
+    ) -> None:
+        self.client = client
+        self.manager = manager
+        self.lock = lock
+        self.worker_id = worker_id
+        self.ring = HashRing(workers)
+        self.timeout = timeout
+        self.prefix = prefix
+        self.forwarded = 0
+        self.served = 0
+        self._handlers: Dict[str, RoomHandler] = {}
+        # request id -> (reply future, set once the caller has used the reply)
+        self._pending: Dict[str, Tuple[asyncio.Future, asyncio.Event]] = {}
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+        self._serving: Set[asyncio.Task] = set()
+
+    def handler(self, func: RoomHandler) -> RoomHandler:
+        self._handlers[func.__name__] = func
+        return func
+
+    def owner(self, room: str) -> str:
+        return self.ring.owner(room)
+
+    def is_owner(self, room: str) -> bool:
+        return self.client is None or self.owner(room) == self.worker_id
+
+    def inbox(self, worker_id: str) -> str:
+        return f"{self.prefix}{worker_id}"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "workers": self.ring.nodes,
+            "forwarded": self.forwarded,
+            "served": self.served,
+            "pending": len(self._pending),
+        }
+
+    async def call(self, room: str, method: str, **kwargs: Any) -> Any:
+        if self.is_owner(room):
+            async with self._locked(room):
+                return await self._handlers[method](room, **kwargs)
+        return await self._forward(self.owner(room), room, method, kwargs)
+
+    def _locked(self, room: str):
+        return self.lock(room) if self.lock else contextlib.nullcontext()
+
+    async def start(self) -> None:
+        if self.client is None or self._task is not None:
+            return
+        if self.manager is not None:
+            await self.manager.on_channel(self.inbox(self.worker_id), self._receive)
+            return
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.inbox(self.worker_id))
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.set_exception(ClusterError("router closed"))
+
+    async def _forward(self, owner: str, room: str, method: str, args: Dict[str, Any]) -> Any:
+        # The caller is done with any earlier reply; its listener must be free
+        # to deliver this one.
+        _release_held()
+        request_id = uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        consumed = asyncio.Event()
+        self._pending[request_id] = (future, consumed)
+        request = {"id": request_id, "reply_to": self.worker_id, "method": method, "room": room, "args": args}
+        held = _held.get()
+        try:
+            receivers = await self.client.publish(self.inbox(owner), json.dumps(request))
+            if not receivers:
+                raise ClusterError(f"owner {owner} of room {room} is not listening")
+            self.forwarded += 1
+            try:
+                reply = await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                raise ClusterError(f"owner {owner} of room {room} did not answer {method}") from None
+        except BaseException:
+            consumed.set()
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+        if held is None:
+            consumed.set()
+        else:
+            held.append(consumed)
+        if "error" in reply:
+            raise ClusterError(reply["error"])
+        return reply.get("result")
+
+    async def _run(self) -> None:
+        async for message in self._pubsub.listen():
+            if message["type"] == "message":
+                await self._receive(message["data"])
+
+    async def _receive(self, raw: Any) -> None:
+        try:
+            data = json.loads(raw)
+        except ValueError:  # pragma: no cover - diagnostic
+            logger.warning("cluster dropped malformed message worker=%s", self.worker_id)
+            return
+        if "method" in data:
+            task = asyncio.create_task(self._serve(data))
+            self._serving.add(task)
+            task.add_done_callback(self._serving.discard)
+            return
+        pending = self._pending.get(data.get("id"))
+        if pending is None or pending[0].done():
+            return
+        future, consumed = pending
+        future.set_result(data)
+        # Hold the listener until the caller has acted on the reply (e.g. queued
+        # the client's ack, see holding_replies), so later room emits cannot be
+        # delivered before it.
+        await consumed.wait()
+
+    async def _serve(self, request: Dict[str, Any]) -> None:
+        reply: Dict[str, Any] = {"id": request["id"]}
+        async with self._locked(request["room"]):
+            try:
+                handler = self._handlers[request["method"]]
+                reply["result"] = await handler(request["room"], **request["args"])
+            except Exception as exc:
+                logger.warning(
+                    "cluster request failed method=%s room=%s error=%r",
+                    request.get("method"),
+                    request.get("room"),
+                    exc,
+                )
+                reply["error"] = f"{request.get('method')} failed on {self.worker_id}: {exc}"
+            self.served += 1
+            await self.client.publish(self.inbox(request["reply_to"]), json.dumps(reply))
+
+
+def parse_workers(value: str) -> List[str]:
+    return [worker.strip() for worker in value.split(",") if worker.strip()]
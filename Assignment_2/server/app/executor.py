@@ -0,0 +1,285 @@
+"""Optional server-side execution of Python sessions.
+
+``ExecutionPool`` keeps ``size`` interpreter processes started and waiting
+(see ``app/sandbox_runner.py``); a run hands its program to one of them and
+a replacement is started in the background, so a run never pays interpreter
+startup. Each process runs one program in an empty temporary directory with
+a clean environment and rlimits on CPU time, address space, open files, file
+size and processes (none: the program cannot fork, start threads or spawn
+anything that outlives the run), plus a wall-clock timeout and an output cap
+enforced here. When the server runs as root, programs run as an unprivileged
+``user`` (``nobody`` by default), which also keeps the process limit from
+being bypassed; otherwise they run as the server's user.
+
+At most ``size`` programs run at once; up to ``max_queue`` more wait for a
+slot and anything beyond that is rejected. Output is read from pipes without
+blocking the event loop.
+
+There is no filesystem or network namespace: a program can read
+world-readable files and open network connections. Run the service in a
+container or behind an OS-level sandbox when exposing it to strangers.
+"""
+
+import asyncio
+import codecs
+import json
+import logging
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RUNNER = Path(__file__).resolve().with_name("sandbox_runner.py")
+
+
+class ExecutionError(RuntimeError):
+    """The pool cannot take the run (queue full, or closed), or is misconfigured."""
+
+
+def _resolve_user(user: Optional[str]) -> Optional[Tuple[int, int]]:
+    """(uid, gid) programs run as; None keeps the server's own user."""
+    if not hasattr(os, "geteuid"):  # pragma: no cover - not POSIX
+        return None
+    import pwd
+
+    if user is None:
+        if os.geteuid() != 0:
+            return None
+        user = "nobody"
+    try:
+        entry = pwd.getpwuid(int(user)) if user.isdigit() else pwd.getpwnam(user)
+    except KeyError:
+        raise ExecutionError(f"unknown execution user {user!r}") from None
+    if entry.pw_uid == 0:
+        raise ExecutionError("refusing to run programs as root")
+    if os.geteuid() not in (0, entry.pw_uid):
+        raise ExecutionError(f"running programs as {user!r} needs the server to run as root")
+    return entry.pw_uid, entry.pw_gid
+
+
+def _kill(process: asyncio.subprocess.Process) -> None:
+    # Workers lead their own session, so this also reaches anything they started.
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):  # pragma: no cover - already gone
+        pass
+
+
+@dataclass
+class _Worker:
+    process: asyncio.subprocess.Process
+    workdir: str
+
+
+class ExecutionPool:
+    def __init__(
+        self,
+        size: int = 2,
+        max_queue: int = 16,
+        timeout: float = 10.0,
+        cpu_seconds: int = 5,
+        memory_mb: int = 256,
+        max_output: int = 64 * 1024,
+        python: str = sys.executable,
+        user: Optional[str] = None,
+    ) -> None:
+        self.size = size
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.limits: Dict[str, Any] = {"cpu_seconds": cpu_seconds, "memory_mb": memory_mb, "processes": 0}
+        self.user = _resolve_user(user)
+        if self.user is not None:
+            self.limits["uid"], self.limits["gid"] = self.user
+        self.max_output = max_output
+        self.python = python
+        self._ready: "asyncio.Queue[_Worker]" = asyncio.Queue()
+        self._slots = asyncio.Semaphore(size)
+        self._spawning: set = set()
+        self._closed = False
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.timed_out = 0
+        self.rejected = 0
+
+    @property
+    def full(self) -> bool:
+        return self.waiting >= self.max_queue
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": self.size,
+            "warm": self._ready.qsize(),
+            "running": self.running,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "timed_out": self.timed_out,
+            "rejected": self.rejected,
+        }
+
+    async def start(self) -> None:
+        # Warm up in the background; a run arriving first starts its own process.
+        self._top_up()
+
+    async def close(self) -> None:
+        self._closed = True
+        for task in list(self._spawning):
+            task.cancel()
+        while not self._ready.empty():
+            await self._discard(self._ready.get_nowait())
+
+    async def _spawn(self) -> _Worker:
+        workdir = tempfile.mkdtemp(prefix="run-")
+        if self.user is not None:
+            os.chown(workdir, *self.user)
+        process = await asyncio.create_subprocess_exec(
+            self.python,
+            "-I",
+            "-u",
+            str(RUNNER),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=workdir,
+            env={"PATH": os.defpath, "PYTHONIOENCODING": "utf-8", "HOME": workdir},
+            start_new_session=True,
+        )
+        return _Worker(process, workdir)
+
+    def _top_up(self) -> None:
+        """Start processes until ``size`` are warm or on their way."""
+        for _ in range(self.size - self._ready.qsize() - len(self._spawning)):
+            self._refill()
+
+    def _refill(self) -> None:
+        async def spawn() -> None:
+            try:
+                worker = await self._spawn()
+            except Exception as exc:  # pragma: no cover - diagnostic
+                logger.warning("execution worker spawn failed error=%r", exc)
+                return
+            if self._closed:
+                await self._discard(worker)
+            else:
+                self._ready.put_nowait(worker)
+
+        task = asyncio.get_running_loop().create_task(spawn())
+        self._spawning.add(task)
+        task.add_done_callback(self._spawning.discard)
+
+    async def _take(self) -> _Worker:
+        # A warm worker if there is one; otherwise start one now.
+        worker = self._ready.get_nowait() if not self._ready.empty() else await self._spawn()
+        if not self._closed:
+            self._top_up()
+        return worker
+
+    @staticmethod
+    async def _discard(worker: _Worker) -> None:
+        _kill(worker.process)
+        await worker.process.wait()
+        shutil.rmtree(worker.workdir, ignore_errors=True)
+
+    async def run(self, source: str) -> AsyncIterator[Dict[str, Any]]:
+        """Run ``source``; yields output chunks, then the result.
+
+        Chunks are ``{"stream": "stdout"|"stderr", "data": str}``; the last
+        item is ``{"exitCode", "timedOut", "truncated", "durationMs"}``.
+        """
+        if self._closed:
+            raise ExecutionError("execution service is shut down")
+        if self.full:
+            self.rejected += 1
+            raise ExecutionError("execution queue is full")
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        worker: Optional[_Worker] = None
+        self.running += 1
+        try:
+            worker = await self._take()
+            async for item in self._execute(worker, source):
+                yield item
+        finally:
+            self.running -= 1
+            self._slots.release()
+            if worker is not None:
+                await self._discard(worker)
+
+    async def _execute(self, worker: _Worker, source: str) -> AsyncIterator[Dict[str, Any]]:
+        process = worker.process
+        started = time.perf_counter()
+        chunks: "asyncio.Queue[Optional[Dict[str, str]]]" = asyncio.Queue()
+
+        async def pump(stream: asyncio.StreamReader, name: str) -> None:
+            # Incremental, so a character split across reads is not mangled.
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            while True:
+                data = await stream.read(4096)
+                text = decoder.decode(data, final=not data)
+                if text:
+                    await chunks.put({"stream": name, "data": text})
+                if not data:
+                    break
+            await chunks.put(None)
+
+        process.stdin.write(json.dumps(self.limits).encode() + b"\n" + source.encode("utf-8"))
+        try:
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):  # pragma: no cover - child died early
+            pass
+        process.stdin.close()
+        pumps = [
+            asyncio.create_task(pump(process.stdout, "stdout")),
+            asyncio.create_task(pump(process.stderr, "stderr")),
+        ]
+        deadline = started + self.timeout
+        open_streams, sent, timed_out, truncated = len(pumps), 0, False, False
+        try:
+            while open_streams:
+                remaining = deadline - time.perf_counter()
+                try:
+                    chunk = await asyncio.wait_for(chunks.get(), max(remaining, 0))
+                except asyncio.TimeoutError:
+                    timed_out = True
+                    break
+                if chunk is None:
+                    open_streams -= 1
+                    continue
+                if sent + len(chunk["data"]) > self.max_output:
+                    chunk["data"] = chunk["data"][: self.max_output - sent]
+                    truncated = True
+                sent += len(chunk["data"])
+                if chunk["data"]:
+                    yield chunk
+                if truncated:
+                    break
+            if timed_out or truncated:
+                _kill(process)
+            try:
+                exit_code = await asyncio.wait_for(process.wait(), max(deadline - time.perf_counter(), 0.1))
+            except asyncio.TimeoutError:
+                timed_out = True
+                _kill(process)
+                exit_code = await process.wait()
+        finally:
+            for task in pumps:
+                task.cancel()
+        if timed_out:
+            self.timed_out += 1
+        self.completed += 1
+        yield {
+            "exitCode": exit_code,
+            "timedOut": timed_out,
+            "truncated": truncated,
+            "durationMs": round((time.perf_counter() - started) * 1000, 1),
+        }
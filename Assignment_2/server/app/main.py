@@ -1,16 +1,117 @@
+import asyncio
+import functools
+import json
+import logging
 import os
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
 from uuid import uuid4
 
-import redis.asyncio as redis
 import socketio
-from fastapi import FastAPI
+from fastapi import APIRouter, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
-
-ROOM_STATE: Dict[str, Dict[str, Any]] = {}
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from app import ot, wire
+from app.backpressure import Coalescer, HoldingManager, HoldingRedisManager, LatestWins, RateLimiter
+from app.cluster import ClusterError, ClusterRouter, RoomChannelManager, holding_replies, parse_workers
+from app.executor import ExecutionError, ExecutionPool
+from app.metrics import (
+    BROADCAST_RECIPIENTS,
+    RATE_LIMITED,
+    REGISTRY,
+    STATE_FALLBACKS,
+    STATE_SECONDS,
+    Gauge,
+    timed_event,
+)
+from app.oplog import FileOpLog, OpLog, RedisOpLog
+from app.presence import Presence
+from app.repository import RedisHealth, RedisSettings, RoomRepository, create_client
+from app.room_store import BoundedRoomStore
+from app.static import StaticBundle
+from app.write_behind import WriteBehindCache
+
+logger = logging.getLogger("app")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    logger.addHandler(_handler)
+    logger.propagate = False
+# Per-connection logs are DEBUG; handlers skip formatting entirely below the level.
+logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+# Recent ops per room so stale client ops can be transformed; see app/ot.py.
+ROOM_HISTORY: Dict[str, ot.OpHistory] = {}
+ROOM_LOCKS: Dict[str, asyncio.Lock] = {}
+OT_HISTORY_LIMIT = int(os.getenv("OT_HISTORY_LIMIT", "500"))
+# Write-through mode: each room as this process last wrote or saw it in Redis,
+# so an edit is one compare-and-set unless another instance wrote in between
+# (None = the room did not exist); see state_for_update.
+ROOM_KNOWN: Dict[str, Optional[Dict[str, Any]]] = {}
+
+
+def forget_room(room: str) -> None:
+    ROOM_HISTORY.pop(room, None)
+    ROOM_LOCKS.pop(room, None)
+    ROOM_KNOWN.pop(room, None)
+
+
+# In-memory fallback when Redis is not configured (or unreachable), bounded by
+# total document bytes and idle time so long-running instances do not leak.
+ROOM_STATE = BoundedRoomStore(
+    max_bytes=int(os.getenv("ROOM_STORE_MAX_BYTES", str(64 * 1024 * 1024))),
+    idle_ttl=float(os.getenv("ROOM_IDLE_TTL", str(24 * 3600))),
+    on_evict=forget_room,
+)
+# Write-behind for Redis (opt-in): seconds between batched flushes (0 =
+# write-through), how many dirty rooms trigger an early flush and after how
+# many idle seconds a clean room is dropped from memory. Only safe with a
+# single instance or CLUSTER_WORKERS; see app/write_behind.py.
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "0"))
+STATE_FLUSH_MAX_DIRTY = int(os.getenv("STATE_FLUSH_MAX_DIRTY", "100"))
+STATE_CACHE_IDLE_TTL = float(os.getenv("STATE_CACHE_IDLE_TTL", "300"))
+# Redis room hashes expire ROOM_TTL seconds after their last write or join, and
+# ROOM_CLOSED_TTL seconds after their last participant leaves (0 = never).
+ROOM_TTL = int(os.getenv("ROOM_TTL", str(7 * 24 * 3600)))
+ROOM_CLOSED_TTL = int(os.getenv("ROOM_CLOSED_TTL", str(ROOM_TTL)))
+# Documents above this many bytes are stored compressed with ROOM_COMPRESSION.
+ROOM_COMPRESS_THRESHOLD = int(os.getenv("ROOM_COMPRESS_THRESHOLD", "4096"))
+ROOM_COMPRESSION = os.getenv("ROOM_COMPRESSION", "zlib")
+# Seconds between keyspace compaction passes (0 = disabled).
+ROOM_COMPACT_INTERVAL = float(os.getenv("ROOM_COMPACT_INTERVAL", "3600"))
+# Multi-worker mode (needs REDIS_URL): every worker gets the same
+# CLUSTER_WORKERS list and its own WORKER_ID; rooms are owned by one worker.
+CLUSTER_WORKERS = parse_workers(os.getenv("CLUSTER_WORKERS", ""))
+WORKER_ID = os.getenv("WORKER_ID", "local")
+CLUSTER_TIMEOUT = float(os.getenv("CLUSTER_TIMEOUT", "5"))
+# Session history: OPLOG=redis|file|off (default redis with REDIS_URL, else off),
+# with a full snapshot every OPLOG_SNAPSHOT_EVERY revisions.
+OPLOG_SNAPSHOT_EVERY = int(os.getenv("OPLOG_SNAPSHOT_EVERY", "100"))
+HISTORY_PAGE_LIMIT = 10_000
+# Per-client limit shared by code_ops/code_change/language_change in all rooms:
+# EDIT_RATE_LIMIT events per second (0 = unlimited) with bursts of
+# EDIT_RATE_BURST. code_ops over the limit wait up to EDIT_RATE_MAX_WAIT
+# seconds, then are rejected.
+EDIT_RATE_LIMIT = float(os.getenv("EDIT_RATE_LIMIT", "50"))
+EDIT_RATE_BURST = float(os.getenv("EDIT_RATE_BURST", "100"))
+EDIT_RATE_MAX_WAIT = float(os.getenv("EDIT_RATE_MAX_WAIT", "1"))
+# Room updates for a client with more than SLOW_CONSUMER_QUEUE packets queued
+# are held and merged until it catches up (0 = disabled).
+SLOW_CONSUMER_QUEUE = int(os.getenv("SLOW_CONSUMER_QUEUE", "64"))
+# Server-side Python execution (see app/executor.py): RUN_WORKERS warm
+# processes (0 = disabled), each run limited to RUN_TIMEOUT wall seconds,
+# RUN_CPU_SECONDS of CPU and RUN_MEMORY_MB of memory; RUN_MAX_QUEUE runs wait.
+# As root, programs run as RUN_USER (default nobody).
+RUN_WORKERS = int(os.getenv("RUN_WORKERS", "0"))
+RUN_TIMEOUT = float(os.getenv("RUN_TIMEOUT", "10"))
+RUN_CPU_SECONDS = int(os.getenv("RUN_CPU_SECONDS", "5"))
+RUN_MEMORY_MB = int(os.getenv("RUN_MEMORY_MB", "256"))
+RUN_MAX_QUEUE = int(os.getenv("RUN_MAX_QUEUE", "16"))
+RUN_USER = os.getenv("RUN_USER") or None
 
 default_origins = [
     "http://localhost:5173",
@@ -22,131 +123,821 @@ origins = os.getenv("CORS_ORIGINS", ",".join(default_origins)).split(",")
 BASE_DIR = Path(__file__).resolve().parent.parent
 DIST_DIR = BASE_DIR / "dist"
 
-REDIS_URL = os.getenv("REDIS_URL")
-if os.getenv("PYTEST_CURRENT_TEST"):
-    REDIS_URL = None
-
-redis_client: Optional[redis.Redis] = None
-client_manager = None
-if REDIS_URL:
-    print(f"[boot] Using Redis at {REDIS_URL}")
-    redis_client = redis.from_url(REDIS_URL, decode_responses=True)
-    client_manager = socketio.AsyncRedisManager(REDIS_URL)
-else:
-    print("[boot] REDIS_URL not set; using in-memory state (single instance only)")
-
-sio = socketio.AsyncServer(
-    async_mode="asgi",
-    cors_allowed_origins=origins,
-    logger=False,
-    engineio_logger=False,
-    client_manager=client_manager,
-)
+# Backends, chosen by create_app(). They are module globals so the handlers
+# below can reach them; one app per process.
+repository: Optional[RoomRepository] = None
+redis_health: Optional[RedisHealth] = None
+state_cache: Optional[WriteBehindCache] = None
+oplog: Optional[OpLog] = None
+executor: Optional[ExecutionPool] = None
+client_manager: socketio.AsyncManager = HoldingManager()
+router = ClusterRouter(None, WORKER_ID, [WORKER_ID])
+sio = socketio.AsyncServer(async_mode="asgi", client_manager=client_manager)
+bundle: Optional[StaticBundle] = None
 
-app = FastAPI(title="Coding Interview Backend")
+# Filled by the decorators below and attached to each app by create_app().
+ROOM_HANDLERS: Dict[str, Callable] = {}
+SOCKET_HANDLERS: Dict[str, Callable] = {}
+api = APIRouter()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins + ["*"],  # relaxed for dev/demo and Docker same-origin
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
+def room_handler(func: Callable) -> Callable:
+    ROOM_HANDLERS[func.__name__] = func
+    return func
 
-async def get_state(room: str) -> Optional[Dict[str, Any]]:
-    if redis_client:
+
+def socket_event(handler: Callable) -> Callable:
+    # Forwarded replies stay ahead of room broadcasts until the ack is queued.
+    @functools.wraps(handler)
+    async def wrapper(*args):
+        with holding_replies():
+            return await handler(*args)
+
+    SOCKET_HANDLERS[handler.__name__] = wrapper
+    return wrapper
+
+
+compaction_report: Dict[str, int] = {}
+
+
+async def compact_keyspace() -> None:
+    while True:
+        await asyncio.sleep(ROOM_COMPACT_INTERVAL)
         try:
-            data = await redis_client.hgetall(f"room:{room}")
-            if data:
-                return {"code": data.get("code", ""), "language": data.get("language", "javascript")}
+            compaction_report.update(await repository.compact())
+            logger.info("compact %s", " ".join(f"{k}={v}" for k, v in compaction_report.items()))
         except Exception as exc:  # pragma: no cover - diagnostic
-            print(f"[state] Redis get failed, falling back to memory: {exc}")
-    return ROOM_STATE.get(room)
+            logger.warning("compact failed error=%r", exc)
+
+
+async def sweep_rooms() -> None:
+    # Idle rooms are otherwise evicted only when a later read or write reaches them.
+    while True:
+        await asyncio.sleep(max(ROOM_STATE.idle_ttl / 2, 0.01))
+        evicted = ROOM_STATE.sweep()
+        if evicted:
+            logger.debug("room store swept evicted=%d rooms=%d", evicted, len(ROOM_STATE))
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Startup does not wait for Redis (only cluster mode subscribes here): the
+    # health check task makes the first connection, and the executor warms its
+    # processes in the background.
+    tasks = []
+    if redis_health:
+        tasks.append(asyncio.create_task(redis_health.run()))
+    if repository and ROOM_COMPACT_INTERVAL > 0:
+        tasks.append(asyncio.create_task(compact_keyspace()))
+    if ROOM_STATE.idle_ttl > 0:
+        tasks.append(asyncio.create_task(sweep_rooms()))
+    if isinstance(client_manager, RoomChannelManager) and not sio.manager_initialized:
+        # Listen from startup: this worker may own rooms whose clients are all elsewhere.
+        sio.manager_initialized = True
+        client_manager.initialize()
+    await router.start()
+    if executor:
+        await executor.start()
+    yield
+    if executor:
+        await executor.close()
+    await router.close()
+    for task in tasks:
+        task.cancel()
+    if state_cache:
+        await state_cache.close()
+    if oplog:
+        await oplog.close()
+
+
+def create_app(
+    redis_url: Optional[str] = None,
+    *,
+    repository: Optional[RoomRepository] = None,
+    oplog: Optional[OpLog] = None,
+    executor: Optional[ExecutionPool] = None,
+    client_manager: Optional[socketio.AsyncManager] = None,
+) -> socketio.ASGIApp:
+    """Build the ASGI application (``uvicorn --factory app.main:create_app``).
+
+    ``redis_url`` defaults to ``REDIS_URL``; pass ``""`` to keep all state in
+    memory. Backends passed in are used instead of the ones the environment
+    would select. Nothing connects to Redis until the app starts.
+    """
+    global redis_health, state_cache, router, sio, bundle
+    if redis_url is None:
+        redis_url = os.getenv("REDIS_URL", "")
+
+    if repository is None and redis_url:
+        repository = RoomRepository(
+            create_client(redis_url),
+            ttl=ROOM_TTL,
+            compress_threshold=ROOM_COMPRESS_THRESHOLD,
+            codec=ROOM_COMPRESSION,
+        )
+    logger.info("boot state_backend=%s", "redis" if repository else "memory note=single-instance-only")
+    redis_health = RedisHealth(repository.client, RedisSettings.from_env().health_check_interval) if repository else None
+    state_cache = None
+    if repository and STATE_FLUSH_INTERVAL > 0:
+        state_cache = WriteBehindCache(
+            load_state,
+            store_states,
+            interval=STATE_FLUSH_INTERVAL,
+            max_dirty=STATE_FLUSH_MAX_DIRTY,
+            idle_ttl=STATE_CACHE_IDLE_TTL,
+        )
+        logger.info("boot write_behind interval=%s idle_ttl=%s", STATE_FLUSH_INTERVAL, STATE_CACHE_IDLE_TTL)
+        if not CLUSTER_WORKERS:
+            logger.warning("write-behind without CLUSTER_WORKERS assumes a single instance writes each room")
+
+    router = ClusterRouter(None, WORKER_ID, [WORKER_ID], lock=room_lock)
+    if client_manager is None:
+        if redis_url and CLUSTER_WORKERS:
+            logger.info("boot cluster worker_id=%s workers=%s", WORKER_ID, ",".join(CLUSTER_WORKERS))
+            client_manager = RoomChannelManager(redis_url)
+            router = ClusterRouter(
+                create_client(redis_url),
+                WORKER_ID,
+                CLUSTER_WORKERS,
+                timeout=CLUSTER_TIMEOUT,
+                manager=client_manager,
+                lock=room_lock,
+            )
+        elif redis_url:
+            client_manager = HoldingRedisManager(redis_url)
+        else:
+            client_manager = HoldingManager()
+    client_manager.hold = hold_lagging
+    for handler in ROOM_HANDLERS.values():
+        router.handler(handler)
+
+    if oplog is None:
+        mode = os.getenv("OPLOG", "redis" if redis_url else "off")
+        if mode == "redis" and redis_url:
+            oplog = RedisOpLog(create_client(redis_url), ttl=ROOM_TTL, snapshot_every=OPLOG_SNAPSHOT_EVERY)
+        elif mode == "file":
+            oplog = FileOpLog(os.getenv("OPLOG_DIR", str(BASE_DIR / "oplog")), snapshot_every=OPLOG_SNAPSHOT_EVERY)
+    if oplog:
+        logger.info("boot oplog=%s snapshot_every=%d", type(oplog).__name__, oplog.snapshot_every)
+
+    if executor is None and RUN_WORKERS > 0:
+        executor = ExecutionPool(
+            RUN_WORKERS,
+            max_queue=RUN_MAX_QUEUE,
+            timeout=RUN_TIMEOUT,
+            cpu_seconds=RUN_CPU_SECONDS,
+            memory_mb=RUN_MEMORY_MB,
+            user=RUN_USER,
+        )
+    if executor:
+        logger.info("boot executor workers=%d timeout=%s", executor.size, executor.timeout)
+
+    globals().update(repository=repository, oplog=oplog, executor=executor, client_manager=client_manager)
+    sio = socketio.AsyncServer(
+        async_mode="asgi",
+        cors_allowed_origins=origins,
+        logger=False,
+        engineio_logger=False,
+        client_manager=client_manager,
+    )
+    for name, handler in SOCKET_HANDLERS.items():
+        sio.on(name, handler)
+
+    app = FastAPI(title="Coding Interview Backend", lifespan=lifespan)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins + ["*"],  # relaxed for dev/demo and Docker same-origin
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.include_router(api)
+    if DIST_DIR.exists():
+        # Serve the built Vite app in production/Docker, from memory.
+        bundle = StaticBundle(DIST_DIR)
+        logger.info("boot static %s", " ".join(f"{k}={v}" for k, v in bundle.stats().items()))
+        app.include_router(static_routes)
+    return socketio.ASGIApp(sio, other_asgi_app=app)
+
+
+async def load_state(room: str) -> Optional[Dict[str, Any]]:
+    start = time.perf_counter()
+    if repository:
+        try:
+            state = await repository.load(room)
+            if state:
+                STATE_SECONDS.observe(time.perf_counter() - start, "get", "redis")
+                return state
+        except Exception as exc:  # pragma: no cover - diagnostic
+            STATE_FALLBACKS.inc("get")
+            logger.warning("state redis get failed, falling back to memory room=%s error=%r", room, exc)
+        start = time.perf_counter()
+    state = ROOM_STATE.get(room)
+    STATE_SECONDS.observe(time.perf_counter() - start, "get", "memory")
+    return state
+
+
+async def store_states(batch: Dict[str, Dict[str, Any]]) -> None:
+    start = time.perf_counter()
+    if repository:
+        try:
+            await repository.save_many(batch)
+            STATE_SECONDS.observe(time.perf_counter() - start, "set", "redis")
+            return
+        except Exception as exc:  # pragma: no cover - diagnostic
+            STATE_FALLBACKS.inc("set")
+            logger.warning("state redis set failed, falling back to memory rooms=%d error=%r", len(batch), exc)
+        start = time.perf_counter()
+    ROOM_STATE.update(batch)
+    STATE_SECONDS.observe(time.perf_counter() - start, "set", "memory")
 
 
-async def set_state(room: str, code: str, language: str) -> None:
-    if redis_client:
+async def get_state(room: str) -> Optional[Dict[str, Any]]:
+    if state_cache:
+        return await state_cache.get(room)
+    return await load_state(room)
+
+
+async def set_state(room: str, code: str, language: str, revision: int = 0) -> None:
+    state = {"code": code, "language": language, "revision": revision}
+    if state_cache:
+        state_cache.put(room, state)
+        return
+    ROOM_KNOWN.pop(room, None)
+    await store_states({room: state})
+
+
+async def state_for_update(room: str) -> Optional[Dict[str, Any]]:
+    """The room's state to compute an edit from; store the result with ``update_state``."""
+    if repository and not state_cache and room in ROOM_KNOWN:
+        return ROOM_KNOWN[room]
+    return await get_state(room)
+
+
+async def update_state(room: str, read: Optional[Dict[str, Any]], state: Dict[str, Any]) -> bool:
+    """Store ``state`` computed from ``read``; False if the room changed since, so the edit must be redone."""
+    if not repository or state_cache:
+        await set_state(room, state["code"], state["language"], state["revision"])
+        return True
+    start = time.perf_counter()
+    try:
+        saved, current = await repository.save_if(room, state, read)
+    except Exception as exc:  # pragma: no cover - diagnostic
+        ROOM_KNOWN.pop(room, None)
+        STATE_FALLBACKS.inc("set")
+        logger.warning("state redis set failed, falling back to memory room=%s error=%r", room, exc)
+        ROOM_STATE.update({room: state})
+        return True
+    STATE_SECONDS.observe(time.perf_counter() - start, "set", "redis")
+    ROOM_KNOWN[room] = current
+    return saved
+
+
+async def set_language(room: str, language: str, default_code: str) -> None:
+    if repository and not state_cache:
+        # Write-through mode: one atomic script call instead of a read then a write.
         try:
-            await redis_client.hset(f"room:{room}", mapping={"code": code, "language": language})
+            ROOM_KNOWN[room] = await repository.set_language(room, language, default_code)
             return
         except Exception as exc:  # pragma: no cover - diagnostic
-            print(f"[state] Redis set failed, falling back to memory: {exc}")
-    ROOM_STATE[room] = {"code": code, "language": language}
+            ROOM_KNOWN.pop(room, None)
+            STATE_FALLBACKS.inc("set")
+            logger.warning("state redis set failed, falling back to memory room=%s error=%r", room, exc)
+    current = await get_state(room) or {"code": default_code, "revision": 0}
+    await set_state(room, current.get("code", ""), language, current.get("revision", 0))
+
+
+def room_lock(room: str) -> asyncio.Lock:
+    # Edits to one room must be applied one at a time for revisions to line up.
+    lock = ROOM_LOCKS.get(room)
+    if lock is None:
+        lock = ROOM_LOCKS[room] = asyncio.Lock()
+    return lock
+
+
+def room_history(room: str, revision: int) -> ot.OpHistory:
+    history = ROOM_HISTORY.get(room)
+    if history is None or history.revision != revision:
+        # Unknown room or state changed behind our back: start a fresh log.
+        history = ROOM_HISTORY[room] = ot.OpHistory(revision, limit=OT_HISTORY_LIMIT)
+    return history
+
+
+presence = Presence()
+# Sids that negotiated msgpack events at connect (see app/wire.py).
+MSGPACK_SIDS: Set[str] = set()
+# Owner side: (participants, msgpack participants) per worker with clients in the room.
+ROOM_WORKERS: Dict[str, Dict[str, Tuple[int, int]]] = {}
+
+
+def room_participants(room: str) -> int:
+    return sum(count for count, _ in ROOM_WORKERS.get(room, {}).values())
+
+
+def room_msgpack_participants(room: str) -> int:
+    return sum(binary for _, binary in ROOM_WORKERS.get(room, {}).values())
+
+
+def local_counts(room: str) -> Tuple[int, int]:
+    sids = presence.sids(room)
+    return len(sids), len(sids & MSGPACK_SIDS)
+
+
+def wire_format(sid: str) -> str:
+    return wire.MSGPACK if sid in MSGPACK_SIDS else wire.JSON
+
+
+def wire_room(sid: str, room: str) -> str:
+    return wire.binary_room(room) if sid in MSGPACK_SIDS else room
+
+
+REGISTRY.register(
+    Gauge(
+        "interview_active_rooms",
+        "Rooms with at least one client on this instance.",
+        lambda: [((), presence.stats()["rooms"])],
+    )
+)
+REGISTRY.register(
+    Gauge(
+        "interview_active_sids",
+        "Clients in at least one room on this instance.",
+        lambda: [((), presence.stats()["sids"])],
+    )
+)
+REGISTRY.register(
+    Gauge(
+        "interview_room_store",
+        "In-memory room store size and eviction counts.",
+        lambda: [((key,), value) for key, value in ROOM_STATE.stats().items()],
+        ["field"],
+    )
+)
+REGISTRY.register(
+    Gauge(
+        "interview_write_behind_dirty_rooms",
+        "Rooms with edits not yet flushed to Redis.",
+        lambda: [((), state_cache.dirty_count if state_cache else 0)],
+    )
+)
+
+
+def outbound_queue(sid: str) -> int:
+    eio_sid = sio.manager.eio_sid_from_sid(sid, "/")
+    socket = sio.eio.sockets.get(eio_sid) if eio_sid else None
+    return socket.queue.qsize() if socket else 0
+
+
+async def send_direct(sid: str, event: str, payload: Any) -> None:
+    # ignore_queue: deliver on this worker now, ahead of anything published later.
+    await sio.emit(event, wire.encode(payload, wire_format(sid)), to=sid, ignore_queue=True)
+
 
+edit_limiter = RateLimiter(EDIT_RATE_LIMIT, EDIT_RATE_BURST, max_wait=EDIT_RATE_MAX_WAIT)
+edit_throttle = LatestWins(edit_limiter)
+coalescer = Coalescer(outbound_queue, send_direct, max_queue=SLOW_CONSUMER_QUEUE)
+# Updates a newer one can absorb; presence counts and state syncs always go out.
+COALESCED_EVENTS = {"ops_update", "code_update", "language_update"}
 
-@app.get("/health")
+
+def hold_lagging(event: str, room: str, payload: Callable[[], Any], skip: List[str]) -> List[str]:
+    """Hold ``event`` for this worker's lagging clients in ``room``; returns their sids."""
+    if event not in COALESCED_EVENTS or sio.manager.is_connected(room, "/"):
+        return []
+    held = []
+    for sid, _ in sio.manager.get_participants("/", room):
+        if sid not in skip and coalescer.lagging(sid):
+            data = payload()
+            coalescer.hold(sid, room, event, wire.unpack(data) if isinstance(data, bytes) else data)
+            held.append(sid)
+    return held
+
+
+async def send_state(sid: str, room: str, state: Dict[str, Any]) -> None:
+    # A full state supersedes whatever is held for the client.
+    coalescer.forget(sid, wire_room(sid, room))
+    await sio.emit("state_sync", wire.encode(state, wire_format(sid)), room=sid)
+
+
+async def broadcast(event: str, payload: Any, room: str, skip_sid: Optional[str] = None) -> None:
+    total, binary = room_participants(room), room_msgpack_participants(room)
+    BROADCAST_RECIPIENTS.observe(max(total - (1 if skip_sid else 0), 0), event)
+    # Each format is encoded once per broadcast, and only if someone in the room uses it.
+    if binary < total:
+        await sio.emit(event, payload, room=room, skip_sid=skip_sid)
+    if binary:
+        await sio.emit(event, wire.pack(payload), room=wire.binary_room(room), skip_sid=skip_sid)
+
+
+@presence.on_room_opened
+async def watch_room(room: str) -> None:
+    if isinstance(client_manager, RoomChannelManager):
+        await client_manager.watch(room)
+        await client_manager.watch(wire.binary_room(room))
+
+
+@presence.on_room_closed
+async def unwatch_room(room: str) -> None:
+    if isinstance(client_manager, RoomChannelManager):
+        await client_manager.unwatch(room)
+        await client_manager.unwatch(wire.binary_room(room))
+
+
+async def open_room(room: str) -> None:
+    if repository:
+        # Replaces the shorter expiry set when the room last emptied.
+        await repository.touch(room)
+
+
+async def close_room(room: str) -> None:
+    if state_cache:
+        await state_cache.release(room)
+    if repository and ROOM_CLOSED_TTL > 0:
+        await repository.expire(room, ROOM_CLOSED_TTL)
+    if oplog:
+        oplog.forget(room)
+    forget_room(room)
+
+
+async def leave_room(sid: str, room: str) -> None:
+    ROOM_STATE.detach(room, sid)
+    await presence.leave(sid, room)
+    await report_left(sid, room)
+
+
+async def report_left(sid: str, room: str) -> None:
+    # Tell the owner this worker's new counts once ``sid`` has left ``room``.
+    count, binary = local_counts(room)
+    await router.call(room, "room_presence", worker=WORKER_ID, count=count, binary=binary, skip_sid=sid)
+
+
+# Room operations below run on the room's owner, one at a time per room under
+# room_lock; socket handlers reach them through router.call, which forwards to
+# another worker when needed.
+
+
+@room_handler
+async def room_presence(
+    room: str, worker: str, count: int, binary: int = 0, skip_sid: Optional[str] = None
+) -> int:
+    """Record ``worker``'s participant counts for ``room`` and broadcast the total."""
+    workers = ROOM_WORKERS.get(room)
+    opened = not workers
+    if count:
+        workers = ROOM_WORKERS.setdefault(room, {})
+        workers[worker] = (count, binary)
+    elif workers:
+        workers.pop(worker, None)
+    if opened and count:
+        await open_room(room)
+    total = room_participants(room)
+    if total:
+        await broadcast("presence_update", {"room": room, "count": total}, room, skip_sid=skip_sid)
+    elif not opened:
+        ROOM_WORKERS.pop(room, None)
+        await close_room(room)
+    return total
+
+
+@room_handler
+async def room_create(room: str, code: str, language: str) -> None:
+    await set_state(room, code, language)
+
+
+@room_handler
+async def room_sync(room: str) -> Optional[Dict[str, Any]]:
+    return await get_state(room)
+
+
+@room_handler
+async def room_code_change(room: str, sid: str, code: str) -> None:
+    while True:
+        read = await state_for_update(room)
+        current = read or {"code": "", "language": "javascript", "revision": 0}
+        history = room_history(room, current.get("revision", 0))
+        op = ot.replace(current.get("code", ""), code)
+        state = {"code": code, "language": current.get("language", "javascript"), "revision": history.revision + 1}
+        if await update_state(room, read, state):
+            break
+    history.append(op)
+    if oplog:
+        oplog.record(room, history.revision, op, current.get("code", ""), code, current.get("language", "javascript"))
+    await broadcast("code_update", {"code": code, "revision": history.revision}, room, skip_sid=sid)
+
+
+@room_handler
+async def room_code_ops(room: str, sid: str, revision: int, ops: ot.Op) -> Dict[str, Any]:
+    while True:
+        read = await state_for_update(room)
+        current = read or {"code": "", "language": "javascript", "revision": 0}
+        history = room_history(room, current.get("revision", 0))
+        concurrent = history.since(revision)
+        try:
+            if concurrent is None:
+                raise ot.OperationError("revision is no longer in history")
+            transformed = ops
+            for applied in concurrent:
+                transformed, _ = ot.transform(transformed, applied)
+            code = ot.apply(current.get("code", ""), transformed)
+        except ot.OperationError:
+            # The sid may be connected to another worker, so the caller sends the state.
+            return {"ok": False, "resync": True, "revision": current.get("revision", 0), "state": current}
+        state = {"code": code, "language": current.get("language", "javascript"), "revision": history.revision + 1}
+        if await update_state(room, read, state):
+            break
+    ops = transformed
+    history.append(ops)
+    if oplog:
+        oplog.record(room, history.revision, ops, current.get("code", ""), code, current.get("language", "javascript"))
+    # Still under the room lock, so every client sees ops in revision order.
+    await broadcast("ops_update", {"revision": history.revision, "ops": ops}, room, skip_sid=sid)
+    return {"ok": True, "revision": history.revision}
+
+
+@room_handler
+async def room_language_change(room: str, sid: str, language: str) -> None:
+    await set_language(room, language, "// shared session\n")
+    await broadcast("language_update", {"language": language}, room, skip_sid=sid)
+
+
+@api.get("/health")
 async def health() -> dict:
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "room_store": ROOM_STATE.stats(),
+        "presence": presence.stats(),
+        "redis_keyspace": compaction_report,
+        "cluster": router.stats(),
+        "backpressure": coalescer.stats(),
+        "executor": executor.stats() if executor else None,
+        "redis": redis_health.stats() if redis_health else None,
+    }
+
 
+@api.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
-@app.post("/api/session")
+
+@api.post("/api/session")
 async def create_session() -> dict:
     session_id = uuid4().hex[:8]
-    await set_state(session_id, "# Start coding\n", "python")
+    await router.call(session_id, "room_create", code="# Start coding\n", language="python")
     return {"sessionId": session_id}
 
 
-@sio.event
-async def connect(sid, environ):
-    # No auth for demo; log connection.
-    print(f"Client connected: {sid}")
+class RunRequest(BaseModel):
+    code: str = Field(max_length=200_000)
+
+
+async def emit_to_room(event: str, payload: Dict[str, Any], room: str) -> None:
+    # Runs happen on whichever worker got the request, which does not know the
+    # room's wire formats, so both are sent.
+    await sio.emit(event, payload, room=room)
+    if wire.msgpack is not None:
+        await sio.emit(event, wire.pack(payload), room=wire.binary_room(room))
+
+
+async def run_in_room(source: str, room: Optional[str], run_id: str) -> AsyncIterator[Dict[str, Any]]:
+    """Run ``source`` on the executor, mirroring output to ``room`` as ``run_output``/``run_result``."""
+    async for item in executor.run(source):
+        if room:
+            event = "run_result" if "exitCode" in item else "run_output"
+            await emit_to_room(event, {"runId": run_id, **item}, room)
+        yield item
+
+
+@api.post("/api/run")
+async def run_code_http(body: RunRequest) -> StreamingResponse:
+    """Run Python on the server; the response streams output chunks, then the result, as NDJSON.
+
+    Output goes only to the caller: this endpoint has no session, so it cannot
+    tell whether the caller belongs to a room (use the ``run_code`` event).
+    """
+    if executor is None:
+        raise HTTPException(status_code=404, detail="server-side execution is disabled")
+    if executor.full:
+        raise HTTPException(status_code=429, detail="execution queue is full")
+    run_id = uuid4().hex[:8]
+
+    async def lines():
+        try:
+            async for item in executor.run(body.code):
+                yield json.dumps(item) + "\n"
+        except ExecutionError as exc:
+            yield json.dumps({"error": str(exc)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Run-Id": run_id})
+
+
+@api.get("/api/session/{session_id}/history")
+async def session_history(session_id: str, after: int = 0, limit: int = 1000) -> StreamingResponse:
+    """Ops after revision ``after`` as NDJSON, read from the log a page at a time."""
+    if oplog is None:
+        raise HTTPException(status_code=404, detail="session history is disabled")
+    limit = max(1, min(limit, HISTORY_PAGE_LIMIT))
+
+    async def lines():
+        cursor, remaining = after, limit
+        while remaining > 0:
+            page = await oplog.entries(session_id, after=cursor, limit=min(remaining, 200))
+            if not page:
+                break
+            for entry in page:
+                yield json.dumps(entry) + "\n"
+            cursor, remaining = page[-1]["revision"], remaining - len(page)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@api.get("/api/session/{session_id}/revisions/{revision}")
+async def session_revision(session_id: str, revision: int) -> dict:
+    state = await oplog.checkout(session_id, revision) if oplog else None
+    if state is None:
+        raise HTTPException(status_code=404, detail="revision not found")
+    return state
+
 
+@socket_event
+async def connect(sid, environ, auth=None):
+    # No auth for demo; the auth payload only negotiates the wire format.
+    if wire.negotiate(auth) == wire.MSGPACK:
+        MSGPACK_SIDS.add(sid)
+    logger.debug("client connected sid=%s wire=%s", sid, wire_format(sid))
 
-@sio.event
+
+@socket_event
 async def disconnect(sid):
-    print(f"Client disconnected: {sid}")
+    logger.debug("client disconnected sid=%s", sid)
+    for room in presence.rooms_of(sid):
+        ROOM_STATE.detach(room, sid)
+    for room in await presence.disconnect(sid):
+        try:
+            await report_left(sid, room)
+        except ClusterError as exc:
+            # The owner is down; the client is gone from this worker regardless.
+            logger.warning("leave failed on disconnect sid=%s room=%s error=%r", sid, room, exc)
+    MSGPACK_SIDS.discard(sid)
+    edit_limiter.forget(sid)
+    coalescer.forget(sid)
 
 
-@sio.event
+@socket_event
+@timed_event
 async def join(sid, data):
     room = data.get("room") if isinstance(data, dict) else None
     if not room:
         return
-    await sio.enter_room(sid, room)
-    state = await get_state(room)
+    await sio.enter_room(sid, wire_room(sid, room))
+    ROOM_STATE.attach(room, sid)
+    # Joining subscribes this worker to the room, and registers the client's
+    # wire format with the owner, before the snapshot is taken.
+    await presence.join(sid, room)
+    count, binary = local_counts(room)
+    await router.call(room, "room_presence", worker=WORKER_ID, count=count, binary=binary)
+    state = await router.call(room, "room_sync")
     if state:
-        await sio.emit("state_sync", state, room=sid)
+        await send_state(sid, room, state)
 
 
-@sio.event
+@socket_event
+@timed_event
+async def leave(sid, data):
+    room = data.get("room") if isinstance(data, dict) else None
+    if not room or room not in presence.rooms_of(sid):
+        return
+    await sio.leave_room(sid, wire_room(sid, room))
+    await leave_room(sid, room)
+
+
+@socket_event
+@timed_event
 async def code_change(sid, data):
+    # Full-document edits from clients that do not speak the code_ops protocol.
     room = data.get("room") if isinstance(data, dict) else None
     code = data.get("code", "") if isinstance(data, dict) else ""
     if not room:
         return
-    current = await get_state(room) or {"language": "javascript"}
-    await set_state(room, code, current.get("language", "javascript"))
-    await sio.emit("code_update", {"code": code}, room=room, skip_sid=sid)
+
+    async def apply(latest: str) -> None:
+        await router.call(room, "room_code_change", sid=sid, code=latest)
+
+    # Over the rate limit, only the newest document is kept.
+    await edit_throttle.submit(sid, ("code_change", room), code, apply)
+
+
+@socket_event
+@timed_event
+async def code_ops(sid, data):
+    """Apply a client operation made against ``revision`` and broadcast it as ``ops_update``.
+
+    The return value is the client's ack. A client whose revision has fallen out
+    of the op history, or that sends faster than its rate limit allows, gets a
+    full ``state_sync`` instead.
+    """
+    room = data.get("room") if isinstance(data, dict) else None
+    revision = data.get("revision") if isinstance(data, dict) else None
+    if not room or not isinstance(revision, int) or isinstance(revision, bool):
+        return {"ok": False, "error": "room and revision are required"}
+    try:
+        op = ot.normalize(data.get("ops"))
+    except ot.OperationError as exc:
+        return {"ok": False, "error": str(exc)}
+
+    wait = edit_limiter.reserve(sid)
+    try:
+        if wait is None:
+            # Clients keep one op in flight, so only a misbehaving one gets here.
+            RATE_LIMITED.inc("code_ops")
+            state = await router.call(room, "room_sync")
+            if state:
+                await send_state(sid, room, state)
+            return {"ok": False, "error": "rate limited"}
+        if wait:
+            await asyncio.sleep(wait)
+        ack = await router.call(room, "room_code_ops", sid=sid, revision=revision, ops=op)
+    except ClusterError as exc:
+        return {"ok": False, "error": str(exc)}
+    state = ack.pop("state", None)
+    if state:
+        await send_state(sid, room, state)
+    # Updates held for a slow client must reach it before the ack does.
+    await coalescer.flush(sid)
+    return ack
 
 
-@sio.event
+@socket_event
+@timed_event
 async def language_change(sid, data):
     room = data.get("room") if isinstance(data, dict) else None
     language = data.get("language") if isinstance(data, dict) else None
     if not room or not language:
         return
-    current = await get_state(room) or {"code": "// shared session\n"}
-    await set_state(room, current.get("code", ""), language)
-    await sio.emit("language_update", {"language": language}, room=room, skip_sid=sid)
 
+    async def apply(latest: str) -> None:
+        await router.call(room, "room_language_change", sid=sid, language=latest)
+
+    await edit_throttle.submit(sid, ("language_change", room), language, apply)
+
+
+# Runs started over Socket.IO; kept so they are not garbage collected mid-run.
+RUNS: Set[asyncio.Task] = set()
+
+
+async def run_for_room(source: str, room: str, run_id: str) -> None:
+    try:
+        async for _ in run_in_room(source, room, run_id):
+            pass
+    except ExecutionError as exc:
+        await emit_to_room("run_result", {"runId": run_id, "error": str(exc)}, room)
+    except Exception as exc:  # pragma: no cover - diagnostic
+        logger.warning("run failed room=%s run_id=%s error=%r", room, run_id, exc)
+
+
+@socket_event
+@timed_event
+async def run_code(sid, data):
+    """Start running ``code`` on the server; output streams to the whole room."""
+    room = data.get("room") if isinstance(data, dict) else None
+    source = data.get("code") if isinstance(data, dict) else None
+    if executor is None:
+        return {"ok": False, "error": "server-side execution is disabled"}
+    if not room or room not in presence.rooms_of(sid) or not isinstance(source, str):
+        return {"ok": False, "error": "join the room and send code"}
+    if executor.full:
+        return {"ok": False, "error": "execution queue is full"}
+    run_id = uuid4().hex[:8]
+    task = asyncio.create_task(run_for_room(source, room, run_id))
+    RUNS.add(task)
+    task.add_done_callback(RUNS.discard)
+    return {"ok": True, "runId": run_id}
+
+
+static_routes = APIRouter()
+
+
+@static_routes.get("/assets/{path:path}")
+async def serve_asset(path: str, request: Request) -> Response:
+    response = bundle.response(f"assets/{path}", request.headers)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return response
 
-if DIST_DIR.exists():
-    # Serve the built Vite app in production/Docker
-    app.mount("/assets", StaticFiles(directory=DIST_DIR / "assets"), name="assets")
 
-    @app.get("/", response_class=HTMLResponse)
-    async def serve_index() -> str:
-        index_file = DIST_DIR / "index.html"
-        if index_file.exists():
-            return index_file.read_text(encoding="utf-8")
-        return "<h1>Build not found</h1>"
+@static_routes.get("/", response_class=HTMLResponse)
+async def serve_index(request: Request) -> Response:
+    return bundle.response("index.html", request.headers) or HTMLResponse("<h1>Build not found</h1>")
 
 
-application = socketio.ASGIApp(sio, other_asgi_app=app)
+def __getattr__(name: str) -> Any:
+    # ``uvicorn app.main:application`` keeps working, built on first access.
+    if name == "application":
+        globals()["application"] = create_app()
+        return globals()["application"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("app.main:application", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run("app.main:create_app", factory=True, host="0.0.0.0", port=8000, reload=True)
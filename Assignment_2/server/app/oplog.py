@@ -0,0 +1,372 @@
+"""Append-only per-room op log with periodic snapshots, for session playback.
+
+Every applied op is recorded with its revision, and every ``snapshot_every``
+revisions the full document is stored as a snapshot (plus one base snapshot
+when a room is first recorded). Reconstructing a revision reads the nearest
+snapshot at or below it and replays at most ``snapshot_every`` ops.
+
+Records are buffered in memory and written in batches by a background task,
+like the write-behind cache, so logging stays off the keystroke path. Two
+stores are provided: Redis streams (``RedisOpLog``), shared by all workers,
+and append-only files (``FileOpLog``) for single-instance deployments.
+Revisions only move forward: records at or below what a room's log already
+holds are skipped.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from bisect import bisect_right
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app import ot
+from app.repository import CODECS
+
+logger = logging.getLogger(__name__)
+
+Entry = Dict[str, Any]
+Snapshot = Dict[str, Any]
+Record = Tuple[str, str, Dict[str, Any]]  # (kind, room, record); kind is "op" or "snapshot"
+
+
+class OpLog:
+    """Buffers op and snapshot records; subclasses store and read them."""
+
+    def __init__(
+        self,
+        snapshot_every: int = 100,
+        interval: float = 0.5,
+        max_pending: int = 1000,
+        clock=time.time,
+    ) -> None:
+        self.snapshot_every = snapshot_every
+        self.interval = interval
+        self.max_pending = max_pending
+        self._clock = clock
+        self._pending: List[Record] = []
+        self._started: set = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.written = 0
+        self.skipped = 0
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def record(self, room: str, revision: int, op: ot.Op, before: str, after: str, language: str) -> None:
+        """Queue ``op``, which turned ``before`` into ``after`` at ``revision``."""
+        now = self._clock()
+        if room not in self._started:
+            self._started.add(room)
+            base = {"revision": revision - 1, "ts": now, "code": before, "language": language}
+            self._pending.append(("snapshot", room, base))
+        self._pending.append(("op", room, {"revision": revision, "ts": now, "ops": op}))
+        if revision % self.snapshot_every == 0:
+            snapshot = {"revision": revision, "ts": now, "code": after, "language": language}
+            self._pending.append(("snapshot", room, snapshot))
+        self._ensure_task()
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    def forget(self, room: str) -> None:
+        """Drop per-room bookkeeping once the room closes; reopening starts from a new base snapshot."""
+        self._started.discard(room)
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                await self._write(batch)
+            except Exception:
+                self._pending[:0] = batch
+                raise
+            return len(batch)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def checkout(self, room: str, revision: int) -> Optional[Dict[str, Any]]:
+        """The room's document at ``revision``, or None if the log cannot produce it."""
+        await self.flush()
+        snapshot = await self._snapshot_at(room, revision)
+        if snapshot is None:
+            return None
+        code, current = snapshot["code"], snapshot["revision"]
+        if current < revision:
+            for entry in await self._read_ops(room, current, revision):
+                if entry["revision"] != current + 1:
+                    return None
+                try:
+                    code = ot.apply(code, entry["ops"])
+                except ot.OperationError:
+                    return None
+                current = entry["revision"]
+        if current != revision:
+            return None
+        return {"code": code, "language": snapshot["language"], "revision": revision}
+
+    async def entries(self, room: str, after: int = 0, limit: int = 100) -> List[Entry]:
+        """Up to ``limit`` ops with revisions above ``after``, oldest first."""
+        await self.flush()
+        return await self._read_ops(room, after, None, limit)
+
+    async def _write(self, batch: List[Record]) -> None:
+        raise NotImplementedError
+
+    async def _snapshot_at(self, room: str, revision: int) -> Optional[Snapshot]:
+        raise NotImplementedError
+
+    async def _read_ops(
+        self, room: str, after: int, until: Optional[int], limit: Optional[int] = None
+    ) -> List[Entry]:
+        raise NotImplementedError
+
+    def _ensure_task(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as exc:  # pragma: no cover - diagnostic
+                logger.warning("op log flush failed, will retry pending=%d error=%r", len(self._pending), exc)
+
+
+def _stream_id(revision: int) -> str:
+    # Stream IDs must be above 0-0, so revision r is stored as "r-1".
+    return f"{revision}-1"
+
+
+def _revision(stream_id: Any) -> int:
+    text = stream_id.decode("ascii") if isinstance(stream_id, bytes) else stream_id
+    return int(text.split("-", 1)[0])
+
+
+def _field(fields: Dict[Any, Any], name: str) -> Any:
+    value = fields.get(name.encode("ascii"), fields.get(name))
+    return value.decode("utf-8") if isinstance(value, bytes) and name != "code" else value
+
+
+class RedisOpLog(OpLog):
+    """Ops in the ``oplog:{room}`` stream, snapshots in ``oplog:{room}:snapshots``.
+
+    Entry IDs are derived from revisions, so a revision range is a single
+    XRANGE and the nearest snapshot a single XREVRANGE. Snapshots larger than
+    ``compress_threshold`` bytes are zlib-compressed like room documents.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        prefix: str = "oplog:",
+        ttl: int = 0,
+        compress_threshold: int = 4096,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.compress_threshold = compress_threshold
+
+    def ops_key(self, room: str) -> str:
+        return f"{self.prefix}{room}"
+
+    def snapshots_key(self, room: str) -> str:
+        return f"{self.prefix}{room}:snapshots"
+
+    async def _write(self, batch: List[Record]) -> None:
+        keys = set()
+        async with self.client.pipeline(transaction=False) as pipe:
+            for kind, room, record in batch:
+                if kind == "op":
+                    key = self.ops_key(room)
+                    fields = {"ops": json.dumps(record["ops"]), "ts": record["ts"]}
+                else:
+                    key = self.snapshots_key(room)
+                    fields = {"language": record["language"], "ts": record["ts"], **self._encode(record["code"])}
+                pipe.xadd(key, fields, id=_stream_id(record["revision"]))
+                keys.add(key)
+            if self.ttl > 0:
+                for key in keys:
+                    pipe.expire(key, self.ttl)
+            results = await pipe.execute(raise_on_error=False)
+        failed = sum(1 for result in results[: len(batch)] if isinstance(result, Exception))
+        self.written += len(batch) - failed
+        # XADD rejects IDs at or below the stream's last one: already logged.
+        self.skipped += failed
+
+    def _encode(self, code: str) -> Dict[str, Any]:
+        data = code.encode("utf-8")
+        if len(data) > self.compress_threshold:
+            return {"code": CODECS["zlib"][0](data), "enc": "zlib"}
+        return {"code": data, "enc": ""}
+
+    async def _snapshot_at(self, room: str, revision: int) -> Optional[Snapshot]:
+        found = await self.client.xrevrange(self.snapshots_key(room), max=_stream_id(revision), min="-", count=1)
+        if not found:
+            return None
+        stream_id, fields = found[0]
+        code = _field(fields, "code") or b""
+        enc = _field(fields, "enc")
+        if enc:
+            code = CODECS[enc][1](code)
+        return {
+            "revision": _revision(stream_id),
+            "code": code.decode("utf-8") if isinstance(code, bytes) else code,
+            "language": _field(fields, "language"),
+        }
+
+    async def _read_ops(
+        self, room: str, after: int, until: Optional[int], limit: Optional[int] = None
+    ) -> List[Entry]:
+        found = await self.client.xrange(
+            self.ops_key(room),
+            min=f"{after + 1}-0",
+            max=_stream_id(until) if until is not None else "+",
+            count=limit,
+        )
+        return [
+            {"revision": _revision(stream_id), "ts": float(_field(fields, "ts")), "ops": json.loads(_field(fields, "ops"))}
+            for stream_id, fields in found
+        ]
+
+
+_SAFE_ROOM = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+class FileOpLog(OpLog):
+    """Append-only files per room under ``directory``.
+
+    ``{room}.ops`` holds one JSON op per line and ``{room}.snapshots`` one JSON
+    snapshot per line; ``{room}.idx`` maps each snapshot revision to its byte
+    offset and to the offset in the ops file where the following ops start,
+    so reads seek straight to the right place instead of scanning the log.
+    """
+
+    def __init__(self, directory: Any, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # room -> (last op revision, last snapshot revision) already on disk
+        self._heads: Dict[str, Tuple[int, int]] = {}
+
+    def path(self, room: str, suffix: str) -> Path:
+        # Room ids come from clients; anything unusual is hashed into a safe name.
+        name = room if _SAFE_ROOM.fullmatch(room) else hashlib.sha256(room.encode("utf-8")).hexdigest()
+        return self.directory / f"{name}.{suffix}"
+
+    async def _write(self, batch: List[Record]) -> None:
+        await asyncio.to_thread(self._write_sync, batch)
+
+    async def _snapshot_at(self, room: str, revision: int) -> Optional[Snapshot]:
+        return await asyncio.to_thread(self._snapshot_at_sync, room, revision)
+
+    async def _read_ops(
+        self, room: str, after: int, until: Optional[int], limit: Optional[int] = None
+    ) -> List[Entry]:
+        return await asyncio.to_thread(self._read_ops_sync, room, after, until, limit)
+
+    def _write_sync(self, batch: List[Record]) -> None:
+        by_room: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        for kind, room, record in batch:
+            by_room.setdefault(room, []).append((kind, record))
+        for room, records in by_room.items():
+            last_op, last_snapshot = self._head(room)
+            with open(self.path(room, "ops"), "ab") as ops_file, open(
+                self.path(room, "snapshots"), "ab"
+            ) as snapshots_file, open(self.path(room, "idx"), "ab") as idx_file:
+                for kind, record in records:
+                    revision = record["revision"]
+                    if kind == "op":
+                        if revision <= last_op:
+                            self.skipped += 1
+                            continue
+                        ops_file.write(_json_line(record))
+                        last_op = revision
+                    else:
+                        if revision <= last_snapshot or revision < last_op:
+                            self.skipped += 1
+                            continue
+                        offset = snapshots_file.tell()
+                        snapshots_file.write(_json_line(record))
+                        idx_file.write(f"{revision} {offset} {ops_file.tell()}\n".encode("ascii"))
+                        last_snapshot = revision
+                    self.written += 1
+            self._heads[room] = (last_op, last_snapshot)
+
+    def _head(self, room: str) -> Tuple[int, int]:
+        head = self._heads.get(room)
+        if head is None:
+            index = self._index(room)
+            last_snapshot = index[-1][0] if index else -1
+            last_op = last_snapshot
+            for entry in self._scan_ops(room, index[-1][2] if index else 0):
+                last_op = max(last_op, entry["revision"])
+            head = self._heads[room] = (last_op, last_snapshot)
+        return head
+
+    def _index(self, room: str) -> List[Tuple[int, int, int]]:
+        try:
+            with open(self.path(room, "idx"), "rb") as idx_file:
+                return [tuple(int(part) for part in line.split()) for line in idx_file if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def _scan_ops(self, room: str, offset: int):
+        try:
+            with open(self.path(room, "ops"), "rb") as ops_file:
+                ops_file.seek(offset)
+                for line in ops_file:
+                    yield json.loads(line)
+        except FileNotFoundError:
+            return
+
+    def _snapshot_at_sync(self, room: str, revision: int) -> Optional[Snapshot]:
+        index = self._index(room)
+        position = bisect_right([entry[0] for entry in index], revision) - 1
+        if position < 0:
+            return None
+        with open(self.path(room, "snapshots"), "rb") as snapshots_file:
+            snapshots_file.seek(index[position][1])
+            return json.loads(snapshots_file.readline())
+
+    def _read_ops_sync(self, room: str, after: int, until: Optional[int], limit: Optional[int]) -> List[Entry]:
+        index = self._index(room)
+        position = bisect_right([entry[0] for entry in index], after) - 1
+        entries: List[Entry] = []
+        for entry in self._scan_ops(room, index[position][2] if position >= 0 else 0):
+            if entry["revision"] <= after:
+                continue
+            if until is not None and entry["revision"] > until:
+                break
+            entries.append(entry)
+            if limit is not None and len(entries) >= limit:
+                break
+        return entries
+
+
+def _json_line(record: Dict[str, Any]) -> bytes:
+    return json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
@@ -0,0 +1,275 @@
+"""Text operations for delta-based code sync.
+
+An operation is a list of components applied left to right over the whole
+document: a positive int retains that many characters, a negative int deletes
+that many, and a string inserts it. This is the ot.js ``TextOperation`` wire
+format, so the browser client (``client/src/ot.js``) shares it as-is.
+
+Lengths are measured in UTF-16 code units, matching JavaScript strings and
+Monaco offsets, so documents containing astral characters stay in sync.
+"""
+
+from collections import deque
+from typing import Deque, Iterable, List, Optional, Tuple, Union
+
+Component = Union[int, str]
+Op = List[Component]
+
+
+class OperationError(ValueError):
+    """Raised when an operation is malformed or does not fit a document."""
+
+
+def _units(text: str) -> int:
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-16-le", errors="surrogatepass")) // 2
+
+
+def _slice(text: str, start: int, end: Optional[int] = None) -> str:
+    if text.isascii():
+        return text[start:end]
+    raw = text.encode("utf-16-le", errors="surrogatepass")
+    stop = None if end is None else end * 2
+    return raw[start * 2 : stop].decode("utf-16-le", errors="surrogatepass")
+
+
+def _is_retain(comp: Component) -> bool:
+    return isinstance(comp, int) and comp > 0
+
+
+def _is_delete(comp: Component) -> bool:
+    return isinstance(comp, int) and comp < 0
+
+
+def _is_insert(comp: Component) -> bool:
+    return isinstance(comp, str)
+
+
+class _Builder:
+    """Accumulates components while keeping the operation canonical."""
+
+    def __init__(self) -> None:
+        self.ops: Op = []
+
+    def retain(self, n: int) -> None:
+        if n <= 0:
+            return
+        if self.ops and _is_retain(self.ops[-1]):
+            self.ops[-1] += n
+        else:
+            self.ops.append(n)
+
+    def delete(self, n: int) -> None:
+        if n <= 0:
+            return
+        if self.ops and _is_delete(self.ops[-1]):
+            self.ops[-1] -= n
+        else:
+            self.ops.append(-n)
+
+    def insert(self, text: str) -> None:
+        if not text:
+            return
+        ops = self.ops
+        if ops and _is_insert(ops[-1]):
+            ops[-1] += text
+        elif ops and _is_delete(ops[-1]):
+            # Canonical form puts an insert before an adjacent delete.
+            if len(ops) > 1 and _is_insert(ops[-2]):
+                ops[-2] += text
+            else:
+                ops.insert(len(ops) - 1, text)
+        else:
+            ops.append(text)
+
+
+def normalize(components: Iterable[Component]) -> Op:
+    """Validate raw client input and return it as a canonical operation."""
+    if not isinstance(components, (list, tuple)):
+        raise OperationError("operation must be a list")
+    builder = _Builder()
+    for comp in components:
+        if isinstance(comp, bool):
+            raise OperationError(f"invalid component: {comp!r}")
+        if isinstance(comp, int):
+            if comp > 0:
+                builder.retain(comp)
+            else:
+                builder.delete(-comp)
+        elif isinstance(comp, str):
+            builder.insert(comp)
+        else:
+            raise OperationError(f"invalid component: {comp!r}")
+    return builder.ops
+
+
+def base_length(op: Op) -> int:
+    """Length of the document the operation applies to."""
+    return sum(abs(comp) if isinstance(comp, int) else 0 for comp in op)
+
+
+def target_length(op: Op) -> int:
+    """Length of the document the operation produces."""
+    total = 0
+    for comp in op:
+        if _is_retain(comp):
+            total += comp
+        elif _is_insert(comp):
+            total += _units(comp)
+    return total
+
+
+def apply(doc: str, op: Op) -> str:
+    """Apply ``op`` to ``doc`` and return the new document."""
+    ascii_doc = doc.isascii()
+    raw = doc if ascii_doc else doc.encode("utf-16-le", errors="surrogatepass")
+    width = 1 if ascii_doc else 2
+    if len(raw) // width != base_length(op):
+        raise OperationError("operation base length does not match document")
+
+    parts: List[str] = []
+    pos = 0
+    for comp in op:
+        if _is_retain(comp):
+            chunk = raw[pos : pos + comp * width]
+            parts.append(chunk if ascii_doc else chunk.decode("utf-16-le", errors="surrogatepass"))
+            pos += comp * width
+        elif _is_delete(comp):
+            pos -= comp * width
+        else:
+            parts.append(comp)
+    return "".join(parts)
+
+
+def transform(a: Op, b: Op) -> Tuple[Op, Op]:
+    """Transform concurrent ops so that ``apply(apply(d, a), b') == apply(apply(d, b), a')``.
+
+    Inserts from ``a`` win ties, so pass the incoming client op as ``a`` and the
+    already-applied server op as ``b``.
+    """
+    if base_length(a) != base_length(b):
+        raise OperationError("concurrent operations must share a base length")
+
+    a_prime, b_prime = _Builder(), _Builder()
+    ops1, ops2 = iter(a), iter(b)
+    op1, op2 = next(ops1, None), next(ops2, None)
+    while op1 is not None or op2 is not None:
+        if op1 is not None and _is_insert(op1):
+            a_prime.insert(op1)
+            b_prime.retain(_units(op1))
+            op1 = next(ops1, None)
+            continue
+        if op2 is not None and _is_insert(op2):
+            a_prime.retain(_units(op2))
+            b_prime.insert(op2)
+            op2 = next(ops2, None)
+            continue
+        if op1 is None or op2 is None:
+            raise OperationError("operations have mismatched lengths")
+
+        if _is_retain(op1) and _is_retain(op2):
+            step = min(op1, op2)
+            a_prime.retain(step)
+            b_prime.retain(step)
+        elif _is_delete(op1) and _is_delete(op2):
+            step = min(-op1, -op2)
+        elif _is_delete(op1):
+            step = min(-op1, op2)
+            a_prime.delete(step)
+        else:
+            step = min(op1, -op2)
+            b_prime.delete(step)
+
+        op1 = _consume(op1, step, ops1)
+        op2 = _consume(op2, step, ops2)
+    return a_prime.ops, b_prime.ops
+
+
+def _consume(comp: int, step: int, rest) -> Optional[Component]:
+    remaining = abs(comp) - step
+    if remaining == 0:
+        return next(rest, None)
+    return remaining if comp > 0 else -remaining
+
+
+def compose(a: Op, b: Op) -> Op:
+    """Combine consecutive ops into one with the same effect as ``a`` then ``b``."""
+    if target_length(a) != base_length(b):
+        raise OperationError("operations are not consecutive")
+
+    result = _Builder()
+    ops1, ops2 = iter(a), iter(b)
+    op1, op2 = next(ops1, None), next(ops2, None)
+    while op1 is not None or op2 is not None:
+        if op1 is not None and _is_delete(op1):
+            result.delete(-op1)
+            op1 = next(ops1, None)
+            continue
+        if op2 is not None and _is_insert(op2):
+            result.insert(op2)
+            op2 = next(ops2, None)
+            continue
+        if op1 is None or op2 is None:
+            raise OperationError("operations have mismatched lengths")
+
+        if _is_insert(op1):
+            size = _units(op1)
+            step = min(size, abs(op2))
+            if _is_retain(op2):
+                result.insert(_slice(op1, 0, step))
+            op1 = _slice(op1, step) if step < size else next(ops1, None)
+            op2 = _consume(op2, step, ops2)
+        else:
+            step = min(op1, abs(op2))
+            if _is_retain(op2):
+                result.retain(step)
+            else:
+                result.delete(step)
+            op1 = _consume(op1, step, ops1)
+            op2 = _consume(op2, step, ops2)
+    return result.ops
+
+
+def replace(old: str, new: str) -> Op:
+    """Build the smallest single-edit operation turning ``old`` into ``new``."""
+    if old == new:
+        return normalize([_units(old)])
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    removed = old[prefix : len(old) - suffix]
+    inserted = new[prefix : len(new) - suffix]
+    return normalize(
+        [_units(old[:prefix]), inserted, -_units(removed), _units(old[len(old) - suffix :])]
+    )
+
+
+class OpHistory:
+    """Bounded log of the most recent operations applied to a room.
+
+    ``revision`` counts every operation ever applied; only the last ``limit``
+    are kept, so clients further behind than that must resync from a snapshot.
+    """
+
+    def __init__(self, revision: int = 0, limit: int = 500) -> None:
+        self.revision = revision
+        self._ops: Deque[Op] = deque(maxlen=limit)
+
+    def append(self, op: Op) -> int:
+        self._ops.append(op)
+        self.revision += 1
+        return self.revision
+
+    def since(self, revision: int) -> Optional[List[Op]]:
+        """Ops applied after ``revision``, or ``None`` if they are no longer known."""
+        behind = self.revision - revision
+        if behind < 0 or behind > len(self._ops):
+            return None
+        if behind == 0:
+            return []
+        return list(self._ops)[-behind:]
@@ -0,0 +1,81 @@
+"""Tracks which sids are in which rooms on this instance.
+
+Hooks registered with ``on_room_opened`` run when a room gets its first
+participant and ``on_room_closed`` hooks run after the last one leaves, so the
+server can load, flush and release per-room resources at those points.
+"""
+
+import logging
+from typing import Awaitable, Callable, Dict, List, Set
+
+RoomHook = Callable[[str], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
+
+
+class Presence:
+    def __init__(self) -> None:
+        self._rooms_by_sid: Dict[str, Set[str]] = {}
+        self._sids_by_room: Dict[str, Set[str]] = {}
+        self._opened_hooks: List[RoomHook] = []
+        self._closed_hooks: List[RoomHook] = []
+
+    def on_room_opened(self, hook: RoomHook) -> RoomHook:
+        self._opened_hooks.append(hook)
+        return hook
+
+    def on_room_closed(self, hook: RoomHook) -> RoomHook:
+        self._closed_hooks.append(hook)
+        return hook
+
+    def count(self, room: str) -> int:
+        return len(self._sids_by_room.get(room, ()))
+
+    def sids(self, room: str) -> Set[str]:
+        return set(self._sids_by_room.get(room, ()))
+
+    def rooms_of(self, sid: str) -> Set[str]:
+        return set(self._rooms_by_sid.get(sid, ()))
+
+    def stats(self) -> Dict[str, int]:
+        return {"rooms": len(self._sids_by_room), "sids": len(self._rooms_by_sid)}
+
+    async def join(self, sid: str, room: str) -> int:
+        """Add ``sid`` to ``room`` and return the room's participant count."""
+        sids = self._sids_by_room.get(room)
+        opened = sids is None
+        if opened:
+            sids = self._sids_by_room[room] = set()
+        sids.add(sid)
+        self._rooms_by_sid.setdefault(sid, set()).add(room)
+        if opened:
+            await self._run(self._opened_hooks, room)
+        return len(sids)
+
+    async def leave(self, sid: str, room: str) -> int:
+        """Remove ``sid`` from ``room`` and return how many participants remain."""
+        rooms = self._rooms_by_sid.get(sid)
+        if rooms is not None:
+            rooms.discard(room)
+            if not rooms:
+                del self._rooms_by_sid[sid]
+        sids = self._sids_by_room.get(room)
+        if sids is None or sid not in sids:
+            return self.count(room)
+        sids.discard(sid)
+        if sids:
+            return len(sids)
+        del self._sids_by_room[room]
+        await self._run(self._closed_hooks, room)
+        return 0
+
+    async def disconnect(self, sid: str) -> Dict[str, int]:
+        """Remove ``sid`` from all its rooms; returns remaining counts per room."""
+        return {room: await self.leave(sid, room) for room in self.rooms_of(sid)}
+
+    async def _run(self, hooks: List[RoomHook], room: str) -> None:
+        for hook in hooks:
+            try:
+                await hook(room)
+            except Exception as exc:  # pragma: no cover - diagnostic
+                logger.warning("presence hook failed hook=%s room=%s error=%r", hook.__name__, room, exc)
@@ -0,0 +1,339 @@
+"""Redis access layer for room state.
+
+Rooms live in ``room:{id}`` hashes with ``code``, ``language``, ``revision``
+and ``enc`` fields. Batched reads and writes go through a single pipeline,
+and read-modify-write updates run as Lua scripts so they cost one round-trip
+and cannot interleave with another instance's writes. Updates computed in
+Python (code edits) use ``save_if``, a compare-and-set on the revision and
+language that were read.
+
+Documents larger than ``compress_threshold`` bytes are stored compressed
+(``enc`` names the codec), and every write refreshes the key's TTL so
+abandoned sessions expire on their own.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, Union
+
+import redis.asyncio as redis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+try:  # optional, faster codec
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover - depends on environment
+    lz4_frame = None
+
+logger = logging.getLogger(__name__)
+
+State = Dict[str, Any]
+
+DEFAULT_LANGUAGE = "javascript"
+
+CODECS: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+}
+if lz4_frame is not None:  # pragma: no cover - depends on environment
+    CODECS["lz4"] = (lz4_frame.compress, lz4_frame.decompress)
+
+# KEYS[1] = room hash, ARGV[1] = language, ARGV[2] = code to use if the room is
+# new, ARGV[3] = TTL in seconds (0 = none).
+_SET_LANGUAGE_LUA = """
+redis.call('HSETNX', KEYS[1], 'code', ARGV[2])
+redis.call('HSETNX', KEYS[1], 'enc', '')
+redis.call('HSETNX', KEYS[1], 'revision', '0')
+redis.call('HSET', KEYS[1], 'language', ARGV[1])
+if tonumber(ARGV[3]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return redis.call('HGETALL', KEYS[1])
+"""
+
+# Write a room only if it still has the revision and language it was read
+# with, so a read-modify-write from a known state costs one round-trip.
+# KEYS[1] = room hash, ARGV[1] = revision read ('' if the room did not exist),
+# ARGV[2] = language read, ARGV[3..6] = code, enc, language and revision to
+# write, ARGV[7] = TTL in seconds (0 = none). Returns 1 once written, or the
+# room's current fields (empty if it does not exist) when it changed.
+_SAVE_IF_LUA = """
+local fields = redis.call('HMGET', KEYS[1], 'revision', 'language')
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    if ARGV[1] ~= '' then
+        return {}
+    end
+elseif ARGV[1] == '' or (fields[1] or '0') ~= ARGV[1] or (fields[2] or ARGV[2]) ~= ARGV[2] then
+    return redis.call('HGETALL', KEYS[1])
+end
+redis.call('HSET', KEYS[1], 'code', ARGV[3], 'enc', ARGV[4], 'language', ARGV[5], 'revision', ARGV[6])
+if tonumber(ARGV[7]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[7])
+end
+return 1
+"""
+
+# Swap in a compressed document only if no edit landed since it was read.
+# KEYS[1] = room hash, ARGV[1] = revision read, ARGV[2] = code, ARGV[3] = enc.
+_RECOMPRESS_LUA = """
+if redis.call('HGET', KEYS[1], 'revision') ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'code', ARGV[2], 'enc', ARGV[3])
+return 1
+"""
+
+
+@dataclass
+class RedisSettings:
+    """Connection pool tuning, read from ``REDIS_*`` environment variables."""
+
+    pool_size: int = 20
+    socket_timeout: float = 5.0
+    connect_timeout: float = 5.0
+    retries: int = 3
+    health_check_interval: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> "RedisSettings":
+        return cls(
+            pool_size=int(os.getenv("REDIS_POOL_SIZE", cls.pool_size)),
+            socket_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", cls.socket_timeout)),
+            connect_timeout=float(os.getenv("REDIS_CONNECT_TIMEOUT", cls.connect_timeout)),
+            retries=int(os.getenv("REDIS_RETRIES", cls.retries)),
+            health_check_interval=float(
+                os.getenv("REDIS_HEALTH_CHECK_INTERVAL", cls.health_check_interval)
+            ),
+        )
+
+    def client_options(self) -> Dict[str, Any]:
+        return {
+            "max_connections": self.pool_size,
+            "socket_timeout": self.socket_timeout,
+            "socket_connect_timeout": self.connect_timeout,
+            "retry": Retry(ExponentialBackoff(cap=1.0, base=0.05), self.retries),
+            "retry_on_error": [RedisConnectionError, RedisTimeoutError],
+            "health_check_interval": self.health_check_interval,
+        }
+
+
+class RedisHealth:
+    """Pings Redis in the background so a broken connection is noticed and replaced.
+
+    After a failed ping the pool's connections are dropped, so the next
+    command (or ping) opens fresh ones; retries back off up to ``interval``.
+    """
+
+    def __init__(self, client: Any, interval: float = 30.0) -> None:
+        self.client = client
+        self.interval = interval
+        self.healthy: Optional[bool] = None
+        self.failures = 0
+        self.last_error = ""
+        self.checked_at = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"healthy": self.healthy, "failures": self.failures, "last_error": self.last_error}
+
+    async def check(self) -> bool:
+        self.checked_at = time.time()
+        try:
+            await self.client.ping()
+        except Exception as exc:
+            self.failures += 1
+            self.last_error = repr(exc)
+            if self.healthy is not False:
+                logger.warning("redis unhealthy error=%r", exc)
+            self.healthy = False
+            try:
+                await self.client.connection_pool.disconnect()
+            except Exception:  # pragma: no cover - pool already broken
+                pass
+            return False
+        if self.healthy is False:
+            logger.info("redis reconnected after failures=%d", self.failures)
+        self.healthy, self.failures = True, 0
+        return True
+
+    async def run(self) -> None:
+        while True:
+            healthy = await self.check()
+            await asyncio.sleep(self.interval if healthy else min(2 ** self.failures / 4, self.interval))
+
+
+def create_client(url: str, settings: Optional[RedisSettings] = None) -> redis.Redis:
+    # Responses stay as bytes because compressed documents are not valid UTF-8.
+    settings = settings or RedisSettings.from_env()
+    return redis.from_url(url, **settings.client_options())
+
+
+def _text(value: Union[bytes, str, None], default: str = "") -> str:
+    if value is None:
+        return default
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _raw(value: Union[bytes, str]) -> bytes:
+    return value if isinstance(value, bytes) else value.encode("utf-8")
+
+
+def _parse(data: Dict[Any, Any]) -> Optional[State]:
+    if not data:
+        return None
+    fields = {_text(key): value for key, value in data.items()}
+    enc = _text(fields.get("enc"))
+    code = fields.get("code", b"")
+    if enc:
+        code = CODECS[enc][1](_raw(code))
+    return {
+        "code": _text(code),
+        "language": _text(fields.get("language"), DEFAULT_LANGUAGE),
+        "revision": int(_text(fields.get("revision"), "0")),
+    }
+
+
+class RoomRepository:
+    def __init__(
+        self,
+        client: redis.Redis,
+        prefix: str = "room:",
+        ttl: int = 0,
+        compress_threshold: int = 4096,
+        codec: str = "zlib",
+    ) -> None:
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.compress_threshold = compress_threshold
+        self.codec = codec if codec in CODECS else "zlib"
+        self._set_language = client.register_script(_SET_LANGUAGE_LUA)
+        self._recompress = client.register_script(_RECOMPRESS_LUA)
+        self._save_if = client.register_script(_SAVE_IF_LUA)
+
+    def key(self, room: str) -> str:
+        return f"{self.prefix}{room}"
+
+    async def load(self, room: str) -> Optional[State]:
+        return _parse(await self.client.hgetall(self.key(room)))
+
+    async def load_many(self, rooms: Iterable[str]) -> Dict[str, Optional[State]]:
+        rooms = list(rooms)
+        async with self.client.pipeline(transaction=False) as pipe:
+            for room in rooms:
+                pipe.hgetall(self.key(room))
+            results = await pipe.execute()
+        return {room: _parse(data) for room, data in zip(rooms, results)}
+
+    async def save(self, room: str, state: State) -> None:
+        await self.save_many({room: state})
+
+    async def save_many(self, batch: Dict[str, State]) -> None:
+        if not batch:
+            return
+        async with self.client.pipeline(transaction=False) as pipe:
+            for room, state in batch.items():
+                key = self.key(room)
+                pipe.hset(key, mapping=self.encode(state))
+                if self.ttl > 0:
+                    pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def save_if(self, room: str, state: State, expected: Optional[State]) -> Tuple[bool, Optional[State]]:
+        """Write ``state`` if the room is still ``expected`` (``None``: the room does not exist).
+
+        Returns ``(True, state)`` once written, or ``(False, current)`` with the
+        room as it is now when another write got there first.
+        """
+        fields = self.encode(state)
+        revision = "" if expected is None else str(expected.get("revision", 0))
+        language = DEFAULT_LANGUAGE if expected is None else expected.get("language", DEFAULT_LANGUAGE)
+        args = [revision, language, fields["code"], fields["enc"], fields["language"], fields["revision"], self.ttl]
+        result = await self._save_if(keys=[self.key(room)], args=args)
+        if result == 1:
+            return True, state
+        return False, _parse(dict(zip(result[::2], result[1::2])))
+
+    def encode(self, state: State) -> Dict[str, Any]:
+        """Hash fields for ``state``, compressing the document when it is large."""
+        code = state.get("code", "").encode("utf-8")
+        enc = ""
+        if len(code) > self.compress_threshold:
+            compressed = CODECS[self.codec][0](code)
+            if len(compressed) < len(code):
+                code, enc = compressed, self.codec
+        return {
+            "code": code,
+            "enc": enc,
+            "language": state.get("language", DEFAULT_LANGUAGE),
+            "revision": state.get("revision", 0),
+        }
+
+    async def set_language(self, room: str, language: str, default_code: str = "") -> State:
+        """Atomically change a room's language, creating the room if needed."""
+        flat = await self._set_language(keys=[self.key(room)], args=[language, default_code, self.ttl])
+        return _parse(dict(zip(flat[::2], flat[1::2])))
+
+    async def touch(self, room: str) -> None:
+        """Restart the room's TTL, or clear any expiry when TTLs are disabled."""
+        if self.ttl > 0:
+            await self.client.expire(self.key(room), self.ttl)
+        else:
+            await self.client.persist(self.key(room))
+
+    async def expire(self, room: str, seconds: int) -> None:
+        await self.client.expire(self.key(room), seconds)
+
+    async def delete(self, room: str) -> None:
+        await self.client.delete(self.key(room))
+
+    async def compact(self, batch_size: int = 200) -> Dict[str, int]:
+        """Walk every room key, add missing TTLs, compress large plain documents.
+
+        Returns a report of the room keyspace: how many keys and stored document
+        bytes there are, and what was fixed on this pass.
+        """
+        report = {"keys": 0, "stored_bytes": 0, "ttl_added": 0, "recompressed": 0, "dbsize": 0}
+        cursor = 0
+        while True:
+            cursor, keys = await self.client.scan(cursor, match=f"{self.prefix}*", count=batch_size)
+            if keys:
+                await self._compact_keys(keys, report)
+            if cursor == 0:
+                break
+        report["dbsize"] = await self.client.dbsize()
+        return report
+
+    async def _compact_keys(self, keys, report: Dict[str, int]) -> None:
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.ttl(key)
+                pipe.hstrlen(key, "code")
+                pipe.hget(key, "enc")
+            results = await pipe.execute()
+
+        stale = []
+        async with self.client.pipeline(transaction=False) as pipe:
+            for i, key in enumerate(keys):
+                ttl, size, enc = results[3 * i : 3 * i + 3]
+                report["keys"] += 1
+                report["stored_bytes"] += size
+                if ttl == -1 and self.ttl > 0:
+                    pipe.expire(key, self.ttl)
+                    report["ttl_added"] += 1
+                if not _text(enc) and size > self.compress_threshold:
+                    stale.append(key)
+            await pipe.execute()
+
+        for key in stale:
+            state = _parse(await self.client.hgetall(key))
+            if state is None:
+                continue
+            fields = self.encode(state)
+            if fields["enc"]:
+                args = [state["revision"], fields["code"], fields["enc"]]
+                report["recompressed"] += await self._recompress(keys=[key], args=args)
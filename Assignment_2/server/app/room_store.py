@@ -0,0 +1,147 @@
+"""Bounded in-memory room state used when Redis is not configured.
+
+Rooms are kept in least-recently-used order. A room is evicted once it has
+been idle for longer than ``idle_ttl`` seconds, or when the total size of all
+documents exceeds ``max_bytes`` (oldest first). Rooms with connected sids are
+never evicted, even if that leaves the store over budget.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+State = Dict[str, Any]
+
+
+def _document_bytes(state: State) -> int:
+    return len(state.get("code", "").encode("utf-8"))
+
+
+class BoundedRoomStore:
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        idle_ttl: float = 24 * 3600,
+        on_evict: Optional[Callable[[str], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self._on_evict = on_evict
+        self._clock = clock
+        # room -> (state, size in bytes, last access time)
+        self._rooms: "OrderedDict[str, Tuple[State, int, float]]" = OrderedDict()
+        self._sids: Dict[str, Set[str]] = {}
+        self.total_bytes = 0
+        self.evicted_idle = 0
+        self.evicted_budget = 0
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    def __contains__(self, room: object) -> bool:
+        return room in self._rooms
+
+    def get(self, room: str, default: Optional[State] = None) -> Optional[State]:
+        entry = self._rooms.get(room)
+        if entry is None:
+            return default
+        state, size, touched = entry
+        now = self._clock()
+        if self._expired(room, touched, now):
+            self._evict(room)
+            self.evicted_idle += 1
+            return default
+        self._rooms[room] = (state, size, now)
+        self._rooms.move_to_end(room)
+        return state
+
+    def __setitem__(self, room: str, state: State) -> None:
+        old = self._rooms.pop(room, None)
+        if old is not None:
+            self.total_bytes -= old[1]
+        size = _document_bytes(state)
+        self._rooms[room] = (state, size, self._clock())
+        self.total_bytes += size
+        self._enforce_limits(keep=room)
+
+    def update(self, batch: Dict[str, State]) -> None:
+        for room, state in batch.items():
+            self[room] = state
+
+    def pop(self, room: str, default: Optional[State] = None) -> Optional[State]:
+        entry = self._rooms.pop(room, None)
+        if entry is None:
+            return default
+        self.total_bytes -= entry[1]
+        return entry[0]
+
+    def attach(self, room: str, sid: str) -> None:
+        """Record that ``sid`` is connected to ``room``; active rooms are never evicted."""
+        self._sids.setdefault(room, set()).add(sid)
+
+    def detach(self, room: str, sid: str) -> None:
+        sids = self._sids.get(room)
+        if sids is None:
+            return
+        sids.discard(sid)
+        if not sids:
+            del self._sids[room]
+            entry = self._rooms.get(room)
+            if entry is not None:
+                # The idle clock starts when the last participant leaves.
+                self._rooms[room] = (entry[0], entry[1], self._clock())
+                self._rooms.move_to_end(room)
+
+    def is_active(self, room: str) -> bool:
+        return room in self._sids
+
+    def sweep(self) -> int:
+        """Evict every idle room now and return how many were removed."""
+        now = self._clock()
+        expired = [room for room, entry in self._rooms.items() if self._expired(room, entry[2], now)]
+        for room in expired:
+            self._evict(room)
+        self.evicted_idle += len(expired)
+        return len(expired)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "rooms": len(self._rooms),
+            "active_rooms": len(self._sids),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "evicted_idle": self.evicted_idle,
+            "evicted_budget": self.evicted_budget,
+        }
+
+    def _expired(self, room: str, touched: float, now: float) -> bool:
+        return now - touched > self.idle_ttl and not self.is_active(room)
+
+    def _evict(self, room: str) -> None:
+        self.pop(room)
+        if self._on_evict:
+            self._on_evict(room)
+
+    def _enforce_limits(self, keep: str) -> None:
+        now = self._clock()
+        victims: List[Tuple[str, str]] = []
+        over = self.total_bytes - self.max_bytes
+        # LRU order means idle rooms cluster at the front; stop at the first live one.
+        for room, (_, size, touched) in self._rooms.items():
+            if room == keep or self.is_active(room):
+                continue
+            if self._expired(room, touched, now):
+                victims.append((room, "idle"))
+                over -= size
+            elif over > 0:
+                victims.append((room, "budget"))
+                over -= size
+            else:
+                break
+        for room, reason in victims:
+            self._evict(room)
+            if reason == "idle":
+                self.evicted_idle += 1
+            else:
+                self.evicted_budget += 1
@@ -0,0 +1,65 @@
+"""Child process for app.executor: waits for one program, limits itself, runs it.
+
+Started ahead of time so the interpreter is warm. The first stdin line is a
+JSON object of limits, the rest is the program. Limits are applied, and
+privileges dropped to ``uid``/``gid`` when given, before the program is
+compiled, so they cover everything it does. Run with ``python -I -u``.
+"""
+
+import json
+import os
+import resource
+import sys
+import traceback
+
+
+def _limit(name: str, value: int) -> None:
+    kind = getattr(resource, name, None)
+    if kind is None or value < 0:
+        return
+    try:
+        resource.setrlimit(kind, (value, value))
+    except (ValueError, OSError):  # pragma: no cover - platform dependent
+        pass
+
+
+def _drop_privileges(uid: int, gid: int) -> None:
+    os.setgroups([])
+    os.setgid(gid)
+    os.setuid(uid)
+    if os.getuid() != uid or os.geteuid() != uid:  # pragma: no cover - defensive
+        raise SystemExit("could not drop privileges")
+
+
+def main() -> None:
+    limits = json.loads(sys.stdin.buffer.readline() or b"{}")
+    source = sys.stdin.buffer.read().decode("utf-8", errors="replace")
+    sys.stdin.close()
+
+    cpu = int(limits.get("cpu_seconds", 5))
+    # The hard CPU limit kills the process one second after SIGXCPU.
+    _limit("RLIMIT_CORE", 0)
+    _limit("RLIMIT_NOFILE", int(limits.get("open_files", 32)))
+    _limit("RLIMIT_FSIZE", int(limits.get("file_bytes", 1 << 20)))
+    _limit("RLIMIT_AS", int(limits.get("memory_mb", 256)) << 20)
+    # Counted per uid and checked on fork/clone: with 0 the program can start
+    # no processes or threads, so nothing escapes the group kill.
+    _limit("RLIMIT_NPROC", int(limits.get("processes", 0)))
+    kind = getattr(resource, "RLIMIT_CPU", None)
+    if kind is not None:
+        resource.setrlimit(kind, (cpu, cpu + 1))
+    if limits.get("uid") is not None:
+        _drop_privileges(int(limits["uid"]), int(limits["gid"]))
+
+    try:
+        exec(compile(source, "<session>", "exec"), {"__name__": "__main__", "__builtins__": __builtins__})
+    except SystemExit:
+        raise
+    except BaseException as exc:
+        # Skip this module's frame so the traceback starts in the program.
+        traceback.print_exception(type(exc), exc, exc.__traceback__.tb_next)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""In-memory serving of the built Vite frontend.
+
+``StaticBundle`` reads every file under ``dist/`` once at startup, with a
+strong ETag and gzip (and brotli, when the ``brotli`` package is installed)
+variants of compressible files; ``.gz``/``.br`` files already produced by the
+build are used as they are. Requests then cost a dict lookup: the variant is
+picked from Accept-Encoding, If-None-Match gets a 304, and Vite's
+content-hashed ``assets/`` files are marked immutable.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Mapping, Optional
+
+from fastapi import Response
+
+try:  # optional, only needed for brotli variants
+    import brotli
+except ImportError:  # pragma: no cover - depends on environment
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# Smaller files gain nothing from compression once headers are counted.
+MIN_COMPRESS_BYTES = 512
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/wasm")
+
+
+@dataclass
+class Asset:
+    content_type: str
+    etag: str
+    cache_control: str
+    # Content-Encoding ("identity", "gzip", "br") -> body
+    variants: Dict[str, bytes] = field(default_factory=dict)
+
+
+def _compress(data: bytes) -> Dict[str, bytes]:
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:  # pragma: no cover - depends on environment
+        variants["br"] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data)}
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """``Accept-Encoding`` as {coding: q}."""
+    accepted: Dict[str, float] = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+class StaticBundle:
+    def __init__(self, directory: Path, immutable_prefix: str = "assets/") -> None:
+        self.directory = Path(directory)
+        self.assets: Dict[str, Asset] = {}
+        for path in sorted(self.directory.rglob("*")):
+            if not path.is_file() or path.suffix in (".gz", ".br"):
+                continue
+            name = path.relative_to(self.directory).as_posix()
+            self.assets[name] = self._load(path, name.startswith(immutable_prefix))
+
+    def _load(self, path: Path, immutable: bool) -> Asset:
+        data = path.read_bytes()
+        content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+        asset = Asset(
+            content_type=content_type,
+            etag=hashlib.blake2b(data, digest_size=12).hexdigest(),
+            cache_control=IMMUTABLE if immutable else REVALIDATE,
+            variants={"identity": data},
+        )
+        prebuilt = {"gzip": path.with_name(path.name + ".gz"), "br": path.with_name(path.name + ".br")}
+        for encoding, sibling in prebuilt.items():
+            if sibling.is_file():
+                asset.variants[encoding] = sibling.read_bytes()
+        if len(asset.variants) == 1 and len(data) >= MIN_COMPRESS_BYTES and content_type.startswith(COMPRESSIBLE):
+            asset.variants.update(_compress(data))
+        return asset
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "files": len(self.assets),
+            "bytes": sum(len(body) for asset in self.assets.values() for body in asset.variants.values()),
+        }
+
+    def response(self, name: str, headers: Mapping[str, str]) -> Optional[Response]:
+        """The response for ``name``, or None if the bundle has no such file."""
+        asset = self.assets.get(name)
+        if asset is None:
+            return None
+        encoding = self._choose(asset, headers.get("accept-encoding", ""))
+        # Each encoding is a different representation, so it gets its own ETag.
+        etag = f'"{asset.etag}"' if encoding == "identity" else f'"{asset.etag}-{encoding}"'
+        response_headers = {"ETag": etag, "Cache-Control": asset.cache_control}
+        if len(asset.variants) > 1:
+            response_headers["Vary"] = "Accept-Encoding"
+        if_none_match = headers.get("if-none-match", "")
+        if if_none_match == "*" or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers=response_headers)
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        return Response(asset.variants[encoding], media_type=asset.content_type, headers=response_headers)
+
+    @staticmethod
+    def _choose(asset: Asset, accept_encoding: str) -> str:
+        accepted = accepted_encodings(accept_encoding)
+        best, best_q = "identity", 0.0
+        for encoding in ("br", "gzip"):
+            q = accepted.get(encoding, accepted.get("*", 0.0))
+            if encoding in asset.variants and q > best_q:
+                best, best_q = encoding, q
+        return best
@@ -0,0 +1,41 @@
+"""Optional msgpack encoding for server -> client events.
+
+A client opts in by connecting with ``auth={"wire": "msgpack"}``. Its events
+then carry one msgpack-encoded payload, which Socket.IO sends as a binary
+attachment: the document text is neither JSON-escaped nor base64-encoded.
+Other clients keep getting JSON, so both kinds can share a room. Clients
+still send their own (small) events as JSON.
+"""
+
+from typing import Any, Optional
+
+try:  # optional, only needed for clients that ask for it
+    import msgpack
+except ImportError:  # pragma: no cover - depends on environment
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+
+def negotiate(auth: Optional[Any]) -> str:
+    """Wire format for a client's ``auth`` payload; JSON unless msgpack is available."""
+    requested = auth.get("wire") if isinstance(auth, dict) else None
+    return MSGPACK if requested == MSGPACK and msgpack is not None else JSON
+
+
+def binary_room(room: str) -> str:
+    """Socket.IO room holding the msgpack clients of ``room``."""
+    return f"{room}#{MSGPACK}"
+
+
+def pack(payload: Any) -> bytes:
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def unpack(data: bytes) -> Any:
+    return msgpack.unpackb(data, raw=False)
+
+
+def encode(payload: Any, wire_format: str) -> Any:
+    return pack(payload) if wire_format == MSGPACK else payload
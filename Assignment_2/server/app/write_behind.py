@@ -0,0 +1,148 @@
+"""Write-behind cache that keeps Redis off the keystroke path.
+
+Room state is read from and written to process memory; dirty rooms are
+persisted in batches by a background task every ``interval`` seconds, or
+sooner once ``max_dirty`` rooms are waiting. ``flush`` and ``flush_room`` force
+a write, and ``close`` drains everything so shutdown never loses edits.
+
+Rooms not read or written for ``idle_ttl`` seconds are dropped once they are
+clean, so rooms that are never released (a client that never joined, a room
+that never closed) do not stay in memory for the life of the process.
+
+The cache assumes this process is the only writer of its rooms: another
+instance's writes are not seen until a room is dropped and reloaded, and
+edits waiting for a flush are lost if the process dies. Use it with a single
+instance or with the cluster router, which gives every room one owner.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
+
+State = Dict[str, Any]
+Loader = Callable[[str], Awaitable[Optional[State]]]
+BatchWriter = Callable[[Dict[str, State]], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindCache:
+    def __init__(
+        self,
+        load: Loader,
+        write_many: BatchWriter,
+        interval: float = 0.5,
+        max_dirty: int = 100,
+        idle_ttl: float = 300,
+    ) -> None:
+        self._load = load
+        self._write_many = write_many
+        self.interval = interval
+        self.max_dirty = max_dirty
+        self.idle_ttl = idle_ttl
+        self._states: Dict[str, State] = {}
+        self._used: Dict[str, float] = {}  # room -> monotonic time of the last get/put
+        self._dirty: Set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    @property
+    def room_count(self) -> int:
+        return len(self._states)
+
+    async def get(self, room: str) -> Optional[State]:
+        state = self._states.get(room)
+        if state is None:
+            state = await self._load(room)
+            # A concurrent put may have landed while the backend was read.
+            if state is not None and room not in self._states:
+                self._states[room] = state
+                self._ensure_task()
+            state = self._states.get(room, state)
+        if room in self._states:
+            self._used[room] = time.monotonic()
+        return state
+
+    def put(self, room: str, state: State) -> None:
+        self._states[room] = state
+        self._used[room] = time.monotonic()
+        self._dirty.add(room)
+        self._ensure_task()
+        if len(self._dirty) >= self.max_dirty:
+            self._wakeup.set()
+
+    async def flush(self, rooms: Optional[Iterable[str]] = None) -> int:
+        """Persist dirty rooms (all of them by default) and return how many were written."""
+        async with self._flush_lock:
+            if rooms is None:
+                batch_rooms = set(self._dirty)
+            else:
+                batch_rooms = self._dirty.intersection(rooms)
+            if not batch_rooms:
+                return 0
+            batch = {room: dict(self._states[room]) for room in batch_rooms}
+            self._dirty.difference_update(batch_rooms)
+            try:
+                await self._write_many(batch)
+            except Exception:
+                # Keep the rooms dirty unless a newer edit already re-marked them.
+                self._dirty.update(batch_rooms)
+                raise
+            return len(batch)
+
+    async def flush_room(self, room: str) -> None:
+        await self.flush([room])
+
+    async def release(self, room: str) -> None:
+        """Flush a room and drop it from memory, e.g. once its last client left."""
+        await self.flush_room(room)
+        if room not in self._dirty:
+            self._drop(room)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop clean rooms unused for ``idle_ttl`` seconds; return how many were dropped."""
+        if self.idle_ttl <= 0:
+            return 0
+        cutoff = (time.monotonic() if now is None else now) - self.idle_ttl
+        idle = [room for room, used in self._used.items() if used <= cutoff and room not in self._dirty]
+        for room in idle:
+            self._drop(room)
+        return len(idle)
+
+    def _drop(self, room: str) -> None:
+        self._states.pop(room, None)
+        self._used.pop(room, None)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def _ensure_task(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as exc:  # pragma: no cover - diagnostic
+                logger.warning("write-behind flush failed, will retry dirty=%d error=%r", len(self._dirty), exc)
+            self.evict_idle()
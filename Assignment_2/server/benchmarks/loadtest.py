@@ -0,0 +1,363 @@
+"""
+Load generator for the Socket.IO collaboration server.
+
+Starts the server in a subprocess (in-memory state, or Redis with --redis-url),
+opens N rooms with M simulated python-socketio clients each, and has every
+client type at a realistic rate through join/code_ops/language_change. It
+reports fan-out latency percentiles (edit sent -> ops_update received by each
+peer), ack latency, events/sec and the server's resident memory.
+
+Run from Assignment_2/server:
+    PYTHONPATH=. python benchmarks/loadtest.py --rooms 20 --clients 4 --duration 30
+    PYTHONPATH=. python benchmarks/loadtest.py --redis-url redis://localhost:6379/15 --json out.json
+    PYTHONPATH=. python benchmarks/loadtest.py --url http://127.0.0.1:8000 --server-pid 1234
+    PYTHONPATH=. python benchmarks/loadtest.py --redis-url redis://localhost:6379/15 --workers 3
+
+With --workers N the server is started as N cluster workers (see app/cluster.py)
+and each room's clients are spread across them, so every edit crosses workers.
+
+Requires aiohttp for the socket.io client. All clients run in this process, so
+keep an eye on the client's own CPU when pushing thousands of connections.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import string
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import httpx
+import socketio
+
+from app import ot
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+
+
+class Stats:
+    def __init__(self) -> None:
+        # (room, revision) -> time the op was sent / times peers received it
+        self.sent_at: Dict[Tuple[str, int], float] = {}
+        self.received_at: Dict[Tuple[str, int], List[float]] = defaultdict(list)
+        self.ack_latencies: List[float] = []
+        self.ops_sent = 0
+        self.ops_acked = 0
+        self.language_changes = 0
+        self.resyncs = 0
+        self.errors = 0
+        self.recording = False
+
+
+class SimulatedClient:
+    """One editor: at most one op in flight, later keystrokes buffered (like client/src/ot.js)."""
+
+    def __init__(self, url: str, room: str, stats: Stats, rate: float, rng: random.Random) -> None:
+        self.url = url
+        self.room = room
+        self.stats = stats
+        self.rate = rate
+        self.rng = rng
+        self.doc = ""
+        self.revision = 0
+        self.outstanding: Optional[ot.Op] = None
+        self.buffer: Optional[ot.Op] = None
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.sio.on("state_sync", self._on_state_sync)
+        self.sio.on("ops_update", self._on_ops_update)
+
+    async def start(self) -> None:
+        await self.sio.connect(self.url, transports=["websocket"], socketio_path="socket.io")
+        await self.sio.call("join", {"room": self.room})
+
+    async def stop(self) -> None:
+        await self.sio.disconnect()
+
+    async def _on_state_sync(self, state) -> None:
+        if self.outstanding is not None:
+            self.stats.resyncs += 1
+        self.doc = state.get("code", "")
+        self.revision = state.get("revision", 0)
+        self.outstanding = self.buffer = None
+
+    async def _on_ops_update(self, payload) -> None:
+        revision = payload["revision"]
+        if revision <= self.revision:
+            return
+        if self.stats.recording:
+            self.stats.received_at[(self.room, revision)].append(time.perf_counter())
+        self.revision = revision
+        op = payload["ops"]
+        if self.outstanding is not None:
+            self.outstanding, op = ot.transform(self.outstanding, op)
+        if self.buffer is not None:
+            self.buffer, op = ot.transform(self.buffer, op)
+        self.doc = ot.apply(self.doc, op)
+
+    def _send(self, op: ot.Op) -> None:
+        self.outstanding = op
+        sent = time.perf_counter()
+        self.stats.ops_sent += 1
+
+        async def on_ack(ack) -> None:
+            if not ack or not ack.get("ok"):
+                # A resync ack is followed by a state_sync that resets this client.
+                if not (ack and ack.get("resync")):
+                    self.stats.errors += 1
+                return
+            self.stats.ops_acked += 1
+            if self.stats.recording:
+                self.stats.sent_at[(self.room, ack["revision"])] = sent
+                self.stats.ack_latencies.append(time.perf_counter() - sent)
+            self.revision = ack["revision"]
+            self.outstanding, self.buffer = self.buffer, None
+            if self.outstanding is not None:
+                self._send(self.outstanding)
+
+        asyncio.ensure_future(
+            self.sio.emit("code_ops", {"room": self.room, "revision": self.revision, "ops": op}, callback=on_ack)
+        )
+
+    def _keystroke(self) -> ot.Op:
+        size = len(self.doc)
+        roll = self.rng.random()
+        if roll < 0.08 and size:
+            pos = self.rng.randrange(size)
+            return ot.normalize([pos, -1, size - pos - 1])
+        pos = self.rng.randint(0, size)
+        char = "\n" if roll < 0.15 else self.rng.choice(string.ascii_lowercase + " ")
+        return ot.normalize([pos, char, size - pos])
+
+    async def type_until(self, deadline: float) -> None:
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.rng.expovariate(self.rate))
+            if self.rng.random() < 0.005:
+                self.stats.language_changes += 1
+                language = self.rng.choice(["python", "javascript"])
+                await self.sio.emit("language_change", {"room": self.room, "language": language})
+                continue
+            op = self._keystroke()
+            self.doc = ot.apply(self.doc, op)
+            if self.outstanding is None:
+                self._send(op)
+            else:
+                self.buffer = op if self.buffer is None else ot.compose(self.buffer, op)
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import psutil  # optional, for non-Linux hosts
+
+        return psutil.Process(pid).memory_info().rss
+    except Exception:
+        return None
+
+
+def percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+def start_server(
+    redis_url: Optional[str], worker_id: Optional[str] = None, workers: Sequence[str] = ()
+) -> Tuple[subprocess.Popen, str]:
+    probe = socket.socket()
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    env = dict(os.environ)
+    for name in ("REDIS_URL", "WORKER_ID", "CLUSTER_WORKERS"):
+        env.pop(name, None)
+    if redis_url:
+        env["REDIS_URL"] = redis_url
+    if worker_id:
+        env["WORKER_ID"] = worker_id
+        env["CLUSTER_WORKERS"] = ",".join(workers)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "--factory", "app.main:create_app", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVER_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    return proc, f"http://127.0.0.1:{port}"
+
+
+async def wait_healthy(url: str, timeout: float = 20) -> None:
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(f"{url}/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"server at {url} did not become healthy")
+            await asyncio.sleep(0.1)
+
+
+def total_rss(pids: Sequence[int]) -> Optional[int]:
+    values = [rss_bytes(pid) for pid in pids]
+    return sum(values) if values and all(values) else None
+
+
+async def sample_rss(pids: Sequence[int], samples: List[int], stop: asyncio.Event) -> None:
+    while pids and not stop.is_set():
+        value = total_rss(pids)
+        if value:
+            samples.append(value)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run(args: argparse.Namespace) -> dict:
+    procs: List[subprocess.Popen] = []
+    urls = [args.url] if args.url else []
+    pids = [args.server_pid] if args.server_pid else []
+    if not urls:
+        workers = [f"w{i}" for i in range(args.workers)] if args.workers > 1 else [None]
+        for worker in workers:
+            proc, url = start_server(args.redis_url, worker, workers if worker else ())
+            procs.append(proc)
+            urls.append(url)
+            pids.append(proc.pid)
+    try:
+        for url in urls:
+            await wait_healthy(url)
+        rss: List[int] = []
+        stop_sampling = asyncio.Event()
+        sampler = asyncio.create_task(sample_rss(pids, rss, stop_sampling))
+
+        stats = Stats()
+        rng = random.Random(args.seed)
+        clients: List[SimulatedClient] = []
+        async with httpx.AsyncClient(base_url=urls[0]) as http:
+            for _ in range(args.rooms):
+                room = (await http.post("/api/session")).json()["sessionId"]
+                for i in range(args.clients):
+                    url = urls[i % len(urls)]
+                    clients.append(SimulatedClient(url, room, stats, args.rate, random.Random(rng.random())))
+        for i in range(0, len(clients), 50):
+            await asyncio.gather(*(client.start() for client in clients[i : i + 50]))
+        rss_connected = total_rss(pids)
+
+        # Warm up without recording so connection setup does not skew latencies.
+        await asyncio.gather(*(c.type_until(time.perf_counter() + args.warmup) for c in clients))
+        stats.recording = True
+        acked_before = stats.ops_acked
+        started = time.perf_counter()
+        await asyncio.gather(*(c.type_until(started + args.duration) for c in clients))
+        elapsed = time.perf_counter() - started
+        stats.recording = False
+        await asyncio.sleep(0.5)  # let in-flight broadcasts land
+        docs_by_room: Dict[str, set] = defaultdict(set)
+        for client in clients:
+            docs_by_room[client.room].add(client.doc)
+        diverged = sum(1 for docs in docs_by_room.values() if len(docs) > 1)
+
+        await asyncio.gather(*(client.stop() for client in clients), return_exceptions=True)
+        stop_sampling.set()
+        await sampler
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait(timeout=10)
+
+    fanout = [
+        received - stats.sent_at[key]
+        for key, times in stats.received_at.items()
+        if key in stats.sent_at
+        for received in times
+    ]
+    acked = stats.ops_acked - acked_before
+    mb = 1024 * 1024
+    return {
+        "config": {
+            "mode": "redis" if args.redis_url else ("external" if args.url else "memory"),
+            "workers": len(urls),
+            "rooms": args.rooms,
+            "clients_per_room": args.clients,
+            "keystrokes_per_sec_per_client": args.rate,
+            "duration_s": args.duration,
+        },
+        "ops_sent": stats.ops_sent,
+        "ops_acked": stats.ops_acked,
+        "events_per_sec": round(acked / elapsed, 1),
+        "deliveries_per_sec": round(len(fanout) / elapsed, 1),
+        "language_changes": stats.language_changes,
+        "resyncs": stats.resyncs,
+        "errors": stats.errors,
+        "diverged_rooms": diverged,
+        "fanout_latency_ms": percentiles(fanout),
+        "ack_latency_ms": percentiles(stats.ack_latencies),
+        "server_rss_mb": {
+            "connected": round(rss_connected / mb, 1) if rss_connected else None,
+            "peak": round(max(rss) / mb, 1) if rss else None,
+            "end": round(rss[-1] / mb, 1) if rss else None,
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test the collaboration server.")
+    parser.add_argument("--rooms", type=int, default=10, help="Number of rooms (default: 10)")
+    parser.add_argument("--clients", type=int, default=3, help="Clients per room (default: 3)")
+    parser.add_argument("--rate", type=float, default=5.0, help="Keystrokes per second per client (default: 5)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds (default: 20)")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds first (default: 3)")
+    parser.add_argument("--redis-url", help="Start the server against this Redis instead of in-memory state")
+    parser.add_argument("--workers", type=int, default=1, help="Cluster workers to start (needs --redis-url)")
+    parser.add_argument("--url", help="Target an already running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="PID to sample RSS from when using --url")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="PATH", help="Write the report as JSON ('-' for stdout)")
+    args = parser.parse_args()
+    if args.workers > 1 and not args.redis_url:
+        parser.error("--workers needs --redis-url")
+
+    report = asyncio.run(run(args))
+    if args.json == "-":
+        print(json.dumps(report, indent=2))
+        return
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    fan, ack, rss = report["fanout_latency_ms"], report["ack_latency_ms"], report["server_rss_mb"]
+    print(f"mode={report['config']['mode']} workers={report['config']['workers']} rooms={args.rooms} clients/room={args.clients} rate={args.rate}/s")
+    print(f"events/sec {report['events_per_sec']}  deliveries/sec {report['deliveries_per_sec']}")
+    print(f"fan-out ms p50={fan['p50']} p95={fan['p95']} p99={fan['p99']} max={fan['max']} (n={fan['count']})")
+    print(f"ack ms     p50={ack['p50']} p95={ack['p95']} p99={ack['p99']}")
+    print(f"server RSS MB connected={rss['connected']} peak={rss['peak']} end={rss['end']}")
+    print(f"resyncs={report['resyncs']} errors={report['errors']} diverged rooms={report['diverged_rooms']}")
+
+
+if __name__ == "__main__":
+    main()
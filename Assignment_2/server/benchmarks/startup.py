@@ -0,0 +1,102 @@
+"""
+Measure how long the server takes to import and to build its app.
+
+Each run starts a fresh interpreter (so nothing is cached in sys.modules) with
+``python -X importtime`` and:
+
+- import:      ``import app.main`` (module level only, no backends)
+- create_app:  ``create_app(redis_url="")``, the in-memory app
+
+The import-time log is summed per top-level package to show where the time
+goes (fastapi, socketio, redis, app, ...). REDIS_URL is unset, so no Redis
+connection is attempted; the factory connects lazily anyway.
+
+Exits non-zero when the median total is over --budget-ms, for use in CI.
+
+Run from Assignment_2/server:
+    PYTHONPATH=. python benchmarks/startup.py
+    PYTHONPATH=. python benchmarks/startup.py --runs 10 --budget-ms 1500 --json out.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+
+PROBE = """
+import time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+app.main.create_app(redis_url="")
+built = time.perf_counter()
+print("TIMES", (imported - started) * 1000, (built - imported) * 1000)
+"""
+
+
+def run_once() -> Dict[str, object]:
+    env = {k: v for k, v in os.environ.items() if k not in ("REDIS_URL", "CLUSTER_WORKERS", "RUN_WORKERS")}
+    env["PYTHONPATH"] = str(SERVER_DIR)
+    env["LOG_LEVEL"] = "WARNING"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=SERVER_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    import_ms, create_ms = (float(x) for x in proc.stdout.split("TIMES")[1].split())
+    packages: Dict[str, float] = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us) / 1000
+    return {"import_ms": import_ms, "create_app_ms": create_ms, "packages": dict(packages)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Server import and app construction time.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Packages to list")
+    parser.add_argument("--budget-ms", type=float, default=0, help="Fail when the median total exceeds this")
+    parser.add_argument("--json", metavar="PATH", help="Write results as JSON")
+    args = parser.parse_args()
+
+    runs: List[Dict[str, object]] = [run_once() for _ in range(args.runs)]
+    import_ms = statistics.median(r["import_ms"] for r in runs)
+    create_ms = statistics.median(r["create_app_ms"] for r in runs)
+    total_ms = statistics.median(r["import_ms"] + r["create_app_ms"] for r in runs)
+    packages = {
+        name: statistics.median(r["packages"].get(name, 0.0) for r in runs)
+        for name in {name for r in runs for name in r["packages"]}
+    }
+
+    print(f"runs={args.runs} import={import_ms:.0f}ms create_app={create_ms:.0f}ms total={total_ms:.0f}ms")
+    print(f"{'package':<24}{'self ms':>10}")
+    for name, ms in sorted(packages.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"{name:<24}{ms:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(
+                {"import_ms": import_ms, "create_app_ms": create_ms, "total_ms": total_ms, "packages": packages},
+                fh,
+                indent=2,
+            )
+    if args.budget_ms and total_ms > args.budget_ms:
+        print(f"over budget: {total_ms:.0f}ms > {args.budget_ms:.0f}ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Count Redis round-trips per Socket.IO event for the room-state layer.
+
+Replays a typing workload (mostly code edits, some language switches) against
+the original per-command access pattern and against app.repository with and
+without the write-behind cache.
+
+Run from Assignment_2/server:
+    PYTHONPATH=. python benchmarks/state_roundtrips.py                 # fakeredis
+    PYTHONPATH=. python benchmarks/state_roundtrips.py --redis-url redis://localhost:6379/15
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from app.repository import RoomRepository, create_client
+from app.write_behind import WriteBehindCache
+
+
+class RoundTripCounter:
+    """Counts commands sent on their own plus whole pipelines, one each."""
+
+    def __init__(self, client) -> None:
+        self.count = 0
+        execute_command = client.execute_command
+        make_pipeline = client.pipeline
+
+        async def counted_execute(*args, **kwargs):
+            self.count += 1
+            return await execute_command(*args, **kwargs)
+
+        def counted_pipeline(*args, **kwargs):
+            pipe = make_pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            async def counted_pipe_execute(*a, **kw):
+                self.count += 1
+                return await execute(*a, **kw)
+
+            pipe.execute = counted_pipe_execute
+            return pipe
+
+        client.execute_command = counted_execute
+        client.pipeline = counted_pipeline
+
+
+def workload(rooms: int, events: int, seed: int = 7):
+    rng = random.Random(seed)
+    for i in range(events):
+        room = f"bench{rng.randrange(rooms)}"
+        if rng.random() < 0.02:
+            yield "language", room, rng.choice(["python", "javascript"])
+        else:
+            yield "code", room, f"# edit {i}\n" * 50
+
+
+async def run_legacy(client, events):
+    # The original get_state/set_state: HGETALL then HSET for every event.
+    for kind, room, value in events:
+        data = await client.hgetall(f"room:{room}")
+        code = data.get(b"code", b"")
+        language = data.get(b"language", b"javascript")
+        if kind == "code":
+            code = value
+        else:
+            language = value
+        await client.hset(f"room:{room}", mapping={"code": code, "language": language})
+
+
+async def run_write_through(client, events):
+    # As app.main does by default: edits are a compare-and-set against the
+    # state this process last saw, reading only when it is unknown.
+    repo = RoomRepository(client)
+    known = {}
+    for kind, room, value in events:
+        if kind == "language":
+            known[room] = await repo.set_language(room, value, "")
+            continue
+        saved = False
+        while not saved:
+            read = known[room] if room in known else await repo.load(room)
+            current = read or {"language": "javascript", "revision": 0}
+            state = {"code": value, "language": current["language"], "revision": current["revision"] + 1}
+            saved, known[room] = await repo.save_if(room, state, read)
+
+
+async def run_write_behind(client, events, interval):
+    repo = RoomRepository(client)
+    cache = WriteBehindCache(repo.load, repo.save_many, interval=interval)
+    for kind, room, value in events:
+        current = await cache.get(room) or {"code": "", "language": "javascript", "revision": 0}
+        if kind == "code":
+            cache.put(room, {**current, "code": value, "revision": current["revision"] + 1})
+        else:
+            cache.put(room, {**current, "language": value})
+        await asyncio.sleep(0)  # yield like a real handler so the flusher can run
+    await cache.close()
+
+
+async def measure(name, make_client, runner, events, **kwargs):
+    client = make_client()
+    await client.flushdb()
+    counter = RoundTripCounter(client)
+    start = time.perf_counter()
+    await runner(client, events, **kwargs)
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+    return {
+        "mode": name,
+        "events": len(events),
+        "round_trips": counter.count,
+        "round_trips_per_event": round(counter.count / len(events), 3),
+        "seconds": round(elapsed, 4),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--redis-url", help="Local Redis to use instead of fakeredis (database is flushed)")
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--flush-interval", type=float, default=0.05)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    args = parser.parse_args()
+
+    if args.redis_url:
+        def make_client():
+            return create_client(args.redis_url)
+    else:
+        import fakeredis
+
+        server = fakeredis.FakeServer()
+
+        def make_client():
+            return fakeredis.FakeAsyncRedis(server=server)
+
+    events = list(workload(args.rooms, args.events))
+    results = [
+        await measure("legacy", make_client, run_legacy, events),
+        await measure("repository", make_client, run_write_through, events),
+        await measure(
+            "repository+write-behind", make_client, run_write_behind, events, interval=args.flush_interval
+        ),
+    ]
+    for result in results:
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(
+                f"{result['mode']:<24} {result['round_trips']:>7} round-trips "
+                f"{result['round_trips_per_event']:>7} per event  {result['seconds']:.3f}s"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
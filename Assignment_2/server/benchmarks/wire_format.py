@@ -0,0 +1,126 @@
+"""
+Compare Socket.IO payload size and serialization CPU for JSON vs msgpack events.
+
+For documents of several sizes it encodes a state_sync (whole document) and an
+ops_update (one keystroke) the way the server sends them:
+
+- json:     default Socket.IO packet, payload as a JSON dict
+- msgpack:  app.wire path, payload packed with msgpack and sent as a binary attachment
+
+and reports bytes on the wire plus encode (server) and decode (client) time per
+event. Needs the optional msgpack package.
+
+Run from Assignment_2/server:
+    PYTHONPATH=. python benchmarks/wire_format.py
+    PYTHONPATH=. python benchmarks/wire_format.py --sizes 1000 100000 --json out.json
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+from socketio import packet
+
+from app import wire
+
+SNIPPET = (
+    'def handler(event, context):\n'
+    '    """Return "ok" for every record."""\n'
+    '    for record in event["records"]:\n'
+    '        print(f"\\t{record[\'id\']}: {record.get(\'value\', 0)}")\n'
+    "    return {'status': \"ok\"}\n"
+)
+
+
+def make_document(size: int) -> str:
+    return (SNIPPET * (size // len(SNIPPET) + 1))[:size]
+
+
+def encode_json(event: str, payload: Any) -> List[Any]:
+    encoded = packet.Packet(packet.EVENT, data=[event, payload]).encode()
+    return encoded if isinstance(encoded, list) else [encoded]
+
+
+def encode_msgpack(event: str, payload: Any) -> List[Any]:
+    encoded = packet.Packet(packet.EVENT, data=[event, wire.pack(payload)]).encode()
+    return encoded if isinstance(encoded, list) else [encoded]
+
+
+def decode_json(frames: List[Any]) -> Any:
+    return packet.Packet(encoded_packet=frames[0]).data[1]
+
+
+def decode_msgpack(frames: List[Any]) -> Any:
+    pkt = packet.Packet(encoded_packet=frames[0])
+    for attachment in frames[1:]:
+        pkt.add_attachment(attachment)
+    return wire.unpack(pkt.data[1])
+
+
+def wire_bytes(frames: List[Any]) -> int:
+    return sum(len(frame.encode("utf-8") if isinstance(frame, str) else frame) for frame in frames)
+
+
+def per_call_us(func: Callable[[], Any], budget: float = 0.2) -> float:
+    calls, started = 0, time.perf_counter()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= budget:
+            return elapsed / calls * 1e6
+
+
+def measure(event: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    row: Dict[str, Any] = {"event": event}
+    for name, encode, decode in (("json", encode_json, decode_json), ("msgpack", encode_msgpack, decode_msgpack)):
+        frames = encode(event, payload)
+        assert decode(frames) == payload
+        row[name] = {
+            "bytes": wire_bytes(frames),
+            "encode_us": round(per_call_us(lambda: encode(event, payload)), 2),
+            "decode_us": round(per_call_us(lambda: decode(frames)), 2),
+        }
+    return row
+
+
+def run(sizes: List[int]) -> List[Dict[str, Any]]:
+    rng = random.Random(1)
+    results = []
+    for size in sizes:
+        code = make_document(size)
+        at = rng.randrange(len(code))
+        for event, payload in (
+            ("state_sync", {"code": code, "language": "python", "revision": 42}),
+            ("ops_update", {"revision": 43, "ops": [at, "x", len(code) - at]}),
+        ):
+            results.append({"doc_bytes": size, **measure(event, payload)})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="JSON vs msgpack Socket.IO payloads.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--json", metavar="PATH", help="Write results as JSON")
+    args = parser.parse_args()
+    if wire.msgpack is None:
+        parser.error("msgpack is not installed")
+
+    results = run(args.sizes)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as out:
+            json.dump(results, out, indent=2)
+    print(f"{'doc':>9} {'event':<11} {'json B':>9} {'mp B':>9} {'json enc':>9} {'mp enc':>9} {'json dec':>9} {'mp dec':>9}")
+    for row in results:
+        j, m = row["json"], row["msgpack"]
+        print(
+            f"{row['doc_bytes']:>9} {row['event']:<11} {j['bytes']:>9} {m['bytes']:>9} "
+            f"{j['encode_us']:>9} {m['encode_us']:>9} {j['decode_us']:>9} {m['decode_us']:>9}"
+        )
+    print("times in microseconds per event")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import pytest
+
+from app import main
+
+
+@pytest.fixture
+def application():
+    # In-memory state whatever REDIS_URL says.
+    return main.create_app(redis_url="")
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from app.backpressure import Coalescer, LatestWins, RateLimiter, TokenBucket
+from app.metrics import RATE_LIMITED
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_and_limits_wait():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, burst=2, clock=clock)
+    assert bucket.reserve(max_wait=0.5) == 0.0
+    assert bucket.reserve(max_wait=0.5) == 0.0
+    assert bucket.reserve(max_wait=0.5) == pytest.approx(0.1)
+    assert bucket.reserve(max_wait=0.15) is None
+    clock.now = 1.0
+    assert bucket.reserve(max_wait=0.0) == 0.0
+
+
+def test_rate_limiter_is_per_sid_and_can_be_disabled():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=1, burst=1, max_wait=0, clock=clock)
+    assert limiter.reserve("a") == 0.0
+    assert limiter.reserve("a") is None
+    assert limiter.reserve("b") == 0.0
+    limiter.forget("a")
+    assert limiter.reserve("a") == 0.0
+    assert RateLimiter(rate=0, burst=0).reserve("a") == 0.0
+
+
+@pytest.mark.asyncio
+async def test_latest_wins_keeps_only_the_newest_value():
+    throttle = LatestWins(RateLimiter(rate=20, burst=1))
+    applied = []
+
+    async def apply(value):
+        applied.append(value)
+
+    results = await asyncio.gather(*(throttle.submit("a", ("code_change", "r"), i, apply) for i in range(5)))
+    assert applied == [0, 4]
+    assert results == [True, True, False, False, False]
+
+
+@pytest.mark.asyncio
+async def test_latest_wins_holds_values_refused_by_the_limiter():
+    # One event per 50 ms with no waiting allowed: everything after the first is refused.
+    limiter = RateLimiter(rate=20, burst=1, max_wait=0)
+    throttle = LatestWins(limiter)
+    applied = []
+
+    async def apply(value):
+        applied.append(value)
+
+    before = RATE_LIMITED.value("language_change")
+    assert await throttle.submit("a", ("code_change", "r1"), 0, apply)
+    # The sid's budget is shared across rooms and events.
+    held = asyncio.ensure_future(throttle.submit("a", ("language_change", "r2"), "go", apply))
+    await asyncio.sleep(0)
+    assert applied == [0]
+    assert RATE_LIMITED.value("language_change") == before + 1
+    assert await throttle.submit("a", ("language_change", "r2"), "rust", apply) is False
+    assert await held
+    assert applied == [0, "rust"]
+
+
+@pytest.mark.asyncio
+async def test_coalescer_merges_held_updates_until_drained():
+    queued = {"a": 100}
+    sent = []
+
+    async def send(sid, event, payload):
+        sent.append((sid, event, payload))
+
+    coalescer = Coalescer(lambda sid: queued.get(sid, 0), send, max_queue=10, interval=0.01)
+    assert coalescer.lagging("a") and not coalescer.lagging("b")
+
+    coalescer.hold("a", "r", "ops_update", {"revision": 1, "ops": [3, "x"]})
+    coalescer.hold("a", "r", "ops_update", {"revision": 2, "ops": [4, "y"]})
+    coalescer.hold("a", "r", "language_update", {"language": "go"})
+    coalescer.hold("a", "r", "language_update", {"language": "rust"})
+    await asyncio.sleep(0.05)
+    assert sent == [] and coalescer.lagging("a")
+
+    queued["a"] = 0
+    await asyncio.sleep(0.05)
+    assert sent == [
+        ("a", "ops_update", {"revision": 2, "ops": [3, "xy"]}),
+        ("a", "language_update", {"language": "rust"}),
+    ]
+    assert coalescer.stats() == {"lagging_sids": 0, "held": 4, "coalesced": 2}
+
+
+@pytest.mark.asyncio
+async def test_coalescer_applies_ops_to_a_held_document():
+    sent = []
+
+    async def send(sid, event, payload):
+        sent.append((event, payload))
+
+    coalescer = Coalescer(lambda sid: 100, send, max_queue=10)
+    coalescer.hold("a", "r", "ops_update", {"revision": 1, "ops": [3, "x"]})
+    coalescer.hold("a", "r", "code_update", {"code": "abc", "revision": 2})
+    coalescer.hold("a", "r", "ops_update", {"revision": 3, "ops": ["!", 3]})
+    await coalescer.flush("a")
+    assert sent == [("code_update", {"code": "!abc", "revision": 3})]
+    coalescer.forget("a")
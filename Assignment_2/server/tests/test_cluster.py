@@ -0,0 +1,164 @@
+import asyncio
+import json
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app import cluster, main
+from app.cluster import ClusterError, ClusterRouter, HashRing, RoomChannelManager, holding_replies
+
+
+def test_hash_ring_spreads_rooms_and_moves_few_on_resize():
+    rooms = [f"room{i}" for i in range(3000)]
+    ring = HashRing(["w1", "w2", "w3"])
+    owners = {room: ring.owner(room) for room in rooms}
+    counts = {worker: list(owners.values()).count(worker) for worker in ring.nodes}
+    assert all(600 < count < 1400 for count in counts.values())
+    assert HashRing(["w3", "w2", "w1"]).owner("abc") == ring.owner("abc")
+
+    grown = HashRing(["w1", "w2", "w3", "w4"])
+    moved = [room for room in rooms if grown.owner(room) != owners[room]]
+    assert all(grown.owner(room) == "w4" for room in moved)
+    assert len(moved) < len(rooms) / 2
+
+
+def _routers(server, workers=("w1", "w2")):
+    routers = {}
+    for worker in workers:
+        router = ClusterRouter(fakeredis.aioredis.FakeRedis(server=server), worker, workers, timeout=1)
+
+        @router.handler
+        async def echo(room, value, _worker=worker):
+            if value == "boom":
+                raise ValueError("boom")
+            return {"owner": _worker, "room": room, "value": value}
+
+        routers[worker] = router
+    return routers
+
+
+def _room_owned_by(router, worker):
+    return next(f"r{i}" for i in range(1000) if router.owner(f"r{i}") == worker)
+
+
+@pytest.mark.asyncio
+async def test_router_forwards_to_owner():
+    routers = _routers(fakeredis.FakeServer())
+    for router in routers.values():
+        await router.start()
+    try:
+        room = _room_owned_by(routers["w1"], "w2")
+        result = await routers["w1"].call(room, "echo", value=1)
+        assert result == {"owner": "w2", "room": room, "value": 1}
+        assert routers["w1"].forwarded == 1 and routers["w2"].served == 1
+
+        local = _room_owned_by(routers["w1"], "w1")
+        assert (await routers["w1"].call(local, "echo", value=2))["owner"] == "w1"
+        assert routers["w1"].forwarded == 1
+
+        with pytest.raises(ClusterError, match="boom"):
+            await routers["w1"].call(room, "echo", value="boom")
+    finally:
+        for router in routers.values():
+            await router.close()
+
+
+@pytest.mark.asyncio
+async def test_router_fails_fast_when_owner_is_down():
+    routers = _routers(fakeredis.FakeServer())
+    await routers["w1"].start()
+    try:
+        room = _room_owned_by(routers["w1"], "w2")
+        with pytest.raises(ClusterError, match="not listening"):
+            await routers["w1"].call(room, "echo", value=1)
+    finally:
+        await routers["w1"].close()
+
+
+@pytest.mark.asyncio
+async def test_forwarded_reply_holds_the_listener_until_the_handler_returns():
+    routers = _routers(fakeredis.FakeServer())
+    for router in routers.values():
+        await router.start()
+    try:
+        room = _room_owned_by(routers["w1"], "w2")
+        with holding_replies():
+            await routers["w1"].call(room, "echo", value=1)
+            first = list(cluster._held.get())
+            assert len(first) == 1 and not first[0].is_set()
+            # A second forward frees the listener for its own reply instead of timing out.
+            assert (await routers["w1"].call(room, "echo", value=2))["value"] == 2
+            assert first[0].is_set()
+            second = list(cluster._held.get())
+            assert not second[0].is_set()
+        assert second[0].is_set()
+        # Outside a handler nothing is held.
+        await routers["w1"].call(room, "echo", value=3)
+        assert cluster._held.get() is None
+    finally:
+        for router in routers.values():
+            await router.close()
+
+
+@pytest.mark.asyncio
+async def test_disconnect_survives_an_unreachable_owner(application, monkeypatch):
+    async def owner_down(room, method, **kwargs):
+        raise ClusterError(f"owner w2 of room {room} is not listening")
+
+    await main.presence.join("sid1", "r1")
+    main.MSGPACK_SIDS.add("sid1")
+    monkeypatch.setattr(main.router, "call", owner_down)
+    await main.disconnect("sid1")
+    assert main.presence.rooms_of("sid1") == set()
+    assert "sid1" not in main.MSGPACK_SIDS
+
+
+def _manager(server):
+    manager = RoomChannelManager("redis://localhost:6379/0")
+
+    def connect():
+        manager.redis = fakeredis.aioredis.FakeRedis(server=server)
+        manager.pubsub = manager.redis.pubsub()
+        manager.connected = True
+
+    manager._redis_connect = connect
+    return manager
+
+
+def test_room_emits_use_room_channels():
+    manager = RoomChannelManager("redis://localhost:6379/0")
+    emit = {"method": "emit", "event": "ops_update", "room": "abc", "namespace": "/"}
+    assert manager.channel_for(emit) == "socketio:room:abc"
+    assert manager.channel_for({**emit, "room": None}) == "socketio"
+    assert manager.channel_for({"method": "disconnect", "sid": "x", "namespace": "/"}) == "socketio"
+
+
+@pytest.mark.asyncio
+async def test_workers_only_receive_watched_rooms():
+    server = fakeredis.FakeServer()
+    first, second = _manager(server), _manager(server)
+    received = {"first": [], "second": []}
+
+    async def consume(manager, name):
+        async for data in manager._listen():
+            received[name].append(json.loads(data)["room"])
+
+    tasks = [asyncio.create_task(consume(first, "first")), asyncio.create_task(consume(second, "second"))]
+    await first.watch("alpha")
+    await asyncio.sleep(0.05)
+    await second.watch("beta")
+
+    publisher = _manager(server)
+    for room in ("alpha", "beta", "gamma"):
+        await publisher._publish({"method": "emit", "event": "ops_update", "room": room, "namespace": "/"})
+    await asyncio.sleep(0.1)
+    await second.unwatch("beta")
+    await asyncio.sleep(0.05)
+    await publisher._publish({"method": "emit", "event": "ops_update", "room": "beta", "namespace": "/"})
+    await asyncio.sleep(0.1)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    assert received == {"first": ["alpha"], "second": ["beta"]}
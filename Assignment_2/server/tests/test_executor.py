@@ -0,0 +1,131 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app import main
+from app.executor import ExecutionError, ExecutionPool
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="needs POSIX rlimits")
+
+
+async def _collect(pool, source):
+    return [item async for item in pool.run(source)]
+
+
+@pytest.mark.asyncio
+async def test_run_streams_output_and_result():
+    pool = ExecutionPool(size=1, timeout=5)
+    await pool.start()
+    try:
+        items = await _collect(pool, "import sys\nprint('hello')\nprint('oops', file=sys.stderr)\nsys.exit(3)")
+        output = {stream: "".join(i["data"] for i in items if i.get("stream") == stream) for stream in ("stdout", "stderr")}
+        assert output == {"stdout": "hello\n", "stderr": "oops\n"}
+        assert items[-1]["exitCode"] == 3 and not items[-1]["timedOut"]
+
+        items = await _collect(pool, "1/0")
+        assert "ZeroDivisionError" in items[0]["data"] and "sandbox_runner" not in items[0]["data"]
+        assert pool.stats()["completed"] == 2
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_run_enforces_limits():
+    pool = ExecutionPool(size=1, timeout=0.5, max_output=100, memory_mb=64)
+    await pool.start()
+    try:
+        result = (await _collect(pool, "while True: pass"))[-1]
+        assert result["timedOut"] and result["exitCode"] != 0
+
+        items = await _collect(pool, "print('x' * 1000)")
+        assert sum(len(i.get("data", "")) for i in items) == 100 and items[-1]["truncated"]
+
+        items = await _collect(pool, "data = bytearray(200 * 1024 * 1024)")
+        assert "MemoryError" in "".join(i.get("data", "") for i in items)
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_programs_cannot_start_processes_or_keep_privileges():
+    pool = ExecutionPool(size=1, timeout=5)
+    await pool.start()
+    try:
+        items = await _collect(pool, "import os\ntry:\n    os.fork()\nexcept OSError:\n    print('no fork')\nprint(os.getuid())")
+        output = "".join(i.get("data", "") for i in items).splitlines()
+        assert output[0] == "no fork"
+        if os.geteuid() == 0:
+            import pwd
+
+            assert int(output[1]) == pwd.getpwnam("nobody").pw_uid
+    finally:
+        await pool.close()
+
+
+def test_root_user_is_refused():
+    with pytest.raises(ExecutionError, match="root|needs the server"):
+        ExecutionPool(size=1, user="root")
+
+
+@pytest.mark.asyncio
+async def test_cold_take_starts_one_process_and_tops_up_to_size():
+    pool = ExecutionPool(size=2, timeout=5)
+    spawned = 0
+    spawn = pool._spawn
+
+    async def counting_spawn():
+        nonlocal spawned
+        spawned += 1
+        return await spawn()
+
+    pool._spawn = counting_spawn
+    try:
+        # No warm-up: the run starts its own process, and two more are warmed.
+        assert (await _collect(pool, "print(1)"))[-1]["exitCode"] == 0
+        await asyncio.sleep(0.5)
+        assert spawned == 3 and pool.stats()["warm"] == 2
+        await _collect(pool, "print(2)")
+        await asyncio.sleep(0.5)
+        assert spawned == 4 and pool.stats()["warm"] == 2
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_queue_is_capped():
+    pool = ExecutionPool(size=1, max_queue=1, timeout=2)
+    await pool.start()
+    try:
+        first = asyncio.create_task(_collect(pool, "import time; time.sleep(0.3)"))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(_collect(pool, "print(2)"))
+        await asyncio.sleep(0.05)
+        assert pool.full
+        with pytest.raises(ExecutionError, match="queue is full"):
+            await _collect(pool, "print(3)")
+        await first
+        assert "".join(item.get("data", "") for item in await second) == "2\n"
+        assert pool.stats()["rejected"] == 1
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_run_endpoint_streams_ndjson():
+    pool = ExecutionPool(size=1, timeout=5)
+    await pool.start()
+    application = main.create_app(redis_url="", executor=pool)
+    try:
+        transport = ASGITransport(app=application)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.post("/api/run", json={"code": "print(6 * 7)"})
+            assert resp.status_code == 200
+            items = [json.loads(line) for line in resp.text.splitlines()]
+            assert "".join(item.get("data", "") for item in items) == "42\n"
+            assert items[-1]["exitCode"] == 0
+    finally:
+        await pool.close()
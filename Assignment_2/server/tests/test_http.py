@@ -1,12 +1,12 @@
 import pytest
 from httpx import AsyncClient, ASGITransport
 
-from app.main import app
+from app import main
 
 
 @pytest.mark.asyncio
-async def test_health():
-    transport = ASGITransport(app=app)
+async def test_health(application):
+    transport = ASGITransport(app=application)
     async with AsyncClient(transport=transport, base_url="http://test") as client:
         resp = await client.get("/health")
         assert resp.status_code == 200
@@ -14,10 +14,83 @@ async def test_health():
 
 
 @pytest.mark.asyncio
-async def test_create_session():
-    transport = ASGITransport(app=app)
+async def test_create_session(application):
+    transport = ASGITransport(app=application)
     async with AsyncClient(transport=transport, base_url="http://test") as client:
         resp = await client.post("/api/session")
         assert resp.status_code == 200
         data = resp.json()
         assert "sessionId" in data and len(data["sessionId"]) == 8
+
+
+@pytest.mark.asyncio
+async def test_metrics_exposition(application):
+    transport = ASGITransport(app=application)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        await client.post("/api/session")
+        resp = await client.get("/metrics")
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/plain")
+        body = resp.text
+        assert "# TYPE interview_socket_event_seconds histogram" in body
+        assert 'interview_state_store_seconds_count{op="set",backend="memory"}' in body
+        assert "interview_active_rooms 0" in body
+
+
+@pytest.mark.asyncio
+async def test_run_is_disabled_by_default(application):
+    transport = ASGITransport(app=application)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post("/api/run", json={"code": "print(1)"})
+        assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_create_app_uses_injected_repository():
+    fakeredis = pytest.importorskip("fakeredis")
+    from app.repository import RoomRepository
+
+    repository = RoomRepository(fakeredis.FakeAsyncRedis(), ttl=60)
+    application = main.create_app(repository=repository)
+    transport = ASGITransport(app=application)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = (await client.post("/api/session")).json()["sessionId"]
+        # Write-behind is opt-in, so the session is already in Redis.
+        assert main.state_cache is None
+        assert (await repository.load(session_id))["code"] == "# Start coding\n"
+        assert (await client.get("/health")).json()["redis"] == {"healthy": None, "failures": 0, "last_error": ""}
+    main.create_app(redis_url="")
+
+
+@pytest.mark.asyncio
+async def test_write_through_edit_is_one_round_trip():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa", reason="lupa required for Lua scripts in fakeredis")
+    from app.repository import RoomRepository
+
+    client = fakeredis.FakeAsyncRedis()
+    repository = RoomRepository(client, ttl=60)
+    main.create_app(repository=repository)
+    await main.room_create("r1", code="", language="python")
+    commands = []
+    execute_command = client.execute_command
+
+    async def counted(*args, **kwargs):
+        commands.append(args[0])
+        return await execute_command(*args, **kwargs)
+
+    client.execute_command = counted
+    await main.room_code_ops("r1", sid="s1", revision=0, ops=["a"])  # reads the room once
+    commands.clear()
+    for revision in range(1, 4):
+        ack = await main.room_code_ops("r1", sid="s1", revision=revision, ops=[revision, "b"])
+        assert ack == {"ok": True, "revision": revision + 1}
+    assert commands == ["EVALSHA"] * 3
+
+    # Another instance's write is detected and the edit is redone on top of it.
+    await repository.save("r1", {"code": "xyz", "language": "python", "revision": 9})
+    commands.clear()
+    await main.room_code_change("r1", sid="s1", code="xyz!")
+    assert commands == ["EVALSHA", "EVALSHA"]
+    assert await repository.load("r1") == {"code": "xyz!", "language": "python", "revision": 10}
+    main.create_app(redis_url="")
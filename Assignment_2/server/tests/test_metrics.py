@@ -0,0 +1,44 @@
+import pytest
+
+from app.metrics import Counter, Gauge, Histogram, Registry, timed_event, EVENT_SECONDS
+
+
+def test_counter_renders_labels():
+    counter = Counter("fallbacks_total", "Fallbacks.", ["op"])
+    counter.inc("get")
+    counter.inc("get", amount=2)
+    assert counter.value("get") == 3
+    assert counter.render() == ['fallbacks_total{op="get"} 3']
+
+
+def test_histogram_buckets_are_cumulative():
+    hist = Histogram("latency_seconds", "Latency.", ["op"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        hist.observe(value, "get")
+    assert hist.count("get") == 4
+    lines = hist.render()
+    assert 'latency_seconds_bucket{op="get",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{op="get",le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{op="get",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{op="get"} 4' in lines
+
+
+def test_registry_collects_gauges_at_scrape_time():
+    registry = Registry()
+    rooms = {"a": 1}
+    registry.register(Gauge("rooms", "Rooms.", lambda: [((), len(rooms))]))
+    assert "rooms 1\n" in registry.render()
+    rooms["b"] = 2
+    text = registry.render()
+    assert "# TYPE rooms gauge" in text and "rooms 2\n" in text
+
+
+@pytest.mark.asyncio
+async def test_timed_event_records_handler_name():
+    @timed_event
+    async def sample_event(sid, data):
+        return data
+
+    before = EVENT_SECONDS.count("sample_event")
+    assert await sample_event("sid", {"ok": True}) == {"ok": True}
+    assert EVENT_SECONDS.count("sample_event") == before + 1
@@ -0,0 +1,86 @@
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app import main, ot
+from app.oplog import FileOpLog, RedisOpLog
+
+
+@pytest.fixture(params=["redis", "file"])
+def oplog(request, tmp_path):
+    if request.param == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        return RedisOpLog(fakeredis.aioredis.FakeRedis(), snapshot_every=5, compress_threshold=64)
+    return FileOpLog(tmp_path, snapshot_every=5)
+
+
+async def _type(oplog, room, text, start=""):
+    code, revision = start, 0
+    for char in text:
+        op = ot.normalize([len(code), char])
+        after = ot.apply(code, op)
+        revision += 1
+        oplog.record(room, revision, op, code, after, "python")
+        code = after
+    await oplog.flush()
+    return code
+
+
+@pytest.mark.asyncio
+async def test_checkout_rebuilds_every_revision(oplog):
+    text = "print('hello, op log')" * 4
+    await _type(oplog, "abc", text, start="# ")
+    for revision in range(len(text) + 1):
+        state = await oplog.checkout("abc", revision)
+        assert state == {"code": "# " + text[:revision], "language": "python", "revision": revision}
+    assert await oplog.checkout("abc", len(text) + 1) is None
+    assert await oplog.checkout("other", 0) is None
+    await oplog.close()
+
+
+@pytest.mark.asyncio
+async def test_entries_page_through_history(oplog):
+    await _type(oplog, "abc", "0123456789ab")
+    first = await oplog.entries("abc", after=0, limit=5)
+    assert [entry["revision"] for entry in first] == [1, 2, 3, 4, 5]
+    rest = await oplog.entries("abc", after=first[-1]["revision"], limit=100)
+    assert [entry["revision"] for entry in rest] == list(range(6, 13))
+    assert rest[0]["ops"] == [5, "5"]
+
+
+@pytest.mark.asyncio
+async def test_revisions_only_move_forward(oplog):
+    await _type(oplog, "abc", "abc")
+    oplog.record("abc", 2, [1, "z"], "a", "az", "python")
+    await oplog.flush()
+    assert oplog.skipped == 1
+    assert (await oplog.checkout("abc", 3))["code"] == "abc"
+
+
+@pytest.mark.asyncio
+async def test_closed_rooms_are_forgotten(oplog):
+    code = await _type(oplog, "abc", "abc")
+    oplog.forget("abc")
+    assert oplog._started == set()
+    # Reopened, the room starts from a fresh base snapshot and its history still reads through.
+    oplog.record("abc", 4, ot.normalize([3, "d"]), code, code + "d", "python")
+    await oplog.flush()
+    assert (await oplog.checkout("abc", 4))["code"] == "abcd"
+    assert (await oplog.checkout("abc", 2))["code"] == "ab"
+    await oplog.close()
+
+
+@pytest.mark.asyncio
+async def test_history_endpoints(tmp_path):
+    log = FileOpLog(tmp_path, snapshot_every=3)
+    application = main.create_app(redis_url="", oplog=log)
+    await _type(log, "sess1", "hello")
+    transport = ASGITransport(app=application)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.get("/api/session/sess1/history", params={"after": 1, "limit": 3})
+        assert resp.headers["content-type"] == "application/x-ndjson"
+        assert [line.count('"revision"') for line in resp.text.splitlines()] == [1, 1, 1]
+        assert '"revision": 2' in resp.text.splitlines()[0]
+
+        resp = await client.get("/api/session/sess1/revisions/4")
+        assert resp.json() == {"code": "hell", "language": "python", "revision": 4}
+        assert (await client.get("/api/session/sess1/revisions/9")).status_code == 404
@@ -0,0 +1,67 @@
+import pytest
+
+from app import ot
+
+
+def test_apply_insert_and_delete():
+    assert ot.apply("hello world", [6, -5, "there"]) == "hello there"
+
+
+def test_apply_rejects_wrong_length():
+    with pytest.raises(ot.OperationError):
+        ot.apply("abc", [5])
+
+
+def test_normalize_rejects_garbage():
+    with pytest.raises(ot.OperationError):
+        ot.normalize([1, None])
+    with pytest.raises(ot.OperationError):
+        ot.normalize("not a list")
+
+
+def test_normalize_merges_components():
+    assert ot.normalize([1, 2, 0, "a", "", "b", -1, -1]) == [3, "ab", -2]
+
+
+def test_transform_converges():
+    doc = "def f():\n    pass\n"
+    a = [4, "main", -1, 13]  # rename f -> main
+    b = [13, -4, "return 1", 1]  # replace body
+    a_prime, b_prime = ot.transform(a, b)
+    assert ot.apply(ot.apply(doc, a), b_prime) == ot.apply(ot.apply(doc, b), a_prime)
+
+
+def test_transform_tie_prefers_first_insert():
+    a_prime, b_prime = ot.transform(["a", 1], ["b", 1])
+    assert ot.apply(ot.apply("x", ["a", 1]), b_prime) == "abx"
+
+
+def test_compose_matches_sequential_apply():
+    doc = "abc"
+    a = [1, "XY", -1, 1]
+    b = [2, -1, 1, "!"]
+    assert ot.apply(doc, ot.compose(a, b)) == ot.apply(ot.apply(doc, a), b)
+
+
+def test_lengths_use_utf16_units():
+    doc = "a😀b"
+    assert ot.base_length([4]) == 4
+    assert ot.apply(doc, [1, -2, "c", 1]) == "acb"
+
+
+def test_replace_produces_minimal_edit():
+    op = ot.replace("print('hi')", "print('bye')")
+    assert op == [7, "bye", -2, 2]
+    assert ot.apply("print('hi')", op) == "print('bye')"
+
+
+def test_history_since():
+    history = ot.OpHistory(revision=10, limit=2)
+    history.append([1])
+    history.append([2])
+    history.append([3])
+    assert history.revision == 13
+    assert history.since(13) == []
+    assert history.since(11) == [[2], [3]]
+    assert history.since(10) is None
+    assert history.since(14) is None
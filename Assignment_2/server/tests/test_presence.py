@@ -0,0 +1,64 @@
+import pytest
+
+from app.presence import Presence
+
+
+@pytest.mark.asyncio
+async def test_counts_and_hooks():
+    presence = Presence()
+    opened, closed = [], []
+
+    @presence.on_room_opened
+    async def record_open(room):
+        opened.append(room)
+
+    @presence.on_room_closed
+    async def record_close(room):
+        closed.append(room)
+
+    assert await presence.join("s1", "r") == 1
+    assert await presence.join("s2", "r") == 2
+    assert await presence.join("s2", "r") == 2  # joining twice is a no-op
+    assert opened == ["r"]
+
+    assert await presence.leave("s1", "r") == 1
+    assert closed == []
+    assert await presence.leave("s2", "r") == 0
+    assert closed == ["r"]
+    assert presence.stats() == {"rooms": 0, "sids": 0}
+
+
+@pytest.mark.asyncio
+async def test_disconnect_leaves_every_room():
+    presence = Presence()
+    closed = []
+
+    @presence.on_room_closed
+    async def record_close(room):
+        closed.append(room)
+
+    await presence.join("s1", "a")
+    await presence.join("s1", "b")
+    await presence.join("s2", "b")
+    assert await presence.disconnect("s1") == {"a": 0, "b": 1}
+    assert closed == ["a"]
+    assert presence.rooms_of("s1") == set()
+    assert presence.count("b") == 1
+
+
+@pytest.mark.asyncio
+async def test_failing_hook_does_not_block_others():
+    presence = Presence()
+    closed = []
+
+    @presence.on_room_closed
+    async def broken(room):
+        raise RuntimeError("boom")
+
+    @presence.on_room_closed
+    async def record_close(room):
+        closed.append(room)
+
+    await presence.join("s1", "r")
+    assert await presence.leave("s1", "r") == 0
+    assert closed == ["r"]
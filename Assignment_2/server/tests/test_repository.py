@@ -0,0 +1,143 @@
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis", reason="fakeredis required for repository tests")
+
+from app.repository import RedisHealth, RedisSettings, RoomRepository
+
+
+@pytest.fixture
+def repo():
+    return RoomRepository(fakeredis.FakeAsyncRedis(), ttl=60, compress_threshold=64)
+
+
+@pytest.mark.asyncio
+async def test_save_and_load_round_trip(repo):
+    await repo.save("r1", {"code": "x = 1", "language": "python", "revision": 4})
+    assert await repo.load("r1") == {"code": "x = 1", "language": "python", "revision": 4}
+    assert await repo.load("missing") is None
+
+
+@pytest.mark.asyncio
+async def test_save_many_and_load_many_use_one_pipeline(repo):
+    batch = {f"r{i}": {"code": str(i), "language": "python", "revision": i} for i in range(5)}
+    await repo.save_many(batch)
+    loaded = await repo.load_many(["r0", "r4", "nope"])
+    assert loaded["r4"] == {"code": "4", "language": "python", "revision": 4}
+    assert loaded["nope"] is None
+
+
+@pytest.mark.asyncio
+async def test_set_language_keeps_code_and_creates_missing_rooms(repo):
+    pytest.importorskip("lupa", reason="lupa required for Lua scripts in fakeredis")
+    await repo.save("r1", {"code": "print(1)", "language": "python", "revision": 2})
+    state = await repo.set_language("r1", "javascript", "// new\n")
+    assert state == {"code": "print(1)", "language": "javascript", "revision": 2}
+
+    state = await repo.set_language("fresh", "python", "// new\n")
+    assert state == {"code": "// new\n", "language": "python", "revision": 0}
+
+
+@pytest.mark.asyncio
+async def test_save_if_writes_only_over_the_state_it_was_computed_from(repo):
+    pytest.importorskip("lupa", reason="lupa required for Lua scripts in fakeredis")
+    first = {"code": "a", "language": "python", "revision": 1}
+    assert await repo.save_if("r1", first, None) == (True, first)
+    assert await repo.save_if("r1", first, None) == (False, first)
+
+    second = {"code": "ab", "language": "python", "revision": 2}
+    assert await repo.save_if("r1", second, first) == (True, second)
+    # Computed from revision 1, which is gone.
+    assert await repo.save_if("r1", {**second, "code": "ax"}, first) == (False, second)
+    # A language change keeps the revision but still invalidates the read.
+    changed = await repo.set_language("r1", "javascript")
+    assert await repo.save_if("r1", {**second, "revision": 3}, second) == (False, changed)
+    assert await repo.save_if("missing", second, first) == (False, None)
+    assert await repo.client.ttl(repo.key("r1")) == 60
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("REDIS_POOL_SIZE", "7")
+    monkeypatch.setenv("REDIS_SOCKET_TIMEOUT", "1.5")
+    monkeypatch.setenv("REDIS_RETRIES", "0")
+    settings = RedisSettings.from_env()
+    assert settings.pool_size == 7
+    assert settings.socket_timeout == 1.5
+    options = settings.client_options()
+    assert options["max_connections"] == 7
+
+
+@pytest.mark.asyncio
+async def test_large_documents_are_stored_compressed(repo):
+    code = "print('hello')\n" * 200
+    await repo.save("big", {"code": code, "language": "python", "revision": 1})
+    await repo.save("small", {"code": "x", "language": "python", "revision": 1})
+
+    raw = await repo.client.hgetall("room:big")
+    assert raw[b"enc"] == b"zlib"
+    assert len(raw[b"code"]) < len(code) // 10
+    assert (await repo.client.hgetall("room:small"))[b"enc"] == b""
+
+    assert (await repo.load("big"))["code"] == code
+    assert (await repo.load("small"))["code"] == "x"
+
+
+@pytest.mark.asyncio
+async def test_writes_and_touch_refresh_ttl(repo):
+    await repo.save("r1", {"code": "x", "language": "python", "revision": 1})
+    assert 0 < await repo.client.ttl("room:r1") <= 60
+    await repo.expire("r1", 5)
+    await repo.touch("r1")
+    assert await repo.client.ttl("room:r1") > 5
+
+
+@pytest.mark.asyncio
+async def test_compact_adds_ttls_and_recompresses_legacy_keys(repo):
+    pytest.importorskip("lupa", reason="lupa required for Lua scripts in fakeredis")
+    big = "y = 2\n" * 100
+    # Keys written before TTLs and compression existed.
+    await repo.client.hset("room:old", mapping={"code": big, "language": "python", "revision": 3})
+    await repo.client.hset("room:tiny", mapping={"code": "z", "language": "python", "revision": 1})
+    await repo.client.set("unrelated", "1")
+
+    report = await repo.compact(batch_size=1)
+    assert report["keys"] == 2
+    assert report["ttl_added"] == 2
+    assert report["recompressed"] == 1
+    assert report["dbsize"] == 3
+    assert await repo.client.ttl("unrelated") == -1
+    assert (await repo.client.hget("room:old", "enc")) == b"zlib"
+    assert (await repo.load("old"))["code"] == big
+
+    again = await repo.compact()
+    assert again["ttl_added"] == 0 and again["recompressed"] == 0
+
+
+class FlakyClient:
+    def __init__(self):
+        self.up = True
+        self.disconnects = 0
+        self.connection_pool = self
+
+    async def ping(self):
+        if not self.up:
+            raise ConnectionError("connection reset")
+        return True
+
+    async def disconnect(self):
+        self.disconnects += 1
+
+
+@pytest.mark.asyncio
+async def test_health_check_drops_broken_connections():
+    client = FlakyClient()
+    health = RedisHealth(client, interval=1)
+    assert await health.check() and health.healthy
+
+    client.up = False
+    assert not await health.check()
+    assert client.disconnects == 1
+    assert health.stats() == {"healthy": False, "failures": 1, "last_error": "ConnectionError('connection reset')"}
+
+    client.up = True
+    assert await health.check()
+    assert health.healthy and health.failures == 0
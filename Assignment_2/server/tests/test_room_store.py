@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from app import main
+from app.room_store import BoundedRoomStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def state(code):
+    return {"code": code, "language": "python", "revision": 0}
+
+
+def test_budget_evicts_least_recently_used():
+    evicted = []
+    store = BoundedRoomStore(max_bytes=10, idle_ttl=100, on_evict=evicted.append, clock=FakeClock())
+    store["a"] = state("1234")
+    store["b"] = state("1234")
+    store.get("a")  # b is now the least recently used room
+    store["c"] = state("1234")
+    assert "b" not in store
+    assert "a" in store and "c" in store
+    assert evicted == ["b"]
+    assert store.total_bytes == 8
+    assert store.stats()["evicted_budget"] == 1
+
+
+def test_idle_rooms_expire():
+    clock = FakeClock()
+    store = BoundedRoomStore(max_bytes=1000, idle_ttl=10, clock=clock)
+    store["a"] = state("x")
+    clock.now = 11
+    assert store.get("a") is None
+    assert store.stats()["evicted_idle"] == 1
+    assert store.total_bytes == 0
+
+
+def test_active_rooms_are_never_evicted():
+    clock = FakeClock()
+    store = BoundedRoomStore(max_bytes=5, idle_ttl=10, clock=clock)
+    store["busy"] = state("12345")
+    store.attach("busy", "sid1")
+    store["other"] = state("12345")
+    clock.now = 100
+    assert store.sweep() == 1
+    assert store.get("busy") == state("12345")
+    assert "other" not in store
+
+    store.detach("busy", "sid1")
+    clock.now = 105
+    assert store.get("busy") is not None  # idle clock restarted on detach
+    clock.now = 200
+    assert store.sweep() == 1
+    assert len(store) == 0
+
+
+def test_overwrite_tracks_size():
+    store = BoundedRoomStore(max_bytes=100, clock=FakeClock())
+    store["a"] = state("abc")
+    store.update({"a": state("abcdef"), "b": state("é")})
+    assert store.total_bytes == 6 + 2
+    assert store.pop("a") == state("abcdef")
+    assert store.total_bytes == 2
+
+
+@pytest.mark.asyncio
+async def test_app_sweeps_idle_rooms_in_the_background(monkeypatch):
+    store = BoundedRoomStore(idle_ttl=0.02)
+    monkeypatch.setattr(main, "ROOM_STATE", store)
+    store["quiet"] = state("x")
+    task = asyncio.create_task(main.sweep_rooms())
+    try:
+        for _ in range(100):
+            if not len(store):
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        task.cancel()
+    assert len(store) == 0 and store.evicted_idle == 1
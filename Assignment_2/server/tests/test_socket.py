@@ -9,11 +9,9 @@ import uvicorn
 
 pytest.importorskip("aiohttp", reason="aiohttp required for socket.io test client")
 
-from app.main import application
-
 
 @pytest_asyncio.fixture
-async def live_server():
+async def live_server(application):
     try:
         probe = socket.socket()
         probe.bind(("127.0.0.1", 0))
@@ -93,8 +91,8 @@ async def test_state_sync_on_join(live_server):
     await client_a.connect(base_url, socketio_path="socket.io", transports=["websocket"])
     await client_b.connect(base_url, socketio_path="socket.io", transports=["websocket"])
 
-    await client_a.emit("join", {"room": session_id})
-    await client_a.emit("code_change", {"room": session_id, "code": "shared-code"})
+    await client_a.call("join", {"room": session_id})
+    await client_a.call("code_change", {"room": session_id, "code": "shared-code"})
 
     await client_b.emit("join", {"room": session_id})
     await asyncio.wait_for(state_sync_received.wait(), timeout=5)
@@ -103,3 +101,201 @@ async def test_state_sync_on_join(live_server):
 
     await client_a.disconnect()
     await client_b.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_code_ops_broadcast_and_ack(live_server):
+    base_url = live_server
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        resp = await client.post("/api/session")
+        resp.raise_for_status()
+        session_id = resp.json()["sessionId"]
+
+    client_a = socketio.AsyncClient()
+    client_b = socketio.AsyncClient()
+
+    received = asyncio.Event()
+    payload = {}
+
+    @client_b.on("ops_update")
+    async def on_ops_update(data):
+        payload.update(data or {})
+        received.set()
+
+    await client_a.connect(base_url, socketio_path="socket.io", transports=["websocket"])
+    await client_b.connect(base_url, socketio_path="socket.io", transports=["websocket"])
+
+    await client_a.call("join", {"room": session_id})
+    await client_b.call("join", {"room": session_id})
+
+    # "# Start coding\n" is 15 characters long.
+    ack = await client_a.call("code_ops", {"room": session_id, "revision": 0, "ops": [15, "print(1)\n"]})
+    assert ack == {"ok": True, "revision": 1}
+
+    await asyncio.wait_for(received.wait(), timeout=5)
+    assert payload == {"revision": 1, "ops": [15, "print(1)\n"]}
+
+    # A concurrent op made against revision 0 is transformed past the first one.
+    ack = await client_b.call("code_ops", {"room": session_id, "revision": 0, "ops": ["# top\n", 15]})
+    assert ack == {"ok": True, "revision": 2}
+
+    await client_a.disconnect()
+    await client_b.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_code_ops_stale_revision_resyncs(live_server):
+    base_url = live_server
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        resp = await client.post("/api/session")
+        resp.raise_for_status()
+        session_id = resp.json()["sessionId"]
+
+    client_a = socketio.AsyncClient()
+    synced = []
+
+    @client_a.on("state_sync")
+    async def on_state_sync(data):
+        synced.append(data)
+
+    await client_a.connect(base_url, socketio_path="socket.io", transports=["websocket"])
+    await client_a.call("join", {"room": session_id})
+
+    ack = await client_a.call("code_ops", {"room": session_id, "revision": 7, "ops": [15, "x"]})
+    assert ack["ok"] is False and ack["resync"] is True
+    assert synced[-1]["code"] == "# Start coding\n"
+    assert synced[-1]["revision"] == 0
+
+    await client_a.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_presence_updates_and_room_teardown(live_server):
+    from app import main
+
+    base_url = live_server
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        resp = await client.post("/api/session")
+        resp.raise_for_status()
+        session_id = resp.json()["sessionId"]
+
+    client_a = socketio.AsyncClient()
+    client_b = socketio.AsyncClient()
+    counts = []
+    dropped_to_one = asyncio.Event()
+
+    @client_a.on("presence_update")
+    async def on_presence(data):
+        counts.append(data["count"])
+        if data["count"] == 1 and 2 in counts:
+            dropped_to_one.set()
+
+    await client_a.connect(base_url, socketio_path="socket.io", transports=["websocket"])
+    await client_b.connect(base_url, socketio_path="socket.io", transports=["websocket"])
+
+    await client_a.call("join", {"room": session_id})
+    await client_b.call("join", {"room": session_id})
+    await client_a.call("code_ops", {"room": session_id, "revision": 0, "ops": [15, "x"]})
+    assert main.presence.count(session_id) == 2
+    assert session_id in main.ROOM_HISTORY
+
+    await client_b.disconnect()
+    await asyncio.wait_for(dropped_to_one.wait(), timeout=5)
+
+    await client_a.call("leave", {"room": session_id})
+    assert main.presence.count(session_id) == 0
+    assert session_id not in main.ROOM_HISTORY
+    assert (await main.get_state(session_id))["code"] == "# Start coding\nx"
+
+    await client_a.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_msgpack_clients_share_room_with_json_clients(live_server):
+    wire = pytest.importorskip("app.wire")
+    if wire.msgpack is None:
+        pytest.skip("msgpack not installed")
+    base_url = live_server
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        resp = await client.post("/api/session")
+        resp.raise_for_status()
+        session_id = resp.json()["sessionId"]
+
+    json_client = socketio.AsyncClient()
+    binary_client = socketio.AsyncClient()
+    events = {"state_sync": [], "ops_update": []}
+    received = asyncio.Event()
+
+    @binary_client.on("state_sync")
+    async def on_state_sync(data):
+        events["state_sync"].append(data)
+
+    @binary_client.on("ops_update")
+    async def on_ops_update(data):
+        events["ops_update"].append(data)
+        received.set()
+
+    await json_client.connect(base_url, socketio_path="socket.io", transports=["websocket"])
+    await binary_client.connect(
+        base_url, socketio_path="socket.io", transports=["websocket"], auth={"wire": "msgpack"}
+    )
+    await json_client.call("join", {"room": session_id})
+    await binary_client.call("join", {"room": session_id})
+
+    ack = await json_client.call("code_ops", {"room": session_id, "revision": 0, "ops": [15, "x = 1\n"]})
+    assert ack == {"ok": True, "revision": 1}
+    await asyncio.wait_for(received.wait(), timeout=5)
+
+    assert all(isinstance(data, bytes) for data in events["state_sync"] + events["ops_update"])
+    assert wire.unpack(events["state_sync"][0])["code"] == "# Start coding\n"
+    assert wire.unpack(events["ops_update"][0]) == {"revision": 1, "ops": [15, "x = 1\n"]}
+
+    await json_client.disconnect()
+    await binary_client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_gets_coalesced_ops(live_server, monkeypatch):
+    from app import main
+
+    base_url = live_server
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        resp = await client.post("/api/session")
+        resp.raise_for_status()
+        session_id = resp.json()["sessionId"]
+
+    client_a = socketio.AsyncClient()
+    client_b = socketio.AsyncClient()
+    updates = []
+
+    @client_b.on("ops_update")
+    async def on_ops_update(data):
+        updates.append(data)
+
+    await client_a.connect(base_url, socketio_path="socket.io", transports=["websocket"])
+    await client_b.connect(base_url, socketio_path="socket.io", transports=["websocket"])
+    await client_a.call("join", {"room": session_id})
+    await client_b.call("join", {"room": session_id})
+
+    backed_up = {client_b.get_sid()}
+    monkeypatch.setattr(main.coalescer, "queue_size", lambda sid: 1000 if sid in backed_up else 0)
+    for revision, text in enumerate("abc"):
+        ack = await client_a.call("code_ops", {"room": session_id, "revision": revision, "ops": [15 + revision, text]})
+        assert ack["ok"] is True
+    await asyncio.sleep(0.1)
+    assert updates == []
+
+    backed_up.clear()
+    for _ in range(50):
+        if updates:
+            break
+        await asyncio.sleep(0.05)
+    assert updates == [{"revision": 3, "ops": [15, "abc"]}]
+
+    await client_a.disconnect()
+    await client_b.disconnect()
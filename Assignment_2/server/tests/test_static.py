@@ -0,0 +1,63 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI, Request
+from httpx import ASGITransport, AsyncClient
+
+from app.static import IMMUTABLE, REVALIDATE, StaticBundle, accepted_encodings
+
+
+@pytest.fixture
+def bundle(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "index.html").write_text("<!doctype html><div id=root></div>" * 40)
+    (tmp_path / "assets" / "index-abc123.js").write_text("console.log('hi');\n" * 200)
+    (tmp_path / "assets" / "logo-def456.png").write_bytes(b"\x89PNG" + bytes(2000))
+    return StaticBundle(tmp_path)
+
+
+def _app(bundle):
+    app = FastAPI()
+
+    @app.get("/{path:path}")
+    async def serve(path: str, request: Request):
+        return bundle.response(path or "index.html", request.headers)
+
+    return app
+
+
+def test_accepted_encodings_parses_q_values():
+    assert accepted_encodings("gzip, br;q=0.5, *;q=0") == {"gzip": 1.0, "br": 0.5, "*": 0.0}
+
+
+def test_bundle_precompresses_text_only(bundle):
+    assert set(bundle.assets["assets/index-abc123.js"].variants) >= {"identity", "gzip"}
+    assert set(bundle.assets["assets/logo-def456.png"].variants) == {"identity"}
+    assert bundle.assets["assets/index-abc123.js"].cache_control == IMMUTABLE
+    assert bundle.assets["index.html"].cache_control == REVALIDATE
+
+
+@pytest.mark.asyncio
+async def test_bundle_negotiates_encoding_and_revalidates(bundle):
+    transport = ASGITransport(app=_app(bundle))
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.get("/assets/index-abc123.js", headers={"Accept-Encoding": "gzip"})
+        assert resp.headers["content-encoding"] == "gzip"
+        assert resp.headers["vary"] == "Accept-Encoding"
+        assert resp.headers["cache-control"] == IMMUTABLE
+        assert resp.text == "console.log('hi');\n" * 200
+        etag = resp.headers["etag"]
+        assert etag.endswith('-gzip"')
+
+        plain = await client.get("/assets/index-abc123.js", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers and plain.headers["etag"] != etag
+
+        cached = await client.get(
+            "/assets/index-abc123.js", headers={"Accept-Encoding": "gzip", "If-None-Match": etag}
+        )
+        assert cached.status_code == 304 and cached.content == b""
+
+        index = await client.get("/", headers={"Accept-Encoding": "gzip;q=0"})
+        assert index.headers["content-type"] == "text/html; charset=utf-8"
+        assert "content-encoding" not in index.headers
+        assert gzip.decompress(bundle.assets["index.html"].variants["gzip"]) == index.content
@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+import pytest
+
+from app.write_behind import WriteBehindCache
+
+
+class FakeBackend:
+    def __init__(self):
+        self.data = {}
+        self.batches = []
+
+    async def load(self, room):
+        return self.data.get(room)
+
+    async def write_many(self, batch):
+        self.batches.append(dict(batch))
+        self.data.update(batch)
+
+
+@pytest.mark.asyncio
+async def test_put_is_visible_before_flush():
+    backend = FakeBackend()
+    cache = WriteBehindCache(backend.load, backend.write_many, interval=60)
+    cache.put("r1", {"code": "a"})
+    assert await cache.get("r1") == {"code": "a"}
+    assert backend.data == {}
+    assert cache.dirty_count == 1
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_repeated_puts_coalesce_into_one_write():
+    backend = FakeBackend()
+    cache = WriteBehindCache(backend.load, backend.write_many, interval=60)
+    for i in range(50):
+        cache.put("r1", {"code": str(i)})
+    cache.put("r2", {"code": "x"})
+    assert await cache.flush() == 2
+    assert backend.batches == [{"r1": {"code": "49"}, "r2": {"code": "x"}}]
+    assert await cache.flush() == 0
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_interval_flush_runs_in_background():
+    backend = FakeBackend()
+    cache = WriteBehindCache(backend.load, backend.write_many, interval=0.01)
+    cache.put("r1", {"code": "a"})
+    for _ in range(100):
+        if backend.data:
+            break
+        await asyncio.sleep(0.01)
+    assert backend.data == {"r1": {"code": "a"}}
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_dirty_threshold_triggers_early_flush():
+    backend = FakeBackend()
+    cache = WriteBehindCache(backend.load, backend.write_many, interval=60, max_dirty=3)
+    for room in ("a", "b", "c"):
+        cache.put(room, {"code": room})
+    for _ in range(100):
+        if backend.batches:
+            break
+        await asyncio.sleep(0.01)
+    assert set(backend.batches[0]) == {"a", "b", "c"}
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_release_and_close_persist_everything():
+    backend = FakeBackend()
+    cache = WriteBehindCache(backend.load, backend.write_many, interval=60)
+    cache.put("r1", {"code": "a"})
+    cache.put("r2", {"code": "b"})
+    await cache.release("r1")
+    assert backend.data == {"r1": {"code": "a"}}
+    await cache.close()
+    assert backend.data == {"r1": {"code": "a"}, "r2": {"code": "b"}}
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_rooms_dirty():
+    backend = FakeBackend()
+    calls = []
+
+    async def flaky_write(batch):
+        calls.append(batch)
+        if len(calls) == 1:
+            raise ConnectionError("redis down")
+        await backend.write_many(batch)
+
+    cache = WriteBehindCache(backend.load, flaky_write, interval=60)
+    cache.put("r1", {"code": "a"})
+    with pytest.raises(ConnectionError):
+        await cache.flush()
+    assert cache.dirty_count == 1
+    await cache.close()
+    assert backend.data == {"r1": {"code": "a"}}
+
+
+@pytest.mark.asyncio
+async def test_idle_clean_rooms_are_evicted():
+    backend = FakeBackend()
+    backend.data["read-only"] = {"code": "r"}
+    cache = WriteBehindCache(backend.load, backend.write_many, interval=60, idle_ttl=10)
+    cache.put("edited", {"code": "a"})
+    assert await cache.get("read-only") == {"code": "r"}
+    assert cache.room_count == 2
+    now = time.monotonic()
+    assert cache.evict_idle(now) == 0  # used within idle_ttl
+    assert cache.evict_idle(now + 11) == 1  # "edited" is still dirty, so kept
+    assert cache.room_count == 1
+    await cache.flush()
+    assert cache.evict_idle(now + 11) == 1
+    assert cache.room_count == 0
+    # Dropped rooms are reloaded from the backend.
+    assert await cache.get("edited") == {"code": "a"}
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_background_task_evicts_idle_rooms():
+    backend = FakeBackend()
+    cache = WriteBehindCache(backend.load, backend.write_many, interval=0.01, idle_ttl=0.01)
+    cache.put("r1", {"code": "a"})
+    for _ in range(100):
+        if not cache.room_count:
+            break
+        await asyncio.sleep(0.01)
+    assert cache.room_count == 0
+    assert backend.data == {"r1": {"code": "a"}}
+    await cache.close()
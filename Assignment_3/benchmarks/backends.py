@@ -0,0 +1,157 @@
+"""
+minsearch (TF-IDF, cosine) vs the BM25 CSR backend: build time, index memory
+and query latency.
+
+Two corpora:
+- fastmcp:    the docs zip, indexed in --mode (passages or files)
+- synthetic:  --docs documents (100k by default) of ~--doc-len tokens drawn
+              from a Zipf-like distribution over --vocab terms, built
+              straight as term counts (no text)
+
+Both backends are built from the same IndexState. For each:
+- build ms:   state.to_index() (TF-IDF weights) vs BM25Index.from_state
+- index MB:   the arrays searched (TF-IDF matrix + idf vs inverted index + idf)
+- p50/p95 ms: one query at a time, through ``.search(query, num_results=k)``
+- peak MB:    largest transient allocation during a query (tracemalloc)
+- batch ms:   per query when BM25 scores all queries with ``search_many``
+
+"overlap" is the share of each query's top k that the two backends agree on;
+they rank differently by design, so it is a sanity check, not a target.
+
+Run from Assignment_3:
+    uv run python benchmarks/backends.py
+    uv run python benchmarks/backends.py --corpus synthetic --docs 100000 --queries 200
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from scipy import sparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import search  # noqa: E402
+from bm25 import BM25Index  # noqa: E402
+from index_cache import IndexState  # noqa: E402
+
+FASTMCP_QUERIES = [
+    "getting started",
+    "oauth token",
+    "middleware",
+    "deploy to cloud",
+    "tool decorator",
+    "resource templates",
+    "prompt arguments",
+    "client transport stdio",
+    "authentication bearer",
+    "context logging progress",
+    "server composition mount",
+    "openapi integration",
+]
+
+
+def fastmcp_corpus(mode: str, n_queries: int) -> Tuple[IndexState, List[str]]:
+    state = IndexState.empty(mode)
+    search.update_state(state, [search.ensure_zip()])
+    queries = (FASTMCP_QUERIES * (n_queries // len(FASTMCP_QUERIES) + 1))[:n_queries]
+    return state, queries
+
+
+def synthetic_corpus(n_docs: int, doc_len: int, vocab: int, n_queries: int, seed: int) -> Tuple[IndexState, List[str]]:
+    rng = np.random.default_rng(seed)
+    p = 1.0 / np.arange(1, vocab + 1) ** 1.07
+    p /= p.sum()
+    lengths = rng.poisson(doc_len, n_docs).clip(1)
+    cols = rng.choice(vocab, size=int(lengths.sum()), p=p).astype(np.int32)
+    rows = np.repeat(np.arange(n_docs, dtype=np.int32), lengths)
+    # Duplicate (row, col) pairs are summed into term counts.
+    counts = sparse.csr_matrix((np.ones(len(cols), np.int32), (rows, cols)), shape=(n_docs, vocab))
+    counts.sum_duplicates()
+    docs = [{"filename": f"doc-{i}.md", "content": ""} for i in range(n_docs)]
+    vocabulary = {f"w{i}": i for i in range(vocab)}
+    state = IndexState(docs, [d["filename"] for d in docs], counts, vocabulary, {})
+    # Two to four terms, from frequent to rare.
+    queries = [
+        " ".join(f"w{t}" for t in rng.integers(10, min(vocab, 20000), rng.integers(2, 5))) for _ in range(n_queries)
+    ]
+    return state, queries
+
+
+def timed(fn: Callable[[], object]) -> Tuple[object, float]:
+    started = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def measure(index, queries: List[str], k: int) -> Dict[str, object]:
+    latencies, peaks, results = [], [], []
+    index.search(query=queries[0], num_results=k)  # warm-up
+    for query in queries:
+        tracemalloc.start()
+        found, ms = timed(lambda: index.search(query=query, num_results=k))
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        latencies.append(ms)
+        results.append([doc["filename"] + str(doc.get("start", "")) for doc in found])
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(0.95 * (len(latencies) - 1))],
+        "peak_mb": max(peaks) / 1e6,
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="minsearch vs BM25 backend benchmark.")
+    parser.add_argument("--corpus", choices=["fastmcp", "synthetic", "both"], default="both")
+    parser.add_argument("--mode", choices=["passages", "files"], default="passages")
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--doc-len", type=int, default=120)
+    parser.add_argument("--vocab", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    corpora = ["fastmcp", "synthetic"] if args.corpus == "both" else [args.corpus]
+    for name in corpora:
+        if name == "fastmcp":
+            state, queries = fastmcp_corpus(args.mode, args.queries)
+        else:
+            state, queries = synthetic_corpus(args.docs, args.doc_len, args.vocab, args.queries, args.seed)
+        print(f"\n{name}: {len(state.docs)} documents, {state.counts.nnz} postings, {len(queries)} queries, k={args.top_k}")
+
+        minsearch_index, minsearch_build = timed(state.to_index)
+        tfidf = minsearch_index.text_matrices["content"]
+        minsearch_bytes = tfidf.data.nbytes + tfidf.indices.nbytes + tfidf.indptr.nbytes + state.idf.nbytes
+        bm25_index, bm25_build = timed(lambda: BM25Index.from_state(state))
+
+        rows = {
+            "minsearch": (minsearch_build, minsearch_bytes, measure(minsearch_index, queries, args.top_k)),
+            "bm25": (bm25_build, bm25_index.nbytes, measure(bm25_index, queries, args.top_k)),
+        }
+        _, batch_ms = timed(lambda: bm25_index.search_many(queries, args.top_k))
+
+        print(f"{'backend':<11}{'build ms':>10}{'index MB':>10}{'p50 ms':>9}{'p95 ms':>9}{'peak MB':>9}{'batch ms':>10}")
+        for backend, (build, nbytes, m) in rows.items():
+            batch = f"{batch_ms / len(queries):>10.2f}" if backend == "bm25" else f"{'-':>10}"
+            print(
+                f"{backend:<11}{build:>10.0f}{nbytes / 1e6:>10.1f}{m['p50']:>9.2f}{m['p95']:>9.2f}{m['peak_mb']:>9.1f}"
+                + batch
+            )
+        overlap = statistics.mean(
+            len(set(a) & set(b)) / max(len(a), 1)
+            for a, b in zip(rows["minsearch"][2]["results"], rows["bm25"][2]["results"])
+        )
+        print(f"top-{args.top_k} overlap between backends: {overlap:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Ingestion throughput and peak memory for a multi-archive corpus.
+
+Builds a corpus of --copies copies of the docs zip (each with its own root
+folder, so they are distinct archives) and indexes it from an empty state
+once per configuration, each in a fresh interpreter:
+- stream:   update_state, batches streamed through the pool into the index
+- collect:  every batch read into one list first, then indexed (the old shape)
+
+for each worker count in --workers. Reports the median over --runs of wall
+time, documents per second and peak RSS above the post-import baseline, and
+the per-stage throughput from IngestStats of the median run.
+
+Run from Assignment_3:
+    uv run python benchmarks/ingest.py
+    uv run python benchmarks/ingest.py --copies 16 --workers 1 2 4 8 --batch-kb 512
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROBE = """
+import json, resource, sys, time
+from pathlib import Path
+import search
+from index_cache import IndexState
+from ingest import IngestStats, ingest
+
+zips, mode, workers, batch_bytes = sorted(Path(sys.argv[1]).glob("*.zip")), sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+state, stats = IndexState.empty(), IngestStats()
+started = time.perf_counter()
+if mode == "stream":
+    search.update_state(state, zips, stats, workers=workers, batch_bytes=batch_bytes)
+else:
+    entries = [e for batch in ingest(zips, stats=stats, workers=workers, batch_bytes=batch_bytes) for e in batch]
+    added = [(e.name, doc, counts) for e in entries for doc, counts in search.entry_docs(e, state.mode)]
+    state.update([], added, search.zip_manifest(zips))
+state.weights()
+wall = time.perf_counter() - started
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print("RESULT", json.dumps({"docs": len(state.docs), "wall": wall, "peak_kb": peak - baseline, "report": stats.report()}))
+"""
+
+
+def make_corpus(source: Path, target: Path, copies: int) -> None:
+    with zipfile.ZipFile(source) as zin:
+        infos = zin.infolist()
+        for n in range(copies):
+            with zipfile.ZipFile(target / f"docs-{n:03d}.zip", "w", zipfile.ZIP_DEFLATED) as zout:
+                for info in infos:
+                    if info.is_dir():
+                        continue
+                    name = f"copy{n}/" + info.filename.split("/", 1)[-1]
+                    zout.writestr(name, zin.read(info))
+
+
+def run(corpus: Path, mode: str, workers: int, batch_bytes: int) -> Dict[str, object]:
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE, str(corpus), mode, str(workers), str(batch_bytes)],
+        cwd=ROOT,
+        env={"PYTHONPATH": str(ROOT), "PATH": "/usr/bin:/bin"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(proc.stdout.split("RESULT", 1)[1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Streaming, parallel ingestion benchmark.")
+    parser.add_argument("--copies", type=int, default=8, help="Copies of the docs zip in the corpus")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--batch-kb", type=int, default=1024)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", default=["stream", "collect"], choices=["stream", "collect"])
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    import search
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = Path(tmp)
+        make_corpus(search.ensure_zip(), corpus, args.copies)
+        size = sum(p.stat().st_size for p in corpus.glob("*.zip"))
+        print(f"corpus: {args.copies} zips, {size / 1e6:.1f} MB compressed, batches of {args.batch_kb} KB")
+        results: List[str] = []
+        print(f"{'mode':<9}{'workers':>8}{'docs':>8}{'wall ms':>10}{'docs/s':>9}{'peak MB':>9}")
+        for mode in args.modes:
+            for workers in args.workers:
+                runs = [run(corpus, mode, workers, args.batch_kb * 1024) for _ in range(args.runs)]
+                runs.sort(key=lambda r: r["wall"])
+                r = dict(runs[len(runs) // 2], peak_kb=statistics.median(r["peak_kb"] for r in runs))
+                print(
+                    f"{mode:<9}{workers:>8}{r['docs']:>8}{r['wall'] * 1000:>10.0f}"
+                    f"{r['docs'] / r['wall']:>9.0f}{r['peak_kb'] / 1024:>9.1f}"
+                )
+                results.append(f"[{mode}, {workers} workers]\n{r['report']}")
+        print()
+        print("\n".join(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Incremental re-indexing after a zip update vs a full rebuild.
+
+Takes the docs zip, indexes it, then writes an "updated" copy in which
+--changed entries are edited, --removed entries are dropped and --added new
+ones appear, and times bringing the index up to date two ways:
+- full:         load_documents + Index.fit over the whole updated zip
+- incremental:  update_state (manifest diff, then only the changed entries)
+
+It also checks that both answer a set of queries with the same scores.
+
+Run from Assignment_3:
+    uv run python benchmarks/reindex.py
+    uv run python benchmarks/reindex.py --changed 50 --removed 10 --added 10
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import search  # noqa: E402
+from index_cache import IndexState  # noqa: E402
+
+QUERIES = ["getting started", "oauth token", "middleware", "deploy to cloud", "tool decorator", "resource templates"]
+
+
+def updated_copy(source: Path, target: Path, changed: int, removed: int, added: int, seed: int) -> None:
+    rng = random.Random(seed)
+    with zipfile.ZipFile(source) as zin:
+        markdown = [info.filename for info in zin.infolist() if search.is_markdown(info)]
+        picked = rng.sample(markdown, changed + removed)
+        edit, drop = set(picked[:changed]), set(picked[changed:])
+        root = markdown[0].split("/", 1)[0]
+        with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as zout:
+            for info in zin.infolist():
+                if info.filename in drop:
+                    continue
+                data = zin.read(info)
+                if info.filename in edit:
+                    data += b"\n\n## Changelog\nRevised section about webhooks and retries.\n"
+                zout.writestr(info, data)
+            for i in range(added):
+                zout.writestr(f"{root}/docs/new/page-{i}.md", f"# New page {i}\nWebhooks, retries and backoff.\n")
+
+
+def scores(index, query):
+    vec = index.vectorizers["content"].transform([query])
+    sim = cosine_similarity(vec, index.text_matrices["content"]).ravel()
+    return sorted((round(float(s), 9), doc["filename"]) for s, doc in zip(sim, index.docs) if s > 0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Incremental vs full re-indexing.")
+    parser.add_argument("--changed", type=int, default=20)
+    parser.add_argument("--removed", type=int, default=5)
+    parser.add_argument("--added", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    source = search.ensure_zip()
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = Path(tmp) / source.name
+        zip_path.write_bytes(source.read_bytes())
+        state = IndexState.empty()
+        started = time.perf_counter()
+        search.update_state(state, [zip_path])
+        print(f"initial index: {len(state.docs)} docs in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        updated_copy(source, zip_path, args.changed, args.removed, args.added, args.seed)
+
+        started = time.perf_counter()
+        docs = [
+            {"filename": rel_path, "content": text} for rel_path, text in search.iter_markdown_from_zip(zip_path)
+        ]
+        full = search.build_index(docs)
+        full_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        report = search.update_state(state, [zip_path])
+        incremental = state.to_index()
+        incremental_ms = (time.perf_counter() - started) * 1000
+
+    print(f"update: {report['added']} documents read, {report['removed']} removed")
+    print(f"full rebuild: {full_ms:.0f} ms, incremental: {incremental_ms:.0f} ms")
+    same = all(np.allclose(
+        [s for s, _ in scores(full, q)], [s for s, _ in scores(incremental, q)]
+    ) and [f for _, f in scores(full, q)] == [f for _, f in scores(incremental, q)] for q in QUERIES)
+    print(f"same scores for {len(QUERIES)} queries: {same}")
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
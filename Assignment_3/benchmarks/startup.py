@@ -0,0 +1,86 @@
+"""
+Cold vs warm start of doc_search: time to the first search result.
+
+Each run is a fresh interpreter that imports search.py and calls
+load_or_build_index() once, then searches:
+- cold: empty cache directory, so the zips are read and the index is fitted (and saved)
+- warm: the cache written by the cold run is loaded (memory-mapped arrays)
+- nocache: cache disabled, the old behaviour (no save)
+
+Imports (numpy, pandas, scikit-learn) are timed separately since no cache
+can remove them. Needs the docs zip(s) next to search.py (search.py downloads
+fastmcp-main.zip on first use).
+
+Run from Assignment_3:
+    uv run python benchmarks/startup.py
+    uv run python benchmarks/startup.py --runs 5 --json out.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROBE = """
+import sys, time
+started = time.perf_counter()
+import search
+imported = time.perf_counter()
+index = search.load_or_build_index(sys.argv[1])
+loaded = time.perf_counter()
+search.search(index, "getting started", top_k=5)
+searched = time.perf_counter()
+print("TIMES", (imported - started) * 1000, (loaded - imported) * 1000, (searched - loaded) * 1000)
+"""
+
+
+def run(cache_dir: str) -> List[float]:
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE, cache_dir], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return [float(x) for x in proc.stdout.split("TIMES")[1].split()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="doc_search cold vs warm start.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", metavar="PATH", help="Write results as JSON")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    import search
+
+    search.ensure_zip()
+    zips = search.source_zips()
+    print(f"zips: {', '.join(f'{p.name} ({p.stat().st_size / 1e6:.1f} MB)' for p in zips)}")
+
+    samples: Dict[str, List[List[float]]] = {"cold": [], "warm": [], "nocache": []}
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            samples["cold"].append(run(tmp))
+            samples["warm"].append(run(tmp))
+        samples["nocache"].append(run(""))
+
+    report = {
+        mode: {
+            name: statistics.median(sample[i] for sample in runs)
+            for i, name in enumerate(("import_ms", "index_ms", "first_search_ms"))
+        }
+        for mode, runs in samples.items()
+    }
+    print(f"{'mode':<10}{'import ms':>12}{'index ms':>12}{'search ms':>12}")
+    for mode, r in report.items():
+        print(f"{mode:<10}{r['import_ms']:>12.0f}{r['index_ms']:>12.0f}{r['first_search_ms']:>12.1f}")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+BM25 search over a compact CSR inverted index, a drop-in for minsearch.Index.
+
+The index is built from an ``IndexState``'s term counts without re-reading
+any text. Each (term, document) BM25 weight
+
+    idf(t) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(d) / avg_len))
+
+with ``idf(t) = ln(1 + (N - df + 0.5) / (df + 0.5))`` is computed once and
+stored term-major: ``weights[t]`` is the row of documents containing ``t``,
+as float32 values and int32 document ids. A query is then a sparse row of
+query-term counts, and scoring a batch of queries is one sparse product
+``queries @ weights``; the top k of each row come from ``np.argpartition``
+rather than a full sort.
+
+``search`` has the signature minsearch's ``Index.search`` is called with in
+search.py, so either can be used as the doc_search backend.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Sequence
+
+import numpy as np
+from scipy import sparse
+
+from index_cache import IndexState, analyzer
+
+K1 = 1.2
+B = 0.75
+# Queries scored per sparse product; bounds the dense score block to
+# QUERY_BLOCK x documents float32s.
+QUERY_BLOCK = 256
+
+
+def _compact(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    """``matrix`` with float32 data and int32 indices/indptr (when nnz allows)."""
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    index_dtype = np.int32 if matrix.nnz < np.iinfo(np.int32).max else np.int64
+    matrix.indices = matrix.indices.astype(index_dtype, copy=False)
+    matrix.indptr = matrix.indptr.astype(index_dtype, copy=False)
+    return matrix
+
+
+class BM25Index:
+    def __init__(
+        self, docs: List[dict], counts: sparse.csr_matrix, vocabulary: Dict[str, int], k1: float = K1, b: float = B
+    ):
+        """BM25 over ``docs``, whose term counts are the rows of ``counts`` (columns per ``vocabulary``)."""
+        self.docs = docs
+        self.vocabulary = vocabulary
+        self.analyzer = analyzer()
+        n_docs, width = counts.shape
+        counts = sparse.csr_matrix(counts)
+        tf = counts.data.astype(np.float32)
+        lengths = np.asarray(counts.sum(axis=1), dtype=np.float32).ravel()
+        avg_length = lengths.mean() if n_docs else 0.0
+        df = np.bincount(counts.indices, minlength=width).astype(np.float32)
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = k1 * (1 - b + b * lengths / avg_length) if avg_length else np.full(n_docs, k1, np.float32)
+        per_entry = np.repeat(norm.astype(np.float32), np.diff(counts.indptr))
+        values = self.idf[counts.indices] * tf * (k1 + 1) / (tf + per_entry)
+        by_doc = sparse.csr_matrix((values, counts.indices, counts.indptr), shape=(n_docs, width))
+        # Term-major: the inverted index.
+        self.weights = _compact(by_doc.T.tocsr())
+
+    @classmethod
+    def from_state(cls, state: IndexState, **params: float) -> "BM25Index":
+        return cls(state.docs, state.counts, state.vocabulary, **params)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory taken by the inverted index and idf arrays."""
+        w = self.weights
+        return w.data.nbytes + w.indices.nbytes + w.indptr.nbytes + self.idf.nbytes
+
+    def query_matrix(self, queries: Sequence[str]) -> sparse.csr_matrix:
+        """Query-term counts, one row per query; terms not in the index are dropped."""
+        rows, cols = [], []
+        for row, query in enumerate(queries):
+            for term in self.analyzer(query or ""):
+                col = self.vocabulary.get(term)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+        data = np.ones(len(cols), dtype=np.float32)
+        # Duplicates are summed, so a repeated query term counts twice.
+        return sparse.csr_matrix((data, (rows, cols)), shape=(len(queries), self.weights.shape[0]), dtype=np.float32)
+
+    def scores(self, queries: Sequence[str]) -> np.ndarray:
+        """Dense (queries x documents) BM25 scores."""
+        return (self.query_matrix(queries) @ self.weights).toarray()
+
+    def top_k(self, queries: Sequence[str], k: int) -> List[List[int]]:
+        """Ids of the k best documents (positive scores only) per query, best first."""
+        results: List[List[int]] = []
+        for start in range(0, len(queries), QUERY_BLOCK):
+            block = self.scores(queries[start : start + QUERY_BLOCK])
+            for row in block:
+                n = min(k, int(np.count_nonzero(row > 0)))
+                if n == 0:
+                    results.append([])
+                    continue
+                top = np.argpartition(-row, n - 1)[:n]
+                results.append(top[np.argsort(-row[top], kind="stable")].tolist())
+        return results
+
+    def search_many(self, queries: Sequence[str], num_results: int = 10) -> List[List[dict]]:
+        """``search`` for many queries in one sparse product per block of queries."""
+        return [[self.docs[i] for i in ids] for ids in self.top_k(list(queries), num_results)]
+
+    def search(self, query: str, num_results: int = 10) -> List[dict]:
+        return self.search_many([query], num_results)[0]
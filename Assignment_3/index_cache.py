@@ -0,0 +1,253 @@
+"""
+On-disk cache of the fitted doc_search index, updated incrementally.
+
+The cache holds an ``IndexState``: the documents (whole files or passages,
+see MODES), their term counts (CSR), the vocabulary and a manifest of the
+zip entries they came from, ``{zip name: {entry name: [crc32, size]}}`` as
+recorded in each zip's central directory. On startup the manifest of the
+current zips is compared with the stored one without decompressing anything;
+only added or changed entries are read and tokenized (see ``ingest.py``),
+removed ones are dropped, and the TF-IDF weights are recomputed from the
+counts (a vector operation, no re-tokenizing).
+
+Files in the cache directory:
+- ``meta.json``: fields, vocabulary, document keys and the manifest
+- ``docs.json``: the indexed documents
+- ``counts.{data,indices,indptr}.npy``: term counts per document
+- ``tfidf.{data,indices,indptr}.npy`` and ``idf.npy``: what search uses
+
+The directory name carries the mode, FORMAT_VERSION and the library
+versions, so each mode has its own entry and an upgrade starts from scratch.
+Arrays are loaded with ``mmap_mode="r"``: the OS pages them in as searches
+touch them instead of reading them at startup.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from importlib import metadata
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from minsearch import Index
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+FORMAT_VERSION = 3
+PREFIX = "doc-index"
+TEXT_FIELD = "content"
+KEYWORD_FIELDS = ["filename"]
+# "passages": heading-aware passages of each file; "files": one document per file.
+MODES = ("passages", "files")
+
+# {zip name: {entry name: [crc32, size]}}
+Manifest = Dict[str, Dict[str, List[int]]]
+
+
+def new_index() -> Index:
+    return Index(text_fields=[TEXT_FIELD], keyword_fields=KEYWORD_FIELDS)
+
+
+@lru_cache(maxsize=None)
+def analyzer() -> Callable[[str], List[str]]:
+    """The tokenizer minsearch fits ``TEXT_FIELD`` with."""
+    return new_index().vectorizers[TEXT_FIELD].build_analyzer()
+
+
+def term_counts(text: str) -> Dict[str, int]:
+    return Counter(analyzer()(text or ""))
+
+
+def library_key() -> str:
+    parts = [f"format={FORMAT_VERSION}"]
+    parts += [f"{name}={metadata.version(name)}" for name in ("minsearch", "scikit-learn", "numpy")]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()[:16]
+
+
+def cache_path(cache_dir: Path, mode: str) -> Path:
+    return cache_dir / f"{PREFIX}-{mode}-v{FORMAT_VERSION}-{library_key()}"
+
+
+@dataclass
+class Changes:
+    added: List[Tuple[str, str]] = field(default_factory=list)  # (zip name, entry name)
+    removed: List[str] = field(default_factory=list)  # document keys
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed)
+
+
+def doc_key(zip_name: str, entry: str) -> str:
+    return f"{zip_name}:{entry}"
+
+
+@dataclass
+class IndexState:
+    docs: List[dict]
+    keys: List[str]
+    counts: sparse.csr_matrix
+    vocabulary: Dict[str, int]
+    manifest: Manifest
+    mode: str = "files"
+    # Set when loaded from or saved to the cache; avoids recomputing TF-IDF.
+    tfidf: Optional[sparse.csr_matrix] = None
+    idf: Optional[np.ndarray] = None
+
+    @classmethod
+    def empty(cls, mode: str = "files") -> "IndexState":
+        return cls([], [], sparse.csr_matrix((0, 0), dtype=np.int32), {}, {}, mode)
+
+    def changes(self, manifest: Manifest) -> Changes:
+        """Entries of ``manifest`` that differ from the indexed ones."""
+        changes = Changes()
+        for zip_name, entries in manifest.items():
+            known = self.manifest.get(zip_name, {})
+            for entry, stamp in entries.items():
+                if known.get(entry) != stamp:
+                    changes.added.append((zip_name, entry))
+                    if entry in known:
+                        changes.removed.append(doc_key(zip_name, entry))
+        for zip_name, entries in self.manifest.items():
+            current = manifest.get(zip_name, {})
+            changes.removed += [doc_key(zip_name, entry) for entry in entries if entry not in current]
+        return changes
+
+    def update(
+        self, removed: Iterable[str], added: Iterable[Tuple[str, dict, Mapping[str, int]]], manifest: Manifest
+    ) -> None:
+        """Drop the ``removed`` keys and append ``(key, doc, term counts)`` triples.
+
+        Keys repeat when a file is indexed as several passages; removing a key
+        drops all of them. ``added`` is consumed once, so it can be a stream; only the counts of
+        each document are kept, as int32 arrays.
+        """
+        removed = set(removed)
+        keep = [i for i, key in enumerate(self.keys) if key not in removed]
+        vocabulary = dict(self.vocabulary)
+        cols: List[np.ndarray] = []
+        values: List[np.ndarray] = []
+        docs, keys = [self.docs[i] for i in keep], [self.keys[i] for i in keep]
+        for key, doc, counts in added:
+            # New terms get new columns; existing columns keep their meaning.
+            cols.append(
+                np.fromiter((vocabulary.setdefault(term, len(vocabulary)) for term in counts), np.int32, len(counts))
+            )
+            values.append(np.fromiter(counts.values(), np.int32, len(counts)))
+            docs.append(doc)
+            keys.append(key)
+        width = len(vocabulary)
+        kept = self.counts[keep]
+        kept.resize((len(keep), width))
+        indptr = np.zeros(len(cols) + 1, dtype=np.int64)
+        np.cumsum([len(c) for c in cols], out=indptr[1:])
+        new = sparse.csr_matrix(
+            (
+                np.concatenate(values) if values else np.zeros(0, np.int32),
+                np.concatenate(cols) if cols else np.zeros(0, np.int32),
+                indptr,
+            ),
+            shape=(len(cols), width),
+        )
+        new.sort_indices()
+        self.counts = sparse.vstack([kept, new], format="csr", dtype=np.int32)
+        self.docs, self.keys, self.vocabulary, self.manifest = docs, keys, vocabulary, manifest
+        self.tfidf = self.idf = None
+
+    def weights(self) -> Tuple[sparse.csr_matrix, np.ndarray]:
+        """TF-IDF matrix and idf, as TfidfVectorizer's defaults compute them."""
+        if self.tfidf is None or self.idf is None:
+            n_docs, width = self.counts.shape
+            df = np.bincount(self.counts.indices, minlength=width)
+            self.idf = np.log((1 + n_docs) / (1 + df)) + 1
+            tfidf = sparse.csr_matrix(self.counts, dtype=np.float64)
+            tfidf.data *= self.idf[tfidf.indices]
+            self.tfidf = normalize(tfidf, norm="l2", copy=False)
+        return self.tfidf, self.idf
+
+    def to_index(self) -> Index:
+        """A minsearch Index equivalent to fitting on ``docs``, without refitting."""
+        index = new_index()
+        index.docs = self.docs
+        index.keyword_df = pd.DataFrame({name: [doc.get(name) for doc in self.docs] for name in index.keyword_fields})
+        if not self.docs:
+            return index
+        tfidf, idf = self.weights()
+        vectorizer = index.vectorizers[TEXT_FIELD]
+        vectorizer.vocabulary_ = self.vocabulary
+        vectorizer.idf_ = idf
+        index.text_matrices[TEXT_FIELD] = tfidf
+        return index
+
+
+def _save_csr(directory: Path, name: str, matrix: sparse.csr_matrix) -> None:
+    for part in ("data", "indices", "indptr"):
+        np.save(directory / f"{name}.{part}.npy", getattr(matrix, part))
+
+
+def _load_csr(directory: Path, name: str, shape: List[int]) -> sparse.csr_matrix:
+    arrays = [np.load(directory / f"{name}.{part}.npy", mmap_mode="r") for part in ("data", "indices", "indptr")]
+    return sparse.csr_matrix(tuple(arrays), shape=tuple(shape), copy=False)
+
+
+def save_state(state: IndexState, cache_dir: Path) -> Path:
+    """Write ``state`` under ``cache_dir`` and drop entries of other versions."""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    target = cache_path(cache_dir, state.mode)
+    # Written to a temporary directory and renamed, so readers never see half a cache.
+    tmp = Path(tempfile.mkdtemp(prefix=".tmp-", dir=cache_dir))
+    try:
+        tfidf, idf = state.weights()
+        meta = {
+            "format": FORMAT_VERSION,
+            "mode": state.mode,
+            "shape": list(state.counts.shape),
+            "vocabulary": state.vocabulary,
+            "keys": state.keys,
+            "manifest": state.manifest,
+        }
+        _save_csr(tmp, "counts", state.counts)
+        _save_csr(tmp, "tfidf", tfidf)
+        np.save(tmp / "idf.npy", idf)
+        (tmp / "docs.json").write_text(json.dumps(state.docs), encoding="utf-8")
+        (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+        if target.exists():
+            shutil.rmtree(target)
+        os.replace(tmp, target)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    current = {cache_path(cache_dir, mode) for mode in MODES}
+    for stale in cache_dir.glob(f"{PREFIX}-*"):
+        if stale not in current:
+            shutil.rmtree(stale, ignore_errors=True)
+    return target
+
+
+def load_state(cache_dir: Path, mode: str = "files") -> Optional[IndexState]:
+    """The cached state for ``mode``, or None if there is none (or it is unreadable)."""
+    path = cache_path(cache_dir, mode)
+    try:
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        if meta.get("format") != FORMAT_VERSION or meta.get("mode") != mode:
+            return None
+        return IndexState(
+            docs=json.loads((path / "docs.json").read_text(encoding="utf-8")),
+            keys=meta["keys"],
+            counts=_load_csr(path, "counts", meta["shape"]),
+            vocabulary=meta["vocabulary"],
+            manifest=meta["manifest"],
+            mode=mode,
+            tfidf=_load_csr(path, "tfidf", meta["shape"]),
+            idf=np.load(path / "idf.npy"),
+        )
+    except (OSError, ValueError, KeyError):
+        return None
@@ -0,0 +1,203 @@
+"""
+Streaming, parallel ingestion of markdown documents from zip archives.
+
+The .md/.mdx entries of every zip are split into batches of about
+``batch_bytes`` of uncompressed text. Batches run in a process pool: a worker
+opens the zip, decompresses and decodes its entries, optionally splits them
+into passages (``passages.py``), tokenizes them and sends back the documents
+with their term counts. At most two batches per worker are in
+flight and results are consumed in submission order, so memory is bounded by
+the batch size and the number of workers rather than by the corpus, and the
+document order does not depend on scheduling.
+
+Each stage is timed: ``read`` (decompress), ``decode`` and ``tokenize``
+(including splitting) in the workers (summed over workers), ``wait`` (the
+consumer blocked on a worker) and ``index`` (the consumer's own work on a
+batch). ``IngestStats.report()`` prints their throughput.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Collection, Deque, Dict, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from index_cache import term_counts
+from passages import Passage, split_passages
+
+# Uncompressed bytes per batch.
+BATCH_BYTES = 1 << 20
+# Worker processes; DOC_INDEX_WORKERS=1 ingests in this process.
+WORKERS = int(os.getenv("DOC_INDEX_WORKERS", "0")) or os.cpu_count() or 1
+STAGES = ("read", "decode", "tokenize", "wait", "index")
+
+
+class Entry(NamedTuple):
+    zip_name: str
+    name: str  # entry name in the zip
+    rel_path: str
+    text: str
+    passages: List[Passage]  # the whole text as one passage unless split
+    counts: Optional[List[Dict[str, int]]]  # term counts per passage, when tokenized
+
+
+@dataclass
+class StageStats:
+    seconds: float = 0.0
+    docs: int = 0
+    bytes: int = 0
+
+    def add(self, other: "StageStats") -> None:
+        self.seconds += other.seconds
+        self.docs += other.docs
+        self.bytes += other.bytes
+
+
+@dataclass
+class IngestStats:
+    stages: Dict[str, StageStats] = field(default_factory=lambda: {name: StageStats() for name in STAGES})
+    workers: int = 1
+    batches: int = 0
+    wall: float = 0.0
+
+    def report(self) -> str:
+        lines = [f"ingest: {self.batches} batches on {self.workers} worker(s) in {self.wall * 1000:.0f} ms"]
+        for name, stage in self.stages.items():
+            if not stage.seconds:
+                continue
+            docs_s = stage.docs / stage.seconds
+            mb_s = stage.bytes / stage.seconds / 1e6
+            lines.append(f"  {name:<9}{stage.seconds * 1000:>9.0f} ms {docs_s:>10.0f} docs/s {mb_s:>8.1f} MB/s")
+        return "\n".join(lines)
+
+
+def strip_root(path_str: str) -> str:
+    """Remove the first path component from a zip entry."""
+    parts = Path(path_str).parts
+    if len(parts) <= 1:
+        return path_str
+    return Path(*parts[1:]).as_posix()
+
+
+def is_markdown(info: zipfile.ZipInfo) -> bool:
+    return not info.is_dir() and info.filename.lower().endswith((".md", ".mdx"))
+
+
+def plan_batches(
+    zip_paths: Sequence[Path], wanted: Optional[Mapping[str, Collection[str]]] = None, batch_bytes: int = BATCH_BYTES
+) -> List[Tuple[Path, List[str]]]:
+    """Split the markdown entries of ``zip_paths`` (only ``wanted[zip name]``, if given) into batches."""
+    batches: List[Tuple[Path, List[str]]] = []
+    for zip_path in zip_paths:
+        names = wanted.get(zip_path.name, ()) if wanted is not None else None
+        if names is not None and not names:
+            continue
+        with zipfile.ZipFile(zip_path) as zf:
+            batch: List[str] = []
+            size = 0
+            for info in zf.infolist():
+                if not is_markdown(info) or (names is not None and info.filename not in names):
+                    continue
+                batch.append(info.filename)
+                size += info.file_size
+                if size >= batch_bytes:
+                    batches.append((zip_path, batch))
+                    batch, size = [], 0
+            if batch:
+                batches.append((zip_path, batch))
+    return batches
+
+
+def read_batch(
+    zip_path: Path, names: List[str], tokenize: bool = True, split: bool = False
+) -> Tuple[List[Entry], Dict[str, StageStats]]:
+    """Decompress, decode, (optionally) split and tokenize ``names`` from one zip. Runs in a worker."""
+    stages = {name: StageStats() for name in ("read", "decode", "tokenize")}
+    entries: List[Entry] = []
+    with zipfile.ZipFile(zip_path) as zf:
+        for name in names:
+            started = time.perf_counter()
+            raw = zf.read(name)
+            read = time.perf_counter()
+            text = raw.decode("utf-8", errors="ignore")
+            decoded = time.perf_counter()
+            passages = split_passages(text) if split else [Passage(0, len(text), "")]
+            counts = [term_counts(text[p.start : p.end]) for p in passages] if tokenize else None
+            done = time.perf_counter()
+            timings = (("read", read - started), ("decode", decoded - read), ("tokenize", done - decoded))
+            for stage, seconds in timings:
+                stages[stage].add(StageStats(seconds, 1, len(raw)))
+            entries.append(Entry(zip_path.name, name, strip_root(name), text, passages, counts))
+    if not (tokenize or split):
+        del stages["tokenize"]
+    return entries, stages
+
+
+def ingest(
+    zip_paths: Sequence[Path],
+    wanted: Optional[Mapping[str, Collection[str]]] = None,
+    *,
+    tokenize: bool = True,
+    split: bool = False,
+    workers: Optional[int] = None,
+    batch_bytes: int = BATCH_BYTES,
+    stats: Optional[IngestStats] = None,
+) -> Iterator[List[Entry]]:
+    """Yield batches of entries from ``zip_paths``, in zip and entry order.
+
+    ``wanted`` limits each zip (by name) to the given entry names; ``split``
+    cuts each entry into passages. With more
+    than one batch and ``workers`` > 1, batches are read in a process pool.
+    """
+    stats = stats if stats is not None else IngestStats()
+    started = time.perf_counter()
+    batches = plan_batches(zip_paths, wanted, batch_bytes)
+    workers = min(workers or WORKERS, len(batches))
+    stats.workers, stats.batches = max(workers, 1), len(batches)
+    try:
+        for entries, stages in _run(batches, tokenize, split, workers, stats):
+            for name, stage in stages.items():
+                stats.stages[name].add(stage)
+            handed_out = time.perf_counter()
+            yield entries
+            # Time until the consumer asks for the next batch.
+            stats.stages["index"].add(
+                StageStats(time.perf_counter() - handed_out, len(entries), sum(len(e.text) for e in entries))
+            )
+    finally:
+        stats.wall = time.perf_counter() - started
+
+
+def _run(
+    batches: List[Tuple[Path, List[str]]], tokenize: bool, split: bool, workers: int, stats: IngestStats
+) -> Iterator[Tuple[List[Entry], Dict[str, StageStats]]]:
+    if workers <= 1:
+        for zip_path, names in batches:
+            yield read_batch(zip_path, names, tokenize, split)
+        return
+    pending: Deque[Future] = deque()
+    todo = iter(batches)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            while True:
+                # Keep every worker busy with one batch queued behind it.
+                while len(pending) < 2 * workers:
+                    batch = next(todo, None)
+                    if batch is None:
+                        break
+                    pending.append(pool.submit(read_batch, *batch, tokenize, split))
+                if not pending:
+                    return
+                waited = time.perf_counter()
+                result = pending.popleft().result()
+                entries, stages = result
+                stats.stages["wait"].add(StageStats(time.perf_counter() - waited, len(entries), stages["read"].bytes))
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
@@ -1,7 +1,7 @@
 import requests
 from fastmcp import FastMCP
 
-from search import build_index, ensure_zip, load_documents, search as search_docs
+from search import ensure_zip, load_or_build_index, read_document, search as search_docs
 
 mcp = FastMCP("Demo 🚀")
 
@@ -34,21 +34,41 @@ def _get_doc_index():
     global _doc_index
     if _doc_index is None:
         ensure_zip()
-        docs = load_documents()
-        _doc_index = build_index(docs)
+        _doc_index = load_or_build_index()
     return _doc_index
 
 
 @mcp.tool
 def doc_search(query: str, top_k: int = 5) -> list[dict]:
-    """Search the fastmcp markdown docs and return top matches."""
+    """Search the fastmcp markdown docs and return top matches.
+
+    Each match is a file with the section that matched best: its heading,
+    its character offsets in the file and a preview of it. Use doc_read for
+    the full text.
+    """
     index = _get_doc_index()
     results = search_docs(index, query, top_k=top_k)
     return [
-        {"filename": r["filename"], "preview": r["content"][:500]}
+        {
+            "filename": r["filename"],
+            "heading": r.get("heading", ""),
+            "start": r.get("start", 0),
+            "end": r.get("end", len(r["content"])),
+            "preview": r["content"][:500],
+        }
         for r in results
     ]
 
 
+@mcp.tool
+def doc_read(filename: str, start: int = 0, end: int | None = None) -> str:
+    """Return the text of a fastmcp docs file found by doc_search (optionally text[start:end])."""
+    ensure_zip()
+    text = read_document(filename, start, end)
+    if text is None:
+        raise ValueError(f"no such document: {filename}")
+    return text
+
+
 if __name__ == "__main__":
     mcp.run()
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+Split markdown into heading-aware, overlapping passages.
+
+The text is first cut into sections at ATX headings (``#`` to ``######``,
+ignoring ``#`` lines inside fenced code blocks); a section shorter than
+MIN_CHARS is merged into the one after it, so a heading directly followed by
+a sub-heading does not become a passage of its own. Sections longer than
+``max_chars`` are cut into windows that end at a paragraph, line or word
+break where possible and overlap by about ``overlap`` characters, so a
+sentence cut at one edge is whole in the neighbouring passage.
+
+Each passage keeps its character offsets into the text and its heading path
+(``"Install > Using pip"``), which is how search results point back into the
+full file.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import List, NamedTuple, Tuple
+
+MAX_CHARS = 1200
+OVERLAP = 200
+MIN_CHARS = 200
+
+HEADING = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$")
+FENCE = re.compile(r"^[ \t]*(```|~~~)")
+TAG = re.compile(r"<[^>]*>")
+
+
+class Passage(NamedTuple):
+    start: int
+    end: int
+    heading: str
+
+
+def sections(text: str) -> List[Passage]:
+    """Passages from heading to heading, before any size limit."""
+    found: List[Passage] = []
+    stack: List[Tuple[int, str]] = []  # (level, title) of the enclosing headings
+    start, heading, fence = 0, "", None
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        fenced = FENCE.match(line)
+        if fenced:
+            fence = None if fence == fenced.group(1) else fence or fenced.group(1)
+        elif fence is None:
+            match = HEADING.match(line.rstrip("\r\n"))
+            if match:
+                if offset > start:
+                    found.append(Passage(start, offset, heading))
+                level = len(match.group(1))
+                title = TAG.sub("", match.group(2)).strip()
+                stack = [(lvl, t) for lvl, t in stack if lvl < level] + [(level, title)]
+                start, heading = offset, " > ".join(title for _, title in stack)
+        offset += len(line)
+    if offset > start or not found:
+        found.append(Passage(start, offset, heading))
+    merged: List[Passage] = []
+    for section in found:
+        if merged and merged[-1].end - merged[-1].start < MIN_CHARS:
+            merged[-1] = Passage(merged[-1].start, section.end, merged[-1].heading or section.heading)
+        else:
+            merged.append(section)
+    return merged
+
+
+def _break_before(text: str, lo: int, hi: int) -> int:
+    """The last paragraph, line or word break in text[lo:hi] (``hi`` if none)."""
+    for sep in ("\n\n", "\n", " "):
+        at = text.rfind(sep, lo, hi)
+        if at != -1:
+            return at + len(sep)
+    return hi
+
+
+def split_passages(text: str, max_chars: int = MAX_CHARS, overlap: int = OVERLAP) -> List[Passage]:
+    """Heading-aware passages of at most ``max_chars``, overlapping by about ``overlap``."""
+    passages: List[Passage] = []
+    for section in sections(text):
+        start = section.start
+        while True:
+            if section.end - start <= max_chars:
+                passages.append(Passage(start, section.end, section.heading))
+                break
+            end = _break_before(text, start + max_chars // 2, start + max_chars)
+            passages.append(Passage(start, end, section.heading))
+            if not overlap:
+                start = end
+                continue
+            # Step back by the overlap, to the start of a word.
+            back = max(end - overlap, start + 1)
+            space = text.find(" ", back, end)
+            start = space + 1 if space != -1 else back
+    return passages
@@ -1,21 +1,41 @@
 """
 Index markdown docs from fastmcp zip archives and search them with minsearch.
 Run: uv run python search.py
+
+By default files are indexed as heading-aware passages (``passages.py``) and
+a search returns the best passage of each matching file; DOC_INDEX_MODE=files
+indexes whole files instead. Full file text is read from the zip on demand
+(``read_document``).
+
+DOC_SEARCH_BACKEND picks the scoring engine: ``minsearch`` (TF-IDF, cosine)
+or ``bm25`` (``bm25.py``, a CSR inverted index built from the same cache).
 """
 
 from __future__ import annotations
 
 import argparse
+import os
 import zipfile
 from pathlib import Path
-from typing import Iterable, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
 
 import requests
 from minsearch import Index
 
+from bm25 import BM25Index
+from index_cache import MODES, IndexState, Manifest, doc_key, load_state, save_state
+from ingest import Entry, IngestStats, ingest, is_markdown, strip_root
+
 BASE_DIR = Path(__file__).parent
 ZIP_URL = "https://github.com/jlowin/fastmcp/archive/refs/heads/main.zip"
 ZIP_NAME = "fastmcp-main.zip"
+# Fitted index cache; DOC_INDEX_CACHE="" disables it.
+CACHE_DIR = os.getenv("DOC_INDEX_CACHE", str(BASE_DIR / ".index_cache"))
+INDEX_MODE = os.getenv("DOC_INDEX_MODE", "passages")
+BACKENDS = ("minsearch", "bm25")
+SEARCH_BACKEND = os.getenv("DOC_SEARCH_BACKEND", "minsearch")
+
+SearchIndex = Union[Index, BM25Index]
 
 
 def ensure_zip(url: str = ZIP_URL, filename: str = ZIP_NAME) -> Path:
@@ -33,34 +53,73 @@ def ensure_zip(url: str = ZIP_URL, filename: str = ZIP_NAME) -> Path:
     return target
 
 
-def strip_root(path_str: str) -> str:
-    """Remove the first path component from a zip entry."""
-    parts = Path(path_str).parts
-    if len(parts) <= 1:
-        return path_str
-    return Path(*parts[1:]).as_posix()
-
-
 def iter_markdown_from_zip(zip_path: Path) -> Iterable[Tuple[str, str]]:
     """Yield (relative_path, text) for .md/.mdx files inside a zip."""
     with zipfile.ZipFile(zip_path) as zf:
         for info in zf.infolist():
-            if info.is_dir():
-                continue
-            if not info.filename.lower().endswith((".md", ".mdx")):
+            if not is_markdown(info):
                 continue
             with zf.open(info) as f:
                 text = f.read().decode("utf-8", errors="ignore")
             yield strip_root(info.filename), text
 
 
-def load_documents() -> List[dict]:
-    """Collect documents from all zip files in BASE_DIR."""
-    docs: List[dict] = []
-    for zip_path in BASE_DIR.glob("*.zip"):
-        for rel_path, text in iter_markdown_from_zip(zip_path):
-            docs.append({"filename": rel_path, "content": text})
-    return docs
+def zip_manifest(zip_paths: Iterable[Path]) -> Manifest:
+    """CRC-32 and size of every .md/.mdx entry, from the zips' central directories only."""
+    manifest: Manifest = {}
+    for zip_path in zip_paths:
+        with zipfile.ZipFile(zip_path) as zf:
+            manifest[zip_path.name] = {
+                info.filename: [info.CRC, info.file_size] for info in zf.infolist() if is_markdown(info)
+            }
+    return manifest
+
+
+def source_zips() -> List[Path]:
+    """The zip files in BASE_DIR that get indexed."""
+    return sorted(BASE_DIR.glob("*.zip"))
+
+
+def read_document(filename: str, start: int = 0, end: Optional[int] = None) -> Optional[str]:
+    """Text of an indexed file (``text[start:end]``), read from its zip; None if there is none."""
+    for zip_path in source_zips():
+        with zipfile.ZipFile(zip_path) as zf:
+            for info in zf.infolist():
+                if is_markdown(info) and strip_root(info.filename) == filename:
+                    return zf.read(info).decode("utf-8", errors="ignore")[start:end]
+    return None
+
+
+def entry_docs(entry: Entry, mode: str) -> Iterator[Tuple[dict, Optional[Mapping[str, int]]]]:
+    """The documents to index for one zip entry, with their term counts."""
+    if mode == "files":
+        yield {"filename": entry.rel_path, "content": entry.text}, entry.counts and entry.counts[0]
+        return
+    for i, passage in enumerate(entry.passages):
+        doc = {
+            "filename": entry.rel_path,
+            "heading": passage.heading,
+            "start": passage.start,
+            "end": passage.end,
+            "content": entry.text[passage.start : passage.end],
+        }
+        yield doc, entry.counts and entry.counts[i]
+
+
+def check_mode(mode: str) -> str:
+    if mode not in MODES:
+        raise ValueError(f"index mode must be one of {', '.join(MODES)}, not {mode!r}")
+    return mode
+
+
+def load_documents(mode: str = "files") -> List[dict]:
+    """Collect documents from all zip files in BASE_DIR (decompressed in parallel)."""
+    return [
+        doc
+        for batch in ingest(source_zips(), tokenize=False, split=check_mode(mode) == "passages")
+        for entry in batch
+        for doc, _ in entry_docs(entry, mode)
+    ]
 
 
 def build_index(docs: List[dict]) -> Index:
@@ -70,24 +129,86 @@ def build_index(docs: List[dict]) -> Index:
     return index
 
 
-def search(index: Index, query: str, top_k: int = 5) -> List[dict]:
-    """Search the index and return top_k results."""
-    return index.search(query=query, num_results=top_k)
+def update_state(
+    state: IndexState, zip_paths: List[Path], stats: Optional[IngestStats] = None, **ingest_options
+) -> Dict[str, int]:
+    """Bring ``state`` in line with ``zip_paths``, reading only new or changed entries.
+
+    Entries stream through ``ingest`` (a process pool, bounded batches);
+    ``ingest_options`` (workers, batch_bytes) are passed on to it.
+    """
+    manifest = zip_manifest(zip_paths)
+    changes = state.changes(manifest)
+    if not changes:
+        return {"added": 0, "removed": 0}
+    wanted: Dict[str, set] = {}
+    for zip_name, entry in changes.added:
+        wanted.setdefault(zip_name, set()).add(entry)
+    added = (
+        (doc_key(entry.zip_name, entry.name), doc, counts)
+        for batch in ingest(zip_paths, wanted, split=state.mode == "passages", stats=stats, **ingest_options)
+        for entry in batch
+        for doc, counts in entry_docs(entry, state.mode)
+    )
+    state.update(changes.removed, added, manifest)
+    return {"added": len(changes.added), "removed": len(changes.removed)}
+
+
+def load_or_build_index(
+    cache_dir: Optional[str] = CACHE_DIR,
+    stats: Optional[IngestStats] = None,
+    mode: str = INDEX_MODE,
+    backend: str = SEARCH_BACKEND,
+) -> SearchIndex:
+    """Load the ``mode`` index from the cache, updating it for zips that changed since.
+
+    Zip entries are compared by CRC-32 and size; only new or changed
+    documents are read and tokenized. ``backend`` picks the engine built on it.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"search backend must be one of {', '.join(BACKENDS)}, not {backend!r}")
+    if not cache_dir and backend == "minsearch":
+        return build_index(load_documents(mode))
+    state = (load_state(Path(cache_dir), check_mode(mode)) if cache_dir else None) or IndexState.empty(mode)
+    if any(update_state(state, source_zips(), stats).values()) and cache_dir:
+        save_state(state, Path(cache_dir))
+    return BM25Index.from_state(state) if backend == "bm25" else state.to_index()
+
+
+def search(index: SearchIndex, query: str, top_k: int = 5) -> List[dict]:
+    """Search the index and return the top_k files, each as its best-scoring document.
+
+    With passages, several can come from one file; more are fetched until
+    top_k distinct files are found or the matches run out.
+    """
+    wanted = top_k
+    while True:
+        results = index.search(query=query, num_results=wanted)
+        best: Dict[str, dict] = {}
+        for doc in results:
+            best.setdefault(doc["filename"], doc)
+        if len(best) >= top_k or len(results) < wanted:
+            return list(best.values())[:top_k]
+        wanted *= 4
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Index and search markdown docs from fastmcp zip archives.")
     parser.add_argument("--query", default="getting started", help="Search query (default: 'getting started')")
     parser.add_argument("--top-k", type=int, default=5, help="Number of results to return (default: 5)")
+    parser.add_argument("--stats", action="store_true", help="Print ingestion throughput per stage")
     args = parser.parse_args()
 
     ensure_zip()
-    docs = load_documents()
-    index = build_index(docs)
+    stats = IngestStats()
+    index = load_or_build_index(stats=stats)
+    if args.stats and stats.batches:
+        print(stats.report())
     results = search(index, args.query, top_k=args.top_k)
     print(f"Top results for {args.query!r}:")
     for i, doc in enumerate(results, start=1):
-        print(f"{i}. {doc['filename']}")
+        heading = f" ({doc['heading']})" if doc.get("heading") else ""
+        print(f"{i}. {doc['filename']}{heading}")
 
 
 if __name__ == "__main__":
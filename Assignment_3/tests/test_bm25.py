@@ -0,0 +1,52 @@
+import math
+
+import numpy as np
+import pytest
+
+from bm25 import BM25Index
+from index_cache import IndexState, term_counts
+
+
+def index_of(texts, **params):
+    state = IndexState.empty()
+    state.update([], [(str(i), {"filename": str(i), "content": t}, term_counts(t)) for i, t in enumerate(texts)], {})
+    return BM25Index.from_state(state, **params)
+
+
+def test_scores_match_a_hand_computed_example():
+    # Lengths 2 and 4, so avg_len = 3; "cat" is in both documents, "dog" only in the second.
+    index = index_of(["cat sat", "dog dog cat ran"])
+    k1, b = 1.2, 0.75
+    idf_cat = math.log(1 + (2 - 2 + 0.5) / (2 + 0.5))
+    idf_dog = math.log(1 + (2 - 1 + 0.5) / (1 + 0.5))
+
+    def weight(idf, tf, length):
+        return idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / 3))
+
+    expected = [
+        [weight(idf_cat, 1, 2), weight(idf_cat, 1, 4)],
+        [0.0, weight(idf_dog, 2, 4)],
+        [weight(idf_cat, 1, 2), weight(idf_cat, 1, 4) + weight(idf_dog, 2, 4)],
+    ]
+    np.testing.assert_allclose(index.scores(["cat", "dog", "cat dog"]), expected, rtol=1e-6)
+    assert [d["filename"] for d in index.search("cat dog", 2)] == ["1", "0"]
+
+
+def test_layout_is_compact():
+    index = index_of(["alpha beta", "beta gamma"])
+    assert index.weights.dtype == np.float32
+    assert index.weights.indices.dtype == np.int32 and index.weights.indptr.dtype == np.int32
+
+
+@pytest.mark.parametrize("query", ["", "zebra", "a"])
+def test_empty_or_unknown_query_finds_nothing(query):
+    index = index_of(["alpha beta", "beta gamma"])
+    assert index.search(query) == []
+
+
+def test_search_many_matches_search_and_limits_results():
+    index = index_of(["alpha beta", "beta gamma", "gamma delta", "beta beta beta"])
+    queries = ["beta", "gamma", "nothing", "delta alpha"]
+    assert index.search_many(queries, 2) == [index.search(q, 2) for q in queries]
+    assert len(index.search("beta", 2)) == 2
+    assert index.search("beta", 10)[0]["filename"] == "3"
@@ -0,0 +1,100 @@
+import zipfile
+
+import numpy as np
+import pytest
+
+import index_cache
+import search
+from index_cache import IndexState, doc_key, load_state, save_state, term_counts
+
+
+def triples(docs):
+    return [(key, {"filename": key, "content": text}, term_counts(text)) for key, text in docs]
+
+
+def write_zip(path, files):
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, text in files.items():
+            zf.writestr(f"repo-main/{name}", text)
+
+
+def test_changes_reports_added_modified_and_removed_entries():
+    state = IndexState.empty()
+    state.manifest = {"a.zip": {"one.md": [1, 10], "two.md": [2, 20], "gone.md": [3, 30]}, "old.zip": {"x.md": [4, 4]}}
+    changes = state.changes({"a.zip": {"one.md": [1, 10], "two.md": [9, 21], "new.md": [5, 50]}})
+    assert changes.added == [("a.zip", "two.md"), ("a.zip", "new.md")]
+    assert sorted(changes.removed) == sorted(
+        [doc_key("a.zip", "two.md"), doc_key("a.zip", "gone.md"), doc_key("old.zip", "x.md")]
+    )
+    assert not state.changes(state.manifest)
+
+
+def test_update_matches_a_full_fit():
+    state = IndexState.empty()
+    state.update([], triples([("a", "alpha beta"), ("b", "beta gamma"), ("c", "gamma delta")]), {})
+    state.update(["b"], triples([("d", "delta epsilon beta"), ("b", "beta beta")]), {})
+    assert state.keys == ["a", "c", "d", "b"]
+
+    fitted = search.build_index(state.docs)
+    incremental = state.to_index()
+    for query in ("beta", "gamma delta", "epsilon"):
+        expected = fitted.vectorizers["content"].transform([query]) @ fitted.text_matrices["content"].T
+        actual = incremental.vectorizers["content"].transform([query]) @ incremental.text_matrices["content"].T
+        np.testing.assert_allclose(actual.toarray(), expected.toarray())
+
+
+def test_update_state_reads_only_changed_entries(tmp_path):
+    zip_path = tmp_path / "docs.zip"
+    write_zip(zip_path, {"keep.md": "# Keep\nsame", "edit.md": "# Edit\nbefore", "drop.md": "# Drop\nbye"})
+    state = IndexState.empty()
+    assert search.update_state(state, [zip_path], workers=1) == {"added": 3, "removed": 0}
+    assert search.update_state(state, [zip_path], workers=1) == {"added": 0, "removed": 0}
+
+    write_zip(zip_path, {"keep.md": "# Keep\nsame", "edit.md": "# Edit\nafter", "new.md": "# New\nhello"})
+    assert search.update_state(state, [zip_path], workers=1) == {"added": 2, "removed": 2}
+    contents = {doc["filename"]: doc["content"] for doc in state.docs}
+    assert contents == {"keep.md": "# Keep\nsame", "edit.md": "# Edit\nafter", "new.md": "# New\nhello"}
+
+
+def test_cache_round_trip(tmp_path):
+    state = IndexState.empty()
+    state.update([], triples([("a", "alpha beta"), ("b", "beta gamma")]), {"z.zip": {"a": [1, 2]}})
+    save_state(state, tmp_path)
+
+    loaded = load_state(tmp_path)
+    assert (loaded.keys, loaded.docs, loaded.vocabulary, loaded.manifest) == (
+        state.keys,
+        state.docs,
+        state.vocabulary,
+        state.manifest,
+    )
+    assert (loaded.counts != state.counts).nnz == 0
+    np.testing.assert_allclose(loaded.tfidf.toarray(), state.weights()[0].toarray())
+    assert [d["filename"] for d in search.search(loaded.to_index(), "gamma", 1)] == ["b"]
+
+
+def test_cache_is_invalidated_by_mode_versions_and_corruption(tmp_path, monkeypatch):
+    state = IndexState.empty()
+    state.update([], triples([("a", "alpha")]), {})
+    path = save_state(state, tmp_path)
+
+    assert load_state(tmp_path, "passages") is None
+    (path / "meta.json").write_text("{not json")
+    assert load_state(tmp_path) is None
+
+    save_state(state, tmp_path)
+    monkeypatch.setattr(index_cache, "library_key", lambda: "upgraded")
+    assert load_state(tmp_path) is None
+    # Saving under the new key removes the stale entry.
+    save_state(state, tmp_path)
+    assert [p.name for p in tmp_path.iterdir()] == [index_cache.cache_path(tmp_path, "files").name]
+
+
+@pytest.mark.parametrize("mode", ["passages", "files"])
+def test_load_or_build_index_uses_the_cache(tmp_path, monkeypatch, mode):
+    write_zip(tmp_path / "docs.zip", {"guide.md": "# Guide\n\nInstall the package with pip."})
+    monkeypatch.setattr(search, "BASE_DIR", tmp_path)
+    cache = tmp_path / "cache"
+    first = search.load_or_build_index(str(cache), mode=mode)
+    assert [d["filename"] for d in search.search(first, "install", 1)] == ["guide.md"]
+    assert load_state(cache, mode) is not None
@@ -0,0 +1,44 @@
+from passages import MIN_CHARS, sections, split_passages
+
+BODY = "Some text about this part of the docs. " * 8  # > MIN_CHARS
+
+
+def test_sections_start_at_headings_with_their_path():
+    text = f"# Guide\n{BODY}\n## Install\n{BODY}\n### With pip\n{BODY}\n## Usage\n{BODY}\n"
+    found = sections(text)
+    assert [s.heading for s in found] == ["Guide", "Guide > Install", "Guide > Install > With pip", "Guide > Usage"]
+    for section in found[1:]:
+        assert text[section.start :].startswith("#")
+    assert found[0].start == 0 and found[-1].end == len(text)
+    assert all(a.end == b.start for a, b in zip(found, found[1:]))
+
+
+def test_headings_inside_code_fences_are_ignored_and_tags_stripped():
+    text = f"# Run <sup>new</sup>\n{BODY}\n```bash\n# not a heading\n```\n{BODY}\n"
+    assert [s.heading for s in sections(text)] == ["Run new"]
+
+
+def test_short_sections_merge_into_the_next():
+    text = f"# Top\n## Sub\n{BODY}\n"
+    found = sections(text)
+    assert len(found) == 1 and found[0].heading == "Top"
+    assert len("# Top\n") < MIN_CHARS
+
+
+def test_long_sections_are_capped_and_overlap():
+    text = "# Long\n" + " ".join(f"word{i}" for i in range(2000)) + "\n"
+    passages = split_passages(text, max_chars=500, overlap=100)
+    assert len(passages) > 1
+    assert all(p.end - p.start <= 500 for p in passages)
+    assert all(p.heading == "Long" for p in passages)
+    assert passages[0].start == 0 and passages[-1].end == len(text)
+    for a, b in zip(passages, passages[1:]):
+        # Each passage starts on a word inside the previous one.
+        assert a.start < b.start < a.end
+        assert a.end - b.start <= 100
+        assert text[b.start - 1] == " "
+
+
+def test_short_text_is_one_passage():
+    assert [tuple(p) for p in split_passages("plain text")] == [(0, 10, "")]
+    assert [tuple(p) for p in split_passages("")] == [(0, 0, "")]